@@ -0,0 +1,635 @@
+"""
+Synthetic production-scale data for the backend tables, bulk-loaded with COPY.
+
+    cd backend && python -m bench.datagen --dsn postgresql://postgres@localhost/boostfit \\
+        [--reset] [--users 1000000] [--years 2] [--active 0.25] [--dormant-days 45] \\
+        [--habits 3-6] [--weigh-ins-per-week 3] [--recipes 2000] [--seed 1] [--today YYYY-MM-DD] [--jobs N]
+
+Users are generated in fixed-size chunks, each from its own RNG stream keyed by
+(seed, chunk), so a given --seed/--today produces the same rows whatever --jobs is.
+Each worker process builds a chunk with numpy and streams it in one transaction:
+per-day tables (checkins, checkin_daily, daily_metrics, weigh_ins, xp_events) as
+binary COPY from fixed-width record arrays, per-user tables as text COPY.
+
+Triggers and FK checks are off while loading (session_replication_role = replica,
+so this needs a superuser, e.g. the bench database). The rollups they would
+maintain are written directly and match what the SQL rebuild functions produce:
+checkin_daily, user_streaks, user_xp and weigh_ins.trend. Secondary indexes and
+unique constraints on the per-day tables are dropped for the load and rebuilt
+afterwards (--keep-indexes to load into them instead). --check N recomputes N
+users' rollups with the SQL rebuild functions and compares.
+
+Model, per user: signup uniformly within the last --years; --active of users are
+still using the app today, the rest stopped after a geometric number of days
+(mean --dormant-days). Each opens the app on a user-specific share of days, has
+a fixed set of habits (checkin rows for all of them on each such day, done with
+a user-specific probability), logs metrics on some of those days and weighs in
+--weigh-ins-per-week on average with a slow per-user drift. XP follows the API:
+10 per habit done, 25 per day with 3+ done.
+"""
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import psycopg2
+import psycopg2.extras
+
+from bench import harness
+from shopping import normalize_ingredients
+
+CHUNK_USERS = 2000
+MAX_HABITS = 8          # habit ids are user_index * MAX_HABITS + slot + 1
+PG_EPOCH = date(2000, 1, 1)
+TREND_ALPHA = 0.3       # same constant as weigh_in_trend_from()
+
+# per-day tables: the ones the load defers indexes on
+DAY_TABLES = ("checkins", "checkin_daily", "daily_metrics", "weigh_ins", "xp_events")
+
+HABITS = harness.HABITS + [
+    ("Pas d'écran au lit", "📵", "lifestyle", 1),
+    ("Fruit au goûter", "🍎", "nutrition", 1),
+]
+SLOTS = ("morning", "lunch", "evening")
+TIMEZONES = ("Europe/Paris", "Europe/Brussels", "Europe/Zurich", "America/Montreal")
+
+INGREDIENTS = [
+    ("blanc de poulet", "g", 150), ("saumon", "g", 140), ("thon au naturel", "g", 120), ("œufs", "pièce", 2),
+    ("tofu ferme", "g", 150), ("lentilles cuites", "g", 200), ("pois chiches", "g", 180), ("riz cuit", "g", 180),
+    ("quinoa cuit", "g", 150), ("flocons d'avoine", "g", 50), ("yaourt grec 0%", "g", 170), ("skyr", "g", 150),
+    ("épinards", "g", 80), ("brocoli", "g", 120), ("tomates", "g", 120), ("courgette", "g", 150),
+    ("huile d'olive", "c. à soupe", 1), ("fromage blanc", "g", 150), ("fruits rouges", "g", 80), ("banane", "pièce", 1),
+    ("pain complet", "g", 60), ("avocat", "pièce", 0.5), ("feta", "g", 40), ("lait", "ml", 200),
+]
+RECIPE_KINDS = [("breakfast", 250, 450), ("lunch", 400, 700), ("dinner", 400, 750), ("snack", 100, 260)]
+
+_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_TRAILER = struct.pack(">h", -1)
+_NUMERIC = np.dtype([("ndigits", ">i2"), ("weight", ">i2"), ("sign", ">i2"), ("dscale", ">i2"),
+                     ("d0", ">i2"), ("d1", ">i2")])
+_FIXED = {"int2": np.dtype(">i2"), "int4": np.dtype(">i4"), "int8": np.dtype(">i8"), "bool": np.dtype("u1"),
+          "date": np.dtype(">i4"), "timestamptz": np.dtype(">i8"), "uuid": np.dtype(("u1", (16,))),
+          "float8": np.dtype(">f8")}
+
+
+class Config(NamedTuple):
+    users: int
+    days: int
+    active: float
+    dormant_days: float
+    habits_min: int
+    habits_max: int
+    weigh_ins_per_week: float
+    recipes: int
+    seed: int
+    today: date
+
+
+# ---------- binary COPY ----------
+def binary_copy(cur, table: str, columns: Sequence[Tuple[str, str, object]]) -> int:
+    """
+    COPY ... (FORMAT binary) from fixed-width records. `columns` are (name, kind, values):
+    kind is a key of _FIXED (dates as days and timestamps as microseconds since
+    2000-01-01), "numeric:<scale>" (values are integers scaled by 10**scale, < 10**4
+    before the point) or "text" (one bytes value shared by all rows).
+    """
+    n = next(len(v) for _, kind, v in columns if kind != "text")
+    if n == 0:
+        return 0
+    fields = [("nfields", ">i2")]
+    for i, (_, kind, value) in enumerate(columns):
+        if kind == "text":
+            dt = np.dtype(f"S{len(value)}")
+        elif kind.startswith("numeric:"):
+            dt = _NUMERIC
+        else:
+            dt = _FIXED[kind]
+        fields += [(f"len{i}", ">i4"), (f"val{i}", dt)]
+    rec = np.empty(n, np.dtype(fields))
+    rec["nfields"] = len(columns)
+    for i, (_, kind, value) in enumerate(columns):
+        rec[f"len{i}"] = rec.dtype[f"val{i}"].itemsize
+        if kind.startswith("numeric:"):
+            scale = int(kind.split(":")[1])
+            v = np.asarray(value, np.int64)
+            num = rec[f"val{i}"]
+            num["ndigits"], num["weight"], num["sign"], num["dscale"] = 2, 0, 0, scale
+            num["d0"] = v // 10 ** scale
+            num["d1"] = v % 10 ** scale * 10 ** (4 - scale)
+        else:
+            rec[f"val{i}"] = value
+    cols = ", ".join(name for name, _, _ in columns)
+    cur.copy_expert(f"COPY {table} ({cols}) FROM STDIN WITH (FORMAT binary)",
+                    io.BytesIO(_HEADER + rec.tobytes() + _TRAILER), size=1 << 20)
+    return n
+
+
+def text_copy(cur, table: str, columns: Sequence[str], rows: List[Sequence]) -> int:
+    """COPY text format; values must not contain tabs, newlines or backslashes (None is NULL)."""
+    if not rows:
+        return 0
+    buf = "".join("\t".join("\\N" if v is None else str(v) for v in row) + "\n" for row in rows)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", io.StringIO(buf), size=1 << 20)
+    return len(rows)
+
+
+# ---------- ids ----------
+def _uuid_prefix(seed: int) -> np.ndarray:
+    prefix = np.frombuffer(hashlib.blake2b(f"boostfit-datagen/{seed}".encode(), digest_size=8).digest(), np.uint8).copy()
+    prefix[6] = (prefix[6] & 0x0F) | 0x40   # version 4
+    return prefix
+
+
+def user_uuids(seed: int, index: np.ndarray) -> np.ndarray:
+    """(n, 16) uint8 UUID bytes for user indexes: a per-seed prefix + the index (RFC 4122 bits set)."""
+    out = np.empty((len(index), 16), np.uint8)
+    out[:, :8] = _uuid_prefix(seed)
+    out[:, 8:] = np.asarray(index, ">u8").view(np.uint8).reshape(-1, 8)
+    out[:, 8] = (out[:, 8] & 0x3F) | 0x80
+    return out
+
+
+def user_id(seed: int, index: int) -> str:
+    return str(uuid.UUID(bytes=user_uuids(seed, np.array([index])).tobytes()))
+
+
+def sample_users(cfg: Config, count: int, seed: int = 0) -> List[Dict]:
+    """Up to `count` users active today, as [{"id", "habits": [habit ids]}], recomputed from the RNG streams."""
+    chunks = list(range((cfg.users + CHUNK_USERS - 1) // CHUNK_USERS))
+    random.Random(seed).shuffle(chunks)
+    out = []
+    for chunk in chunks:
+        p = _people(cfg, chunk)
+        for i in np.flatnonzero(p["active"]):
+            index = int(p["index"][i])
+            out.append({"id": user_id(cfg.seed, index),
+                        "habits": [index * MAX_HABITS + k + 1 for k in range(int(p["habits"][i]))]})
+            if len(out) == count:
+                return out
+    return out
+
+
+def _day_number(d: date) -> int:
+    return (d - PG_EPOCH).days
+
+
+def _iso(day: int) -> str:
+    return (PG_EPOCH + timedelta(days=int(day))).isoformat()
+
+
+def _ragged(counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """For lengths [2, 3]: owner [0, 0, 1, 1, 1] and position [0, 1, 0, 1, 2]."""
+    owner = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    return owner, np.arange(len(owner)) - starts[owner]
+
+
+# ---------- generation ----------
+def _people(cfg: Config, chunk: int) -> Dict[str, np.ndarray]:
+    """Per-user parameters of one chunk; the first draws of the chunk's RNG stream."""
+    rng = np.random.default_rng([cfg.seed, chunk])
+    first = chunk * CHUNK_USERS
+    n = min(CHUNK_USERS, cfg.users - first)
+    today = _day_number(cfg.today)
+    signup = today - rng.integers(0, cfg.days, n)
+    active = rng.random(n) < cfg.active
+    life = rng.geometric(1.0 / max(cfg.dormant_days, 1.0), n)
+    last = np.where(active, today, np.minimum(signup + life - 1, today - 1))
+    return {
+        "rng": rng, "index": np.arange(first, first + n), "signup": signup, "active": active,
+        "days": np.maximum(last - signup + 1, 0),
+        "presence": np.where(active, rng.beta(6, 2, n), rng.beta(2, 3, n)),
+        "diligence": rng.beta(4, 2, n),
+        "habits": rng.integers(cfg.habits_min, cfg.habits_max + 1, n),
+        "habit_offset": rng.integers(0, len(HABITS), n),
+        "weigh_rate": np.minimum(1.0, rng.gamma(2.0, cfg.weigh_ins_per_week / 14.0, n)),
+        "metrics_rate": rng.beta(3, 2, n),
+        "start_kg": np.clip(rng.normal(82, 14, n), 45, 180),
+        "drift_kg": rng.normal(-0.012, 0.01, n),
+        "base_steps": rng.integers(3000, 12000, n),
+    }
+
+
+def _trends(owner: np.ndarray, pos: np.ndarray, kg: np.ndarray) -> np.ndarray:
+    """weigh_in_trend_from() per user, same float8 operations in the same order."""
+    trend = np.empty_like(kg)
+    if not len(kg):
+        return trend
+    grid = np.full((owner.max() + 1, pos.max() + 1), np.nan)
+    grid[owner, pos] = kg
+    out = np.empty_like(grid)
+    out[:, 0] = grid[:, 0]
+    for j in range(1, grid.shape[1]):
+        out[:, j] = TREND_ALPHA * grid[:, j] + (1 - TREND_ALPHA) * out[:, j - 1]
+    trend[:] = out[owner, pos]
+    return trend
+
+
+def _runs(user: np.ndarray, day: np.ndarray, n_users: int):
+    """
+    Consecutive-day runs per user (rows sorted by user, day). Returns per-user
+    (start, end) of the latest run (-1 when none) and the longest run length,
+    as rebuild_user_streaks() derives them.
+    """
+    start = np.full(n_users, -1)
+    end = np.full(n_users, -1)
+    longest = np.zeros(n_users, np.int64)
+    if not len(user):
+        return start, end, longest
+    brk = np.ones(len(user), bool)
+    brk[1:] = (user[1:] != user[:-1]) | (day[1:] != day[:-1] + 1)
+    first = np.flatnonzero(brk)
+    last = np.append(first[1:] - 1, len(user) - 1)
+    owner = user[first]
+    np.maximum.at(longest, owner, day[last] - day[first] + 1)
+    latest = np.append(owner[1:] != owner[:-1], True)   # runs are in date order within a user
+    start[owner[latest]] = day[first[latest]]
+    end[owner[latest]] = day[last[latest]]
+    return start, end, longest
+
+
+def generate_chunk(cfg: Config, chunk: int, cur, challenge_id: Optional[int] = None) -> Dict[str, int]:
+    p = _people(cfg, chunk)
+    rng = p["rng"]
+    n = len(p["index"])
+    uids = user_uuids(cfg.seed, p["index"])
+    uid_str = [str(uuid.UUID(bytes=b.tobytes())) for b in uids]
+    counts: Dict[str, int] = {}
+    today = _day_number(cfg.today)
+
+    # users
+    emails = [f"user{i}@bench.boostfit.test" for i in p["index"]]
+    created = [_iso(d) for d in p["signup"]]
+    counts["auth.users"] = text_copy(cur, "auth.users", ("id", "email"), list(zip(uid_str, emails)))
+    counts["users"] = text_copy(cur, "public.users", ("id", "username", "email", "created_at"),
+                                [(u, e.split("@")[0], e, c) for u, e, c in zip(uid_str, emails, created)])
+
+    # habits: a rotation of the templates starting at a per-user offset
+    h_owner, h_slot = _ragged(p["habits"])
+    h_ids = p["index"][h_owner] * MAX_HABITS + h_slot + 1
+    rows = []
+    for o, s, hid in zip(h_owner, h_slot, h_ids):
+        name, icon, category, difficulty = HABITS[(p["habit_offset"][o] + s) % len(HABITS)]
+        rows.append((hid, uid_str[o], name, icon, category, difficulty, created[o]))
+    counts["habits"] = text_copy(cur, "public.habits",
+                                 ("id", "user_id", "name", "icon", "category", "difficulty", "created_at"), rows)
+
+    # the days each user opened the app
+    d_owner, d_pos = _ragged(p["days"])
+    d_day = p["signup"][d_owner] + d_pos
+    seen = rng.random(len(d_owner)) < p["presence"][d_owner]
+    d_owner, d_day = d_owner[seen], d_day[seen]
+
+    # checkins: every habit on every such day
+    per_day = p["habits"][d_owner]
+    c_row, c_slot = _ragged(per_day)
+    c_owner = d_owner[c_row]
+    done = rng.random(len(c_row)) < p["diligence"][c_owner]
+    counts["checkins"] = binary_copy(cur, "public.checkins", [
+        ("habit_id", "int4", p["index"][c_owner] * MAX_HABITS + c_slot + 1),
+        ("user_id", "uuid", uids[c_owner]),
+        ("checkin_date", "date", d_day[c_row]),
+        ("done", "bool", done),
+    ])
+    done_count = np.bincount(c_row, weights=done, minlength=len(d_owner)).astype(np.int64)
+    counts["checkin_daily"] = binary_copy(cur, "public.checkin_daily", [
+        ("user_id", "uuid", uids[d_owner]),
+        ("c_date", "date", d_day),
+        ("done_count", "int4", done_count),
+        ("total_count", "int4", per_day),
+    ])
+
+    # streaks (soft: 2+ done, perfect: 3+), one row per user like rebuild_user_streaks()
+    streak_rows = []
+    runs = {lvl: _runs(d_owner[done_count >= lvl], d_day[done_count >= lvl], n) for lvl in (2, 3)}
+    for i in range(n):
+        cols = []
+        for lvl in (3, 2):
+            s, e, _ = runs[lvl]
+            cols += [_iso(s[i]) if s[i] >= 0 else None, _iso(e[i]) if e[i] >= 0 else None]
+        streak_rows.append((uid_str[i], *cols, int(runs[3][2][i]), int(runs[2][2][i])))
+    counts["user_streaks"] = text_copy(cur, "public.user_streaks", (
+        "user_id", "perfect_start", "perfect_end", "soft_start", "soft_end", "longest_perfect", "longest_soft"),
+        streak_rows)
+
+    # XP: 10 per habit done (during the day), 25 per day with 3+ done (in the evening)
+    seconds = 86400 * d_day.astype(np.int64)
+    xp_done = np.flatnonzero(done)
+    xp_ts = (seconds[c_row[xp_done]] + rng.integers(7 * 3600, 22 * 3600, len(xp_done))) * 1_000_000
+    counts["xp_events"] = binary_copy(cur, "public.xp_events", [
+        ("user_id", "uuid", uids[c_owner[xp_done]]), ("ts", "timestamptz", xp_ts),
+        ("reason", "text", b"habit_done"), ("amount", "int4", np.full(len(xp_done), 10)),
+    ])
+    full = np.flatnonzero(done_count >= 3)
+    counts["xp_events"] += binary_copy(cur, "public.xp_events", [
+        ("user_id", "uuid", uids[d_owner[full]]), ("ts", "timestamptz", (seconds[full] + 22 * 3600) * 1_000_000),
+        ("reason", "text", b"daily_complete"), ("amount", "int4", np.full(len(full), 25)),
+    ])
+    xp = (10 * np.bincount(c_owner[xp_done], minlength=n) + 25 * np.bincount(d_owner[full], minlength=n))
+    has_xp = np.flatnonzero(xp)
+    counts["user_xp"] = binary_copy(cur, "public.user_xp", [
+        ("user_id", "uuid", uids[has_xp]), ("total_xp", "int8", xp[has_xp])])
+
+    # daily metrics on some of the app days
+    m = np.flatnonzero(rng.random(len(d_owner)) < p["metrics_rate"][d_owner])
+    mo = d_owner[m]
+    k = len(m)
+    counts["daily_metrics"] = binary_copy(cur, "public.daily_metrics", [
+        ("user_id", "uuid", uids[mo]), ("m_date", "date", d_day[m]),
+        ("steps", "int4", np.maximum(0, p["base_steps"][mo] + rng.normal(0, 2500, k)).astype(np.int64)),
+        ("sleep_hours", "numeric:1", np.clip(rng.normal(70, 9, k), 30, 110).astype(np.int64)),
+        ("protein_g", "int4", rng.integers(40, 160, k)),
+        ("fiber_g", "int4", rng.integers(8, 40, k)),
+        ("water_ml", "int4", 50 * rng.integers(10, 60, k)),
+        ("strength_min", "int4", rng.choice([0, 0, 0, 20, 30, 45], k)),
+        ("cardio_min", "int4", rng.choice([0, 0, 15, 30, 45], k)),
+        ("mood", "int2", rng.integers(1, 6, k)),
+        ("hunger", "int2", rng.integers(1, 6, k)),
+    ])
+
+    # weigh-ins on app days, with per-user drift and day-to-day noise; trend as the triggers would
+    w = np.flatnonzero(rng.random(len(d_owner)) < p["weigh_rate"][d_owner] / p["presence"][d_owner])
+    wo = d_owner[w]
+    kg = p["start_kg"][wo] + p["drift_kg"][wo] * (d_day[w] - p["signup"][wo]) + rng.normal(0, 0.4, len(w))
+    cents = np.round(np.clip(kg, 40, 250) * 100).astype(np.int64)
+    per_user = np.bincount(wo, minlength=n)
+    w_owner, w_pos = _ragged(per_user)
+    counts["weigh_ins"] = binary_copy(cur, "public.weigh_ins", [
+        ("user_id", "uuid", uids[wo]), ("wi_date", "date", d_day[w]), ("kg", "numeric:2", cents),
+        ("trend", "float8", _trends(w_owner, w_pos, cents / 100.0)),
+    ])
+
+    # profile (current weight = last weigh-in or the starting weight), goals for some
+    last_kg = p["start_kg"].copy()
+    weighed = np.flatnonzero(per_user)
+    last_kg[weighed] = cents[np.cumsum(per_user)[weighed] - 1] / 100.0
+    sex = rng.choice(["male", "female"], n)
+    diet = rng.choice(["omnivore", "omnivore", "omnivore", "vegetarian"], n)
+    profile = []
+    for i in range(n):
+        reminder = f"{rng.integers(7, 22):02d}:{rng.choice([0, 15, 30, 45]):02d}" if rng.random() < 0.6 else None
+        profile.append((uid_str[i], sex[i], int(rng.integers(1955, 2006)),
+                        int(rng.normal(178 if sex[i] == "male" else 165, 7)), f"{last_kg[i]:.2f}",
+                        rng.choice(["1.2", "1.4", "1.6", "1.8"]), rng.choice(["0.10", "0.15", "0.20"]), diet[i],
+                        "detail" if rng.random() < 0.2 else "simple", "metric",
+                        TIMEZONES[int(rng.integers(0, len(TIMEZONES)))], reminder))
+    counts["user_profile"] = text_copy(cur, "public.user_profile", (
+        "user_id", "sex", "birth_year", "height_cm", "weight_kg", "activity_factor", "deficit_percent",
+        "diet", "mode", "units", "timezone", "reminder_time"), profile)
+    goal = np.flatnonzero(rng.random(n) < 0.4)
+    counts["goals"] = text_copy(cur, "public.goals", ("user_id", "target_weight", "target_date", "pace_kg_per_week"),
+                                [(uid_str[i], f"{max(45.0, last_kg[i] - rng.integers(3, 15)):.2f}",
+                                  _iso(today + int(rng.integers(30, 365))), rng.choice(["0.25", "0.50", "0.75"]))
+                                 for i in goal])
+
+    # today's schedule and a water challenge for active users
+    act = np.flatnonzero(p["active"])
+    counts["habit_schedule"] = text_copy(cur, "public.habit_schedule", ("user_id", "s_date", "habit_id", "slot"), [
+        (uid_str[o], cfg.today.isoformat(), hid, SLOTS[int(rng.integers(0, 3))])
+        for o, hid in zip(h_owner, h_ids) if p["active"][o]])
+    joined = act[rng.random(len(act)) < 0.3]
+    if challenge_id is not None:
+        counts["user_challenges"] = text_copy(
+            cur, "public.user_challenges", ("user_id", "challenge_id", "start_date", "status"),
+            [(uid_str[i], challenge_id, _iso(today - int(rng.integers(0, 7))), "active") for i in joined])
+    return counts
+
+
+# ---------- recipes ----------
+def recipe_rows(count: int, seed: int) -> List[Tuple]:
+    """`count` global recipes spread over meal types, with ingredient lists from INGREDIENTS."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        meal, lo, hi = RECIPE_KINDS[i % len(RECIPE_KINDS)]
+        kcal = rng.randint(lo, hi)
+        protein = int(kcal * rng.uniform(0.04, 0.11))
+        fat = int(kcal * rng.uniform(0.2, 0.35) / 9)
+        carbs = max(0, (kcal - 4 * protein - 9 * fat) // 4)
+        picked = rng.sample(INGREDIENTS, rng.randint(3, 6))
+        ingredients = [{"name": name, "qty": qty, "unit": unit} for name, unit, qty in picked]
+        tags = [meal] + [t for t, ok in (("high-protein", protein * 4 >= kcal * 0.3), ("easy", rng.random() < 0.4)) if ok]
+        vegetarian = not any(name in ("blanc de poulet", "saumon", "thon au naturel") for name, _, _ in picked)
+        rows.append((f"{picked[0][0].capitalize()} & {picked[1][0]} n°{i + 1}", kcal, protein, carbs, fat,
+                     rng.choice((5, 10, 15, 20, 30)), tags, "vegetarian" if vegetarian else "omnivore",
+                     json.dumps(ingredients, ensure_ascii=False), ["Préparer les ingrédients", "Cuire", "Servir"],
+                     json.dumps(normalize_ingredients(ingredients), ensure_ascii=False)))
+    return rows
+
+
+def load_recipes(conn, count: int, seed: int) -> int:
+    """Through the normal triggers (one statement, so one catalog version bump)."""
+    with conn, conn.cursor() as cur:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO recipes (name, kcal, protein_g, carbs_g, fat_g, prep_min, tags, diet, ingredients, steps,
+                                 ingredients_norm)
+            VALUES %s ON CONFLICT (name) DO NOTHING
+        """, recipe_rows(count, seed), page_size=10000)
+    return count
+
+
+# ---------- indexes ----------
+def drop_day_indexes(conn) -> List[str]:
+    """Drops secondary indexes and PK/unique constraints of DAY_TABLES; returns the DDL to restore them."""
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT t.relname, i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid),
+                   c.conname, pg_get_constraintdef(c.oid)
+            FROM pg_index i
+            JOIN pg_class t ON t.oid = i.indrelid
+            JOIN pg_namespace ns ON ns.oid = t.relnamespace
+            LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid AND c.conrelid = i.indrelid
+            WHERE ns.nspname = 'public' AND t.relname = ANY(%s)
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint f WHERE f.contype = 'f' AND f.conindid = i.indexrelid)
+        """, (list(DAY_TABLES),))
+        restore = []
+        for table, index, indexdef, conname, condef in cur.fetchall():
+            if conname:
+                cur.execute(f'ALTER TABLE public.{table} DROP CONSTRAINT "{conname}"')
+                restore.append(f'ALTER TABLE public.{table} ADD CONSTRAINT "{conname}" {condef}')
+            else:
+                cur.execute(f"DROP INDEX {index}")
+                restore.append(indexdef)
+    return restore
+
+
+def run_parallel(dsn: str, statements: Sequence[str], jobs: int):
+    def one(sql):
+        conn = psycopg2.connect(dsn)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET maintenance_work_mem = '512MB'")
+                cur.execute(sql)
+        finally:
+            conn.close()
+    with ThreadPoolExecutor(max(1, jobs)) as pool:
+        list(pool.map(one, statements))
+
+
+# ---------- workers ----------
+_worker_conn = None
+
+
+def _init_worker(dsn: str):
+    global _worker_conn
+    _worker_conn = psycopg2.connect(dsn)
+    with _worker_conn.cursor() as cur:
+        cur.execute("SET session_replication_role = replica")
+        cur.execute("SET synchronous_commit = off")
+    _worker_conn.commit()
+
+
+def _load_chunk(task) -> Dict[str, int]:
+    cfg, chunk, challenge_id = task
+    with _worker_conn, _worker_conn.cursor() as cur:
+        return generate_chunk(cfg, chunk, cur, challenge_id)
+
+
+def generate(dsn: str, cfg: Config, jobs: int, defer_indexes: bool = True, log=sys.stderr) -> Dict[str, int]:
+    """Loads everything; returns rows written per table."""
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT rolsuper FROM pg_roles WHERE rolname = current_user")
+        if not cur.fetchone()[0]:
+            raise SystemExit("datagen needs a superuser (it loads with session_replication_role = replica)")
+        cur.execute("SELECT EXISTS (SELECT 1 FROM public.users)")
+        if cur.fetchone()[0]:
+            raise SystemExit("the database already has users; load into an empty schema (--reset)")
+        cur.execute("SELECT id FROM challenges ORDER BY id LIMIT 1")
+        row = cur.fetchone()
+    challenge_id = row[0] if row else None
+
+    t0 = time.perf_counter()
+    totals = {"recipes": load_recipes(conn, cfg.recipes, cfg.seed)}
+    restore = drop_day_indexes(conn) if defer_indexes else []
+    chunks = (cfg.users + CHUNK_USERS - 1) // CHUNK_USERS
+    try:
+        with multiprocessing.get_context("spawn").Pool(jobs, _init_worker, (dsn,)) as pool:
+            done = 0
+            for counts in pool.imap_unordered(_load_chunk, [(cfg, c, challenge_id) for c in range(chunks)]):
+                for table, n in counts.items():
+                    totals[table] = totals.get(table, 0) + n
+                done += 1
+                if done % max(1, chunks // 20) == 0 or done == chunks:
+                    rows = sum(totals.values())
+                    secs = time.perf_counter() - t0
+                    print(f"  {done}/{chunks} chunks, {rows:,} rows, {rows / secs:,.0f} rows/s", file=log)
+    finally:
+        if restore:
+            t = time.perf_counter()
+            run_parallel(dsn, restore, jobs)
+            print(f"  rebuilt {len(restore)} indexes in {time.perf_counter() - t:.1f}s", file=log)
+
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT setval('habits_id_seq', GREATEST((SELECT MAX(id) FROM habits), 1))")
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE")
+    conn.close()
+    return totals
+
+
+# ---------- verification ----------
+CHECKS = [
+    ("checkin_daily", "SELECT public.rebuild_checkin_daily(%(u)s)",
+     "SELECT c_date, done_count, total_count FROM checkin_daily WHERE user_id = %(u)s ORDER BY c_date"),
+    ("user_streaks", "SELECT public.rebuild_user_streaks(%(u)s)",
+     "SELECT perfect_start, perfect_end, soft_start, soft_end, longest_perfect, longest_soft"
+     " FROM user_streaks WHERE user_id = %(u)s"),
+    ("user_xp", "SELECT public.rebuild_user_xp(%(u)s)", "SELECT total_xp FROM user_xp WHERE user_id = %(u)s"),
+    ("weigh_ins.trend", "SELECT public.rebuild_weigh_in_trends(%(u)s)",
+     "SELECT wi_date, trend FROM weigh_ins WHERE user_id = %(u)s ORDER BY wi_date"),
+]
+
+
+def check(dsn: str, cfg: Config, samples: int) -> List[str]:
+    """Recomputes sampled users' rollups with the SQL rebuild functions (rolled back); returns mismatches."""
+    rng = random.Random(cfg.seed)
+    mismatches = []
+    conn = psycopg2.connect(dsn)
+    try:
+        for index in rng.sample(range(cfg.users), min(samples, cfg.users)):
+            u = {"u": user_id(cfg.seed, index)}
+            with conn.cursor() as cur:
+                for name, rebuild, select in CHECKS:
+                    cur.execute(select, u)
+                    loaded = cur.fetchall()
+                    cur.execute(rebuild, u)
+                    cur.execute(select, u)
+                    if cur.fetchall() != loaded:
+                        mismatches.append(f"{name} differs for user {index} ({u['u']})")
+            conn.rollback()
+    finally:
+        conn.close()
+    return mismatches
+
+
+# ---------- CLI ----------
+def config_from_args(args) -> Config:
+    lo, _, hi = args.habits.partition("-")
+    return Config(users=args.users, days=max(1, round(args.years * 365)), active=args.active,
+                  dormant_days=args.dormant_days, habits_min=int(lo), habits_max=int(hi or lo),
+                  weigh_ins_per_week=args.weigh_ins_per_week, recipes=args.recipes, seed=args.seed,
+                  today=date.fromisoformat(args.today) if args.today else date.today())
+
+
+def add_arguments(parser):
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--years", type=float, default=2.0, help="history length (signups spread over it)")
+    parser.add_argument("--active", type=float, default=0.25, help="share of users still active today")
+    parser.add_argument("--dormant-days", type=float, default=45, help="mean lifetime of users who stopped")
+    parser.add_argument("--habits", default="3-6", help="habits per user, MIN-MAX (at most %d)" % MAX_HABITS)
+    parser.add_argument("--weigh-ins-per-week", type=float, default=3.0)
+    parser.add_argument("--recipes", type=int, default=2000, help="global recipe catalog size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--today", help="last day of history, YYYY-MM-DD (default: today)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", required=True, help="target database, e.g. postgresql://postgres@localhost/boostfit")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate the database, then apply the schema")
+    add_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 2, help="loader processes")
+    parser.add_argument("--keep-indexes", action="store_true", help="load into live indexes")
+    parser.add_argument("--check", type=int, default=0, metavar="N", help="verify N sampled users' rollups afterwards")
+    args = parser.parse_args(argv)
+    cfg = config_from_args(args)
+    if not 1 <= cfg.habits_min <= cfg.habits_max <= MAX_HABITS:
+        parser.error(f"--habits must be within 1-{MAX_HABITS}")
+
+    if args.reset:
+        target = harness.Postgres.from_dsn(args.dsn)
+        admin = harness.Postgres(target.host, target.port, target.user, target.password, "postgres")
+        harness.apply_schema(harness.recreate_database(admin, target.dbname))
+
+    t = time.perf_counter()
+    totals = generate(args.dsn, cfg, args.jobs, defer_indexes=not args.keep_indexes)
+    secs = time.perf_counter() - t
+    rows = sum(totals.values())
+    width = max(map(len, totals))
+    for table, n in sorted(totals.items()):
+        print(f"{table:<{width}} {n:>14,}")
+    print(f"{'total':<{width}} {rows:>14,}  in {secs:.0f}s ({rows / secs:,.0f} rows/s)")
+
+    if args.check:
+        bad = check(args.dsn, cfg, args.check)
+        print("\n".join(bad) if bad else f"check: {args.check} users' rollups match the SQL rebuilds")
+        if bad:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Pieces of the end-to-end benchmark: a throwaway Postgres, the schema, a small
+seeded dataset, HS256 tokens and a gunicorn/uvicorn server (see loadtest.py).
+"""
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+import jwt
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_PATH = os.path.join(os.path.dirname(BACKEND_DIR), "db", "supabase.sql")
+
+# Supabase provides auth.users; the schema only needs the columns handle_new_user reads
+AUTH_STUB = """
+CREATE SCHEMA IF NOT EXISTS auth;
+CREATE TABLE IF NOT EXISTS auth.users (id UUID PRIMARY KEY, email TEXT, raw_user_meta_data JSONB);
+"""
+
+HABITS = [
+    ("Boire 1,5 L d'eau", "💧", "hydration", 1),
+    ("10 000 pas", "🚶", "movement", 2),
+    ("Protéines à chaque repas", "🥚", "nutrition", 2),
+    ("Légumes au dîner", "🥦", "nutrition", 1),
+    ("20 min de renfo", "💪", "movement", 3),
+    ("Coucher avant 23h", "🌙", "lifestyle", 2),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(check, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"timed out waiting for {what}")
+        time.sleep(0.2)
+
+
+# ---------- Postgres ----------
+class Postgres:
+    """Connection settings of the database under test (DB_* env vars for main.py)."""
+
+    def __init__(self, host: str, port: int, user: str, password: str, dbname: str):
+        self.host, self.port, self.user, self.password, self.dbname = host, port, user, password, dbname
+
+    @classmethod
+    def from_dsn(cls, dsn: str) -> "Postgres":
+        p = psycopg2.extensions.parse_dsn(dsn)
+        return cls(p.get("host", "127.0.0.1"), int(p.get("port", 5432)), p.get("user", "postgres"),
+                   p.get("password", ""), p.get("dbname", "postgres"))
+
+    def dsn(self) -> str:
+        return psycopg2.extensions.make_dsn(host=self.host, port=self.port, user=self.user,
+                                            password=self.password or None, dbname=self.dbname)
+
+    def connect(self, dbname: Optional[str] = None):
+        return psycopg2.connect(host=self.host, port=self.port, user=self.user,
+                                password=self.password, dbname=dbname or self.dbname)
+
+    def env(self) -> Dict[str, str]:
+        return {"DB_HOST": self.host, "DB_PORT": str(self.port), "DB_USER": self.user,
+                "DB_PASSWORD": self.password, "DB_NAME": self.dbname}
+
+    def server_version(self) -> str:
+        with self.connect() as conn, conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            return cur.fetchone()[0]
+
+
+def recreate_database(admin: Postgres, dbname: str) -> Postgres:
+    conn = admin.connect()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+        cur.execute(f"CREATE DATABASE \"{dbname}\" ENCODING 'UTF8' TEMPLATE template0")
+    conn.close()
+    return Postgres(admin.host, admin.port, admin.user, admin.password, dbname)
+
+
+@contextmanager
+def local_postgres(pg_bin: Optional[str] = None) -> Iterator[Postgres]:
+    """initdb + pg_ctl in a temp directory (binaries from `pg_bin` or PATH), removed afterwards."""
+    def tool(name):
+        path = os.path.join(pg_bin, name) if pg_bin else shutil.which(name)
+        if not path or not os.path.exists(path):
+            raise RuntimeError(f"{name} not found; pass --pg-bin, --docker or --dsn")
+        return path
+
+    root = tempfile.mkdtemp(prefix="boostfit-bench-")
+    data = os.path.join(root, "data")
+    port = free_port()
+    started = False
+    try:
+        subprocess.run([tool("initdb"), "-D", data, "-U", "postgres", "-A", "trust", "-E", "UTF8",
+                        "--no-locale"], check=True, stdout=subprocess.DEVNULL)
+        opts = f"-p {port} -k {root} -c listen_addresses=127.0.0.1 -c max_connections=200 -c fsync=off"
+        subprocess.run([tool("pg_ctl"), "-D", data, "-o", opts, "-l", os.path.join(root, "postgres.log"),
+                        "-w", "start"], check=True, stdout=subprocess.DEVNULL)
+        started = True
+        yield Postgres("127.0.0.1", port, "postgres", "", "postgres")
+    finally:
+        if started:
+            subprocess.run([tool("pg_ctl"), "-D", data, "-m", "fast", "-w", "stop"],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+@contextmanager
+def docker_postgres(image: str = "postgres:16") -> Iterator[Postgres]:
+    """A disposable postgres container published on a free local port."""
+    port = free_port()
+    password = "bench"
+    cid = subprocess.run(
+        ["docker", "run", "-d", "--rm", "-e", f"POSTGRES_PASSWORD={password}", "-p", f"127.0.0.1:{port}:5432",
+         image, "-c", "max_connections=200", "-c", "fsync=off"],
+        check=True, capture_output=True, text=True).stdout.strip()
+    pg = Postgres("127.0.0.1", port, "postgres", password, "postgres")
+    try:
+        # the image restarts the server once after init; wait until it accepts queries
+        wait_for(lambda: pg.connect().close() is None, 60, "postgres container")
+        yield pg
+    finally:
+        subprocess.run(["docker", "stop", cid], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def apply_schema(pg: Postgres, path: str = SCHEMA_PATH):
+    """Auth stub + db/supabase.sql; uuid-ossp is skipped when the server doesn't ship it."""
+    with open(path, encoding="utf-8") as f:
+        sql = f.read()
+    conn = pg.connect()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(AUTH_STUB)
+        try:
+            cur.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"')
+        except psycopg2.Error:
+            pass  # contrib not installed; nothing in the schema calls it
+        sql = "\n".join(line for line in sql.splitlines() if '"uuid-ossp"' not in line)
+        cur.execute(sql)
+    conn.close()
+
+
+# ---------- data ----------
+def seed(pg: Postgres, users: int, days: int = 60, rng_seed: int = 1) -> List[Dict]:
+    """
+    `users` accounts with a few habits each and `days` of history (checkins, metrics,
+    weigh-ins, XP, a profile, today's schedule and one challenge). Goes through the
+    normal triggers so rollups (checkin_daily, user_xp, trends, data_versions) are real.
+    Returns [{"id", "habits": [habit ids]}] for the load generator.
+    """
+    rng = random.Random(rng_seed)
+    today = date.today()
+    out = []
+    conn = pg.connect()
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM challenges ORDER BY id")
+        challenges = [r[0] for r in cur.fetchall()]
+        for n in range(users):
+            uid = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            cur.execute("INSERT INTO auth.users (id, email) VALUES (%s, %s)", (uid, f"bench{n}@example.com"))
+            picked = rng.sample(HABITS, rng.randint(3, len(HABITS)))
+            habit_ids = [r[0] for r in psycopg2.extras.execute_values(
+                cur, "INSERT INTO habits (user_id, name, icon, category, difficulty) VALUES %s RETURNING id",
+                [(uid,) + h for h in picked], fetch=True)]
+            diligence = rng.uniform(0.3, 0.95)
+            start = today - timedelta(days=days - 1)
+            span = [start + timedelta(days=i) for i in range(days)]
+
+            psycopg2.extras.execute_values(
+                cur, "INSERT INTO checkins (user_id, habit_id, checkin_date, done) VALUES %s",
+                [(uid, h, d, rng.random() < diligence) for d in span for h in habit_ids])
+            psycopg2.extras.execute_values(
+                cur, """INSERT INTO daily_metrics (user_id, m_date, steps, sleep_hours, protein_g, fiber_g,
+                        water_ml, strength_min, cardio_min, mood, hunger) VALUES %s""",
+                [(uid, d, rng.randint(2000, 14000), round(rng.uniform(5.5, 8.5), 1), rng.randint(50, 140),
+                  rng.randint(10, 35), rng.randint(800, 2500), rng.choice((0, 0, 20, 40)), rng.choice((0, 15, 30)),
+                  rng.randint(2, 5), rng.randint(1, 5)) for d in span if rng.random() < diligence])
+            kg = rng.uniform(65, 105)
+            weigh = []
+            for d in span:
+                kg += rng.gauss(-0.03, 0.35)
+                if rng.random() < 0.5:
+                    weigh.append((uid, d, round(kg, 2)))
+            psycopg2.extras.execute_values(cur, "INSERT INTO weigh_ins (user_id, wi_date, kg) VALUES %s", weigh)
+            psycopg2.extras.execute_values(
+                cur, "INSERT INTO xp_events (user_id, ts, reason, amount) VALUES %s",
+                [(uid, datetime.combine(d, datetime.min.time(), timezone.utc) + timedelta(hours=20),
+                  "habit_done", 10) for d in span for _ in range(rng.randint(0, len(habit_ids)))])
+            cur.execute("""
+                INSERT INTO user_profile (user_id, sex, birth_year, height_cm, weight_kg, activity_factor,
+                                          deficit_percent, diet)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+            """, (uid, rng.choice(("male", "female")), rng.randint(1960, 2004), rng.randint(155, 195),
+                  round(kg, 1), rng.choice((1.2, 1.4, 1.6)), rng.choice((0.10, 0.15, 0.20)),
+                  rng.choice(("omnivore", "omnivore", "vegetarian"))))
+            psycopg2.extras.execute_values(
+                cur, "INSERT INTO habit_schedule (user_id, s_date, habit_id, slot) VALUES %s",
+                [(uid, today, h, rng.choice(("morning", "lunch", "evening"))) for h in habit_ids])
+            if challenges:
+                cur.execute("INSERT INTO user_challenges (user_id, challenge_id, start_date) VALUES (%s,%s,%s)",
+                            (uid, rng.choice(challenges), today - timedelta(days=rng.randint(0, 6))))
+            out.append({"id": uid, "habits": habit_ids})
+    conn.close()
+    return out
+
+
+def mint_token(user_id: str, secret: str, ttl: int = 24 * 3600) -> str:
+    """Same shape as a Supabase access token, as far as get_current_user_id cares."""
+    now = int(time.time())
+    return jwt.encode({"sub": user_id, "aud": "authenticated", "role": "authenticated",
+                       "iat": now, "exp": now + ttl}, secret, algorithm="HS256")
+
+
+# ---------- API server ----------
+@contextmanager
+def api_server(pg: Postgres, secret: str, workers: int = 4, extra_env: Optional[Dict[str, str]] = None,
+               log_path: Optional[str] = None) -> Iterator[str]:
+    """The Dockerfile's gunicorn + uvicorn workers command on a free port; yields the base URL."""
+    port = free_port()
+    env = dict(os.environ, **pg.env(), SUPABASE_JWT_SECRET=secret, **(extra_env or {}))
+    log = open(log_path, "ab") if log_path else subprocess.DEVNULL
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers),
+         "-k", "uvicorn.workers.UvicornWorker", "main:app", "--bind", f"127.0.0.1:{port}"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=log)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        def up():
+            if proc.poll() is not None:
+                raise SystemExit(f"gunicorn exited with {proc.returncode}" + (f", see {log_path}" if log_path else ""))
+            with urllib.request.urlopen(url + "/health", timeout=1) as r:
+                return r.status == 200
+        wait_for(up, 60, "API server")
+        yield url
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        if log_path:
+            log.close()
@@ -0,0 +1,357 @@
+"""
+End-to-end latency benchmark: throwaway Postgres + schema + seeded users, the
+gunicorn/uvicorn stack from the Dockerfile, and a weighted per-user request mix.
+
+    cd backend && python -m bench.loadtest run [--pg-bin DIR | --docker | --dsn URL]
+                                               [--users 200] [--concurrency 32] [--duration 60]
+                                               [--scale 1000000]
+    cd backend && python -m bench.loadtest compare bench/results/OLD.json bench/results/NEW.json
+
+`run` prints throughput and p50/p95/p99 per endpoint and saves them to
+bench/results/<utc time>-<git sha>.json; `compare` diffs two such files and exits
+non-zero when an endpoint's p95 got worse by more than --threshold.
+
+Each worker thread plays one user at a time for a short visit (a handful of
+requests drawn from MIX), keeping the ETags it was served like the PWA does, then
+switches to another user. Postgres comes from --dsn (a database named --db-name is
+dropped and recreated on that server), a `postgres:16` container (--docker), or
+initdb/pg_ctl in a temp directory (default; binaries from --pg-bin or PATH).
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import requests
+
+from bench import datagen, harness
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SECRET = "bench-secret-not-for-production"
+
+
+class Call(NamedTuple):
+    method: str
+    path: str
+    params: Optional[Dict] = None
+    body: Optional[object] = None
+
+
+class Endpoint(NamedTuple):
+    label: str
+    weight: int
+    call: Callable[[Dict, random.Random], Optional[Call]]
+    conditional: bool = False   # sends If-None-Match when it has an ETag for the URL
+    expected: Tuple[int, ...] = ()  # non-2xx answers that aren't errors
+
+
+def _checkin(u, rng):
+    return Call("POST", "/api/checkins", body={"habit_id": rng.choice(u["habits"]), "done": rng.random() < 0.7})
+
+
+def _weighin(u, rng):
+    return Call("POST", "/api/weighins", body={"kg": round(rng.uniform(60, 110), 1)})
+
+
+def _metrics(u, rng):
+    return Call("POST", "/api/metrics/today", body={"steps": rng.randint(1000, 15000), "water_ml": rng.randint(500, 2500),
+                                                    "protein_g": rng.randint(40, 150), "mood": rng.randint(1, 5)})
+
+
+def _shopping(u, rng):
+    return Call("POST", "/api/shopping-list", body={"recipe_ids": u["plan"]}) if u.get("plan") else None
+
+
+def _get(path, **params):
+    return lambda u, rng: Call("GET", path, params or None)
+
+
+# what an active user's app does over a day, roughly: dashboard and habits dominate
+MIX: List[Endpoint] = [
+    Endpoint("GET /api/dashboard/today", 15, _get("/api/dashboard/today")),
+    Endpoint("GET /api/habits", 10, _get("/api/habits")),
+    Endpoint("POST /api/checkins", 12, _checkin),
+    Endpoint("GET /api/plan/today", 4, _get("/api/plan/today")),
+    Endpoint("GET /api/trend", 6, _get("/api/trend"), conditional=True),
+    Endpoint("GET /api/weighins", 3, _get("/api/weighins"), conditional=True),
+    Endpoint("POST /api/weighins", 3, _weighin),
+    Endpoint("GET /api/metrics/today", 4, _get("/api/metrics/today"), conditional=True),
+    Endpoint("GET /api/metrics/week", 3, _get("/api/metrics/week"), conditional=True),
+    Endpoint("POST /api/metrics/today", 3, _metrics),
+    Endpoint("GET /api/targets", 2, _get("/api/targets")),
+    Endpoint("GET /api/insights/today", 4, _get("/api/insights/today")),
+    Endpoint("GET /api/coach/message", 3, _get("/api/coach/message")),
+    Endpoint("GET /api/gamify/status", 4, _get("/api/gamify/status"), conditional=True),
+    Endpoint("GET /api/garden/state", 3, _get("/api/garden/state")),
+    Endpoint("GET /api/challenges/active", 2, _get("/api/challenges/active"), expected=(404,)),  # not joined
+    Endpoint("GET /api/review/weekly", 2, _get("/api/review/weekly")),
+    Endpoint("GET /api/schedule/today", 2, _get("/api/schedule/today")),
+    Endpoint("GET /api/profile", 2, _get("/api/profile"), conditional=True),
+    Endpoint("GET /api/recipes", 5, _get("/api/recipes", tag="lunch"), conditional=True),
+    Endpoint("GET /api/coach/snacks", 2, _get("/api/coach/snacks")),
+    Endpoint("POST /api/mealplan/today", 3, lambda u, rng: Call("POST", "/api/mealplan/today")),
+    Endpoint("POST /api/mealplan/week", 1, lambda u, rng: Call("POST", "/api/mealplan/week")),
+    Endpoint("GET /api/mealplan/alternatives", 2, _get("/api/mealplan/alternatives", meal_type="dinner")),
+    Endpoint("POST /api/shopping-list", 2, _shopping),
+]
+
+
+def percentile(sorted_ms: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_ms:
+        return float("nan")
+    return sorted_ms[max(0, min(len(sorted_ms) - 1, math.ceil(p / 100 * len(sorted_ms)) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.not_modified: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.recording = False
+
+    def add(self, label: str, ms: float, status: Optional[int], expected: Tuple[int, ...] = ()):
+        if not self.recording:
+            return
+        with self.lock:
+            self.samples.setdefault(label, []).append(ms)
+            codes = self.statuses.setdefault(label, {})
+            codes[str(status or "conn")] = codes.get(str(status or "conn"), 0) + 1
+            if status is None or (status >= 400 and status not in expected):
+                self.errors[label] = self.errors.get(label, 0) + 1
+            elif status == 304:
+                self.not_modified[label] = self.not_modified.get(label, 0) + 1
+
+    def summary(self, seconds: float) -> Dict:
+        def stats(ms: List[float], errors: int, not_modified: int, statuses: Dict[str, int]) -> Dict:
+            ms = sorted(ms)
+            return {"count": len(ms), "errors": errors, "not_modified": not_modified, "statuses": statuses,
+                    "rps": round(len(ms) / seconds, 2), "mean_ms": round(sum(ms) / len(ms), 2) if ms else None,
+                    **{f"p{p}_ms": round(percentile(ms, p), 2) for p in (50, 95, 99)},
+                    "max_ms": round(ms[-1], 2) if ms else None}
+        endpoints = {label: stats(ms, self.errors.get(label, 0), self.not_modified.get(label, 0),
+                                  self.statuses.get(label, {}))
+                     for label, ms in sorted(self.samples.items())}
+        codes: Dict[str, int] = {}
+        for per_label in self.statuses.values():
+            for code, n in per_label.items():
+                codes[code] = codes.get(code, 0) + n
+        total = stats([x for ms in self.samples.values() for x in ms],
+                      sum(self.errors.values()), sum(self.not_modified.values()), codes)
+        return {"endpoints": endpoints, "total": total}
+
+
+def worker(base: str, users: List[Dict], recorder: Recorder, stop: threading.Event, rng: random.Random,
+           use_etags: bool, visit: range):
+    weights = [e.weight for e in MIX]
+    session = requests.Session()
+    while not stop.is_set():
+        u = rng.choice(users)
+        headers = {"Authorization": f"Bearer {u['token']}"}
+        for ep in rng.choices(MIX, weights, k=rng.choice(visit)):
+            call = ep.call(u, rng)
+            if call is None or stop.is_set():
+                continue
+            h = headers
+            key = (call.path, tuple(sorted((call.params or {}).items())))
+            if use_etags and ep.conditional and key in u["etags"]:
+                h = dict(headers, **{"If-None-Match": u["etags"][key]})
+            t = time.perf_counter()
+            try:
+                r = session.request(call.method, base + call.path, params=call.params, json=call.body,
+                                    headers=h, timeout=30)
+                status = r.status_code
+            except requests.RequestException:
+                recorder.add(ep.label, (time.perf_counter() - t) * 1000, None)
+                continue
+            recorder.add(ep.label, (time.perf_counter() - t) * 1000, status, ep.expected)
+            if ep.conditional and r.headers.get("ETag"):
+                u["etags"][key] = r.headers["ETag"]
+            if status == 200 and call.method == "POST" and call.path.startswith("/api/mealplan/"):
+                plans = r.json()
+                u["plan"] = [it["recipe"]["id"] for p in (plans if isinstance(plans, list) else [plans])
+                             for it in p["items"]]
+
+
+def drive(base: str, users: List[Dict], concurrency: int, duration: float, warmup: float,
+          use_etags: bool = True, rng_seed: int = 1) -> Dict:
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=worker, daemon=True,
+                                args=(base, users, recorder, stop, random.Random(rng_seed * 1000 + i),
+                                      use_etags, range(3, 13)))
+               for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    time.sleep(warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    time.sleep(duration)
+    recorder.recording = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in threads:
+        t.join(timeout=35)
+    return recorder.summary(elapsed)
+
+
+# ---------- reporting ----------
+def git_revision() -> Dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=harness.BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    return {"sha": git("rev-parse", "--short", "HEAD") or "unknown",
+            "subject": git("log", "-1", "--format=%s"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def print_table(result: Dict):
+    cols = f"{'endpoint':<34} {'count':>7} {'err':>5} {'304':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    print(cols)
+    print("-" * len(cols))
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for label, s in rows:
+        print(f"{label:<34} {s['count']:>7} {s['errors']:>5} {s['not_modified']:>5} {s['rps']:>8.1f} "
+              f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}")
+
+
+def save(result: Dict, out_dir: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    rev = result["meta"]["git"]
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(out_dir, f"{stamp}-{rev['sha']}{'-dirty' if rev['dirty'] else ''}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return path
+
+
+def compare(old: Dict, new: Dict, threshold: float) -> int:
+    """Prints per-endpoint deltas; returns the number of endpoints whose p95 regressed past `threshold`."""
+    def delta(a, b):
+        return f"{(b - a) / a * 100:+6.1f}%" if a else "    n/a"
+
+    print(f"old: {old['meta']['git']['sha']}  {old['meta']['git']['subject']}")
+    print(f"new: {new['meta']['git']['sha']}  {new['meta']['git']['subject']}")
+    print(f"{'endpoint':<34} {'p50 old→new ms':>24} {'p95 old→new ms':>24} {'p99 old→new ms':>17} {'rps':>8}")
+    regressions = 0
+    rows = [(k, old["endpoints"][k], new["endpoints"][k]) for k in new["endpoints"] if k in old["endpoints"]]
+    rows.append(("TOTAL", old["total"], new["total"]))
+    for label, a, b in rows:
+        flag = ""
+        if label != "TOTAL" and a["p95_ms"] and b["p95_ms"] > a["p95_ms"] * (1 + threshold):
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{label:<34} {a['p50_ms']:>8.1f}→{b['p50_ms']:<8.1f}{delta(a['p50_ms'], b['p50_ms'])} "
+              f"{a['p95_ms']:>8.1f}→{b['p95_ms']:<8.1f}{delta(a['p95_ms'], b['p95_ms'])} "
+              f"{a['p99_ms']:>8.1f}→{b['p99_ms']:<8.1f} {delta(a['rps'], b['rps'])}{flag}")
+    only = sorted(set(old["endpoints"]) ^ set(new["endpoints"]))
+    if only:
+        print("not in both runs: " + ", ".join(only))
+    return regressions
+
+
+# ---------- CLI ----------
+def cmd_run(args):
+    if args.dsn:
+        server = nullcontext(harness.Postgres.from_dsn(args.dsn))
+    elif args.docker:
+        server = harness.docker_postgres(args.docker_image)
+    else:
+        server = harness.local_postgres(args.pg_bin)
+
+    with server as admin:
+        pg = harness.recreate_database(admin, args.db_name)
+        harness.apply_schema(pg)
+        t = time.perf_counter()
+        if args.scale:
+            cfg = datagen.Config(users=args.scale, days=args.days, active=0.25, dormant_days=45, habits_min=3,
+                                 habits_max=6, weigh_ins_per_week=3.0, recipes=2000, seed=args.seed,
+                                 today=date.today())
+            datagen.generate(pg.dsn(), cfg, jobs=os.cpu_count() or 2)
+            users = datagen.sample_users(cfg, args.users, seed=args.seed)
+        else:
+            users = harness.seed(pg, args.users, days=args.days, rng_seed=args.seed)
+        print(f"seeded in {time.perf_counter() - t:.1f}s, driving {len(users)} users", file=sys.stderr)
+        for u in users:
+            u["token"] = harness.mint_token(u["id"], SECRET)
+            u["etags"] = {}
+
+        env = {"DB_POOL_MAX": str(args.pool_max)}
+        with harness.api_server(pg, SECRET, workers=args.workers, extra_env=env, log_path=args.server_log) as base:
+            print(f"driving {base} with {args.concurrency} clients for {args.duration:.0f}s "
+                  f"(+{args.warmup:.0f}s warm-up)", file=sys.stderr)
+            result = drive(base, users, args.concurrency, args.duration, args.warmup,
+                           use_etags=not args.no_etags, rng_seed=args.seed)
+
+        result["meta"] = {
+            "git": git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "postgres": pg.server_version(),
+            "host": {"machine": platform.machine(), "cpus": os.cpu_count()},
+            "config": {k: v for k, v in vars(args).items() if k not in ("func", "dsn")},
+        }
+    print_table(result)
+    if not args.no_save:
+        print(f"saved {save(result, args.out)}", file=sys.stderr)
+
+
+def cmd_compare(args):
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    if compare(old, new, args.threshold):
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("run", help="seed, start the API, drive load, report")
+    where = p.add_mutually_exclusive_group()
+    where.add_argument("--dsn", help="existing server, e.g. postgresql://postgres:pw@localhost:5432/postgres")
+    where.add_argument("--docker", action="store_true", help="start a disposable postgres container")
+    where.add_argument("--pg-bin", help="directory with initdb/pg_ctl (default: from PATH)")
+    p.add_argument("--docker-image", default="postgres:16")
+    p.add_argument("--db-name", default="boostfit_bench", help="database (re)created for the run")
+    p.add_argument("--users", type=int, default=200, help="users the clients act as")
+    p.add_argument("--days", type=int, default=60, help="days of history")
+    p.add_argument("--scale", type=int, metavar="N",
+                   help="load N users with bench.datagen (--days of signups) and drive --users active ones")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    p.add_argument("--pool-max", type=int, default=10, help="DB_POOL_MAX per worker")
+    p.add_argument("--concurrency", type=int, default=32, help="client threads")
+    p.add_argument("--duration", type=float, default=60)
+    p.add_argument("--warmup", type=float, default=10)
+    p.add_argument("--no-etags", action="store_true", help="never send If-None-Match")
+    p.add_argument("--server-log", help="append gunicorn output to this file")
+    p.add_argument("--out", default=RESULTS_DIR)
+    p.add_argument("--no-save", action="store_true")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("compare", help="diff two saved runs")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=0.10, help="p95 growth counted as a regression")
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Before/after cost of serializing a 50-recipe page (no database involved).
+
+    cd backend && python -m bench.serialization [--rows 50] [--repeat 2000]
+
+before:   Recipe(...) per row, then FastAPI's response_model validate + serialize
+          pass and JSONResponse rendering (what list endpoints used to do)
+uncached: rows -> dicts -> one orjson call (user-owned recipes)
+catalog:  joining the catalog's load-time JSON fragments (global recipes)
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+try:
+    from fastapi.utils import create_response_field as _create_field
+except ImportError:  # renamed in newer FastAPI
+    from fastapi.utils import create_model_field as _create_field
+
+import fastjson
+from main import Recipe, recipe_dict, recipe_from_row
+
+
+def make_rows(n: int) -> List[dict]:
+    return [{
+        "id": i, "name": f"Recette {i} — bol protéiné", "kcal": 300 + 7 * i, "protein_g": 20 + i % 15,
+        "carbs_g": 30 + i % 20, "fat_g": 8 + i % 9, "prep_min": 5 + i % 25,
+        "tags": ["lunch", "high-protein", "easy"][: 1 + i % 3], "diet": "omnivore",
+        "ingredients": [{"name": f"ingrédient {j}", "qty": 50 * (j + 1), "unit": "g"} for j in range(5)],
+        "steps": ["Couper.", "Mélanger.", "Servir."],
+    } for i in range(n)]
+
+
+def per_call(fn, repeat: int) -> float:
+    fn()
+    t = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t) / repeat
+
+
+async def per_call_async(fn, repeat: int) -> float:
+    await fn()
+    t = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    return (time.perf_counter() - t) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    rows = make_rows(args.rows)
+    field = _create_field(name="Response_list_recipes", type_=List[Recipe], mode="serialization")
+    fragments = [fastjson.dumps(recipe_dict(r)) for r in rows]
+
+    async def before():
+        content = await serialize_response(field=field, response_content=[recipe_from_row(r) for r in rows])
+        return JSONResponse(content).body
+
+    def uncached():
+        return fastjson.respond(fastjson.dumps([recipe_dict(r) for r in rows])).body
+
+    def catalog():
+        return fastjson.respond(fastjson.json_array(fragments)).body
+
+    expected = json.loads(asyncio.run(before()))
+    assert json.loads(uncached()) == expected and json.loads(catalog()) == expected
+
+    results = {
+        "before": asyncio.run(per_call_async(before, args.repeat)),
+        "uncached": per_call(uncached, args.repeat),
+        "catalog": per_call(catalog, args.repeat),
+    }
+    base = results["before"]
+    print(f"{args.rows} rows/page, {args.repeat} pages per path")
+    print(f"{'path':<10} {'us/page':>10} {'us/row':>8} {'speedup':>8}")
+    for name, secs in results.items():
+        print(f"{name:<10} {secs * 1e6:>10.1f} {secs * 1e6 / args.rows:>8.2f} {base / secs:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
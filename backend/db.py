@@ -0,0 +1,292 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.extensions
+
+
+def dsn_from_env() -> str:
+    """Builds the DATABASE_URL from individual parts for the pooler."""
+    return "postgresql://{user}:{password}@{host}:{port}/{dbname}".format(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        dbname=os.getenv("DB_NAME")
+    )
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be handed out before the acquire timeout."""
+
+
+class PoolClosed(Exception):
+    """Raised when acquiring from a pool that has been closed."""
+
+
+class _Waiter:
+    """A queued acquire request. Released connections are handed over in FIFO order."""
+    __slots__ = ("conn", "may_connect", "_event")
+
+    def __init__(self):
+        self.conn = None
+        self.may_connect = False
+        self._event = threading.Event()
+
+    def wake(self):
+        self._event.set()
+
+    def wait(self, timeout: float) -> bool:
+        return self._event.wait(timeout)
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 pool with a bounded FIFO wait queue.
+
+    When all `maxconn` connections are checked out, callers queue for up to
+    `acquire_timeout` seconds instead of failing immediately; at most
+    `max_waiters` callers may queue at once. Connections that sat idle for
+    more than `check_after` seconds are pinged before being handed out.
+    `connection_factory` is passed to psycopg2.connect (see instrumentation.py).
+    """
+
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10,
+                 acquire_timeout: float = 5.0, max_waiters: int = 100,
+                 check_after: float = 30.0, max_idle: float = 300.0, connection_factory=None):
+        self.dsn = dsn
+        self.connection_factory = connection_factory
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.max_waiters = max_waiters
+        self.check_after = check_after
+        self.max_idle = max_idle
+
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[object, float]] = []   # LIFO stack of (conn, released_at)
+        self._waiters: Deque[_Waiter] = deque()
+        self._size = 0
+        self._closed = False
+
+        # metrics
+        self._acquired = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._waits: Deque[float] = deque(maxlen=2048)
+
+        for _ in range(minconn):
+            self._size += 1
+            self._idle.append((self._connect(), time.monotonic()))
+
+    # ---------- connections ----------
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=self.connection_factory)
+        psycopg2.extras.register_uuid(conn_or_curs=conn)
+        return conn
+
+    def _healthy(self, conn, idle_since: Optional[float]) -> bool:
+        if conn.closed:
+            return False
+        if idle_since is None or time.monotonic() - idle_since < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ---------- acquire / release ----------
+    def _checkout(self):
+        """Returns (conn, idle_since, waiter). Exactly one of conn / waiter is set, unless we may connect."""
+        with self._lock:
+            if self._closed:
+                raise PoolClosed("connection pool is closed")
+            if self._idle:
+                conn, since = self._idle.pop()
+                return conn, since, None
+            if self._size < self.maxconn:
+                self._size += 1
+                return None, None, None
+            if len(self._waiters) >= self.max_waiters:
+                self._rejected += 1
+                raise PoolTimeout("connection pool wait queue is full")
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+            return None, None, waiter
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Removes a timed-out waiter. Returns False if a connection was handed over meanwhile."""
+        with self._lock:
+            if waiter.conn is not None or waiter.may_connect:
+                return False
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            self._timeouts += 1
+            return True
+
+    def _record_wait(self, started: float):
+        waited = time.monotonic() - started
+        with self._lock:
+            self._acquired += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._waits.append(waited)
+
+    def _slot_lost(self):
+        """A slot reserved for a new connection could not be filled."""
+        with self._lock:
+            self._size -= 1
+            self._discarded += 1
+            self._grant_slot_locked()
+
+    def _grant_slot_locked(self):
+        if self._waiters and self._size < self.maxconn:
+            w = self._waiters.popleft()
+            self._size += 1
+            w.may_connect = True
+            w.wake()
+
+    def acquire(self, timeout: Optional[float] = None):
+        """Checks out a connection, waiting in line up to `timeout` seconds."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            conn, since, waiter = self._checkout()
+            if waiter is not None:
+                if not waiter.wait(max(0.0, deadline - time.monotonic())) and self._abandon(waiter):
+                    raise PoolTimeout(f"no database connection available after {timeout:.1f}s")
+                if waiter.conn is None and not waiter.may_connect:
+                    raise PoolClosed("connection pool is closed")
+                conn, since = waiter.conn, None
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._slot_lost()
+                    raise
+            elif not self._healthy(conn, since):
+                self._close_quietly(conn)
+                self._slot_lost()
+                if time.monotonic() >= deadline:
+                    raise PoolTimeout(f"no healthy database connection after {timeout:.1f}s")
+                continue
+            self._record_wait(started)
+            return conn
+
+    def release(self, conn, discard: bool = False):
+        """Returns a connection to the pool, handing it straight to the oldest waiter if any."""
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+        if discard or conn.closed:
+            self._close_quietly(conn)
+            self._slot_lost()
+            return
+
+        stale = []
+        with self._lock:
+            if self._closed:
+                stale.append(conn)
+                self._size -= 1
+            elif self._waiters:
+                w = self._waiters.popleft()
+                w.conn = conn
+                w.wake()
+            else:
+                now = time.monotonic()
+                self._idle.append((conn, now))
+                # trim connections idle for too long, oldest first, keeping minconn around
+                while len(self._idle) > 1 and self._size > self.minconn and now - self._idle[0][1] > self.max_idle:
+                    stale.append(self._idle.pop(0)[0])
+                    self._size -= 1
+        for c in stale:
+            self._close_quietly(c)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Checks out a connection for one unit of work: commit on success, rollback on error."""
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            discard = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not conn.closed and not discard:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    # ---------- lifecycle / metrics ----------
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            waiters = list(self._waiters)
+            self._waiters.clear()
+        for c in idle:
+            self._close_quietly(c)
+        for w in waiters:
+            w.wake()
+
+    def usage(self) -> Tuple[int, int, int]:
+        """(checked_out, idle, waiting); cheap enough to sample on every request, unlike stats()."""
+        with self._lock:
+            idle = len(self._idle)
+            return self._size - idle, idle, len(self._waiters)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            waits = sorted(self._waits)
+            idle = len(self._idle)
+            out = {
+                "size": self._size,
+                "max": self.maxconn,
+                "idle": idle,
+                "checked_out": self._size - idle,
+                "waiting": len(self._waiters),
+                "acquired": self._acquired,
+                "timeouts": self._timeouts,
+                "rejected": self._rejected,
+                "discarded": self._discarded,
+                "wait_avg_ms": round(1000 * self._wait_total / self._acquired, 3) if self._acquired else 0.0,
+                "wait_max_ms": round(1000 * self._wait_max, 3),
+            }
+
+        def pct(p):
+            return round(1000 * waits[min(len(waits) - 1, int(p * len(waits)))], 3) if waits else 0.0
+        out["wait_p50_ms"] = pct(0.50)
+        out["wait_p99_ms"] = pct(0.99)
+        return out
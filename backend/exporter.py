@@ -0,0 +1,86 @@
+"""
+User-data export: tables are read one after another through server-side (named)
+cursors and encoded a batch at a time, so memory stays flat whatever the history
+length. Column names match what importer.py reads back (date, kg, metrics fields).
+"""
+import csv
+import io
+import json
+from typing import Dict, Iterator, List, Sequence, Tuple
+from uuid import UUID
+
+import fastjson
+
+BATCH = 2000
+
+# table -> ((name, SQL expression), ...), FROM / WHERE / ORDER BY with one %s for the user
+EXPORT_TABLES: Dict[str, Tuple[Tuple[Tuple[str, str], ...], str]] = {
+    "habits": (
+        (("id", "id"), ("name", "name"), ("icon", "icon"), ("category", "category"),
+         ("difficulty", "difficulty"), ("created_at", "created_at")),
+        "FROM habits WHERE user_id = %s ORDER BY id"),
+    "checkins": (
+        (("date", "checkin_date"), ("habit_id", "habit_id"), ("done", "done")),
+        "FROM checkins WHERE user_id = %s ORDER BY checkin_date, habit_id"),
+    "weigh_ins": (
+        (("date", "wi_date"), ("kg", "(kg)::float"), ("trend", "trend")),
+        "FROM weigh_ins WHERE user_id = %s ORDER BY wi_date"),
+    "daily_metrics": (
+        (("date", "m_date"), ("steps", "steps"), ("sleep_hours", "(sleep_hours)::float"),
+         ("protein_g", "protein_g"), ("fiber_g", "fiber_g"), ("water_ml", "water_ml"),
+         ("strength_min", "strength_min"), ("cardio_min", "cardio_min"), ("mood", "mood"),
+         ("hunger", "hunger"), ("notes", "notes")),
+        "FROM daily_metrics WHERE user_id = %s ORDER BY m_date"),
+    "xp_events": (
+        (("ts", "ts"), ("reason", "reason"), ("amount", "amount"), ("meta", "meta")),
+        "FROM xp_events WHERE user_id = %s ORDER BY ts, id"),
+    "recipes": (
+        (("id", "id"), ("name", "name"), ("kcal", "kcal"), ("protein_g", "protein_g"), ("carbs_g", "carbs_g"),
+         ("fat_g", "fat_g"), ("prep_min", "prep_min"), ("tags", "tags"), ("diet", "diet"),
+         ("ingredients", "ingredients"), ("steps", "steps")),
+        "FROM recipes WHERE user_id = %s ORDER BY id"),
+}
+
+
+def _csv_cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def _csv(rows: Sequence[Sequence]) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf).writerows([_csv_cell(v) for v in row] for row in rows)
+    return buf.getvalue().encode()
+
+
+def stream_export(conn, user_id: UUID, tables: List[str], fmt: str, header: Dict) -> Iterator[bytes]:
+    """
+    Yields the export in chunks of up to BATCH rows. NDJSON starts with `header`
+    (type "export") and tags every row with its table; CSV carries one table. The
+    first chunk is produced before any query runs, and all tables are read from
+    one read-only snapshot.
+    """
+    if fmt == "ndjson":
+        yield fastjson.dumps({"type": "export", **header}) + b"\n"
+    else:
+        yield _csv([[name for name, _ in EXPORT_TABLES[tables[0]][0]]])
+
+    with conn.cursor() as cur:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+    for table in tables:
+        columns, source = EXPORT_TABLES[table]
+        names = [name for name, _ in columns]
+        with conn.cursor(name=f"export_{table}") as cur:
+            cur.itersize = BATCH
+            cur.execute(f"SELECT {', '.join(expr for _, expr in columns)} {source}", (user_id,))
+            while True:
+                rows = cur.fetchmany(BATCH)
+                if not rows:
+                    break
+                if fmt == "ndjson":
+                    yield b"".join(fastjson.dumps({"type": table, **dict(zip(names, row))}) + b"\n" for row in rows)
+                else:
+                    yield _csv(rows)
@@ -0,0 +1,36 @@
+from typing import Any, Iterable, Optional
+
+import orjson
+from fastapi import Response
+
+
+class JSONBytesResponse(Response):
+    """
+    Body is already-encoded JSON. Returning a Response from a path operation makes
+    FastAPI skip the response_model validate + serialize pass; keep `response_model`
+    on the decorator so the OpenAPI schema is unchanged.
+    """
+    media_type = "application/json"
+
+
+def dumps(obj: Any) -> bytes:
+    """orjson encoding (dates as ISO strings, UTF-8 kept as-is like Starlette's JSONResponse)."""
+    return orjson.dumps(obj)
+
+
+def json_array(fragments: Iterable[bytes]) -> bytes:
+    """Joins pre-encoded JSON values into an array without re-parsing them."""
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def respond(body: bytes, sub_response: Optional[Response] = None, status_code: int = 200) -> JSONBytesResponse:
+    """
+    Wraps `body`, carrying over headers set on the injected `Response` by dependencies
+    (e.g. ETag from `conditional`), which FastAPI would otherwise drop.
+    """
+    out = JSONBytesResponse(content=body, status_code=status_code)
+    if sub_response is not None:
+        for key, value in sub_response.headers.raw:
+            if key != b"content-length":
+                out.headers.raw.append((key, value))
+    return out
@@ -0,0 +1,33 @@
+"""
+Gunicorn hooks for Prometheus multiprocess mode (see metrics.py). Picked up from the
+working directory by default; worker count, class and bind stay on the command line.
+"""
+import glob
+import os
+import shutil
+import tempfile
+
+# Workers inherit this from the master, so it must be set before they import metrics.py.
+# Without an explicit dir each master gets its own, so two servers on one host don't mix samples.
+_own_dir = None
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    _own_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="boostfit-prometheus-")
+
+
+def on_starting(server):
+    """Samples left over from a previous master would be summed into the new ones."""
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(path, exist_ok=True)
+    for f in glob.glob(os.path.join(path, "*.db")):
+        os.remove(f)
+
+
+def child_exit(server, worker):
+    """Drops a dead worker's live gauges (in-flight, pool, threadpool)."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _own_dir:
+        shutil.rmtree(_own_dir, ignore_errors=True)
@@ -0,0 +1,130 @@
+"""
+History imports: streaming CSV / NDJSON readers and a file-like adapter that feeds
+validated rows to `COPY ... FROM STDIN`, so a file is parsed, checked and loaded in
+one pass without ever being held in memory.
+"""
+import csv
+import io
+import json
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+FORMATS = ("csv", "ndjson")
+
+
+class ImportFormatError(ValueError):
+    """The file as a whole can't be imported (format, header, encoding, size)."""
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    name = (filename or "").lower()
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    if name.endswith(".csv") or ctype in ("text/csv", "application/csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or ctype in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+def read_records(binary, fmt: str) -> Iterator[Tuple[int, Union[Dict, ValueError]]]:
+    """
+    Yields (line number, record) from a binary file object. Empty CSV cells are left
+    out of the record; an NDJSON line that isn't a JSON object yields a ValueError
+    in place of the record so it is reported like any other invalid row.
+    """
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.reader(text)
+            header = next(reader, None)
+            if not header:
+                raise ImportFormatError("empty file or missing CSV header")
+            header = [h.strip().lower() for h in header]
+            for cells in reader:
+                if cells:
+                    yield reader.line_num, {h: v for h, v in zip(header, cells) if h and v.strip()}
+        else:
+            for n, line in enumerate(text, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield n, ValueError(f"invalid JSON: {e}")
+                    continue
+                yield n, record if isinstance(record, dict) else ValueError("expected a JSON object")
+    except UnicodeDecodeError:
+        raise ImportFormatError("file is not UTF-8 text")
+    except csv.Error as e:
+        raise ImportFormatError(f"unreadable CSV: {e}")
+    finally:
+        text.detach()  # the upload's file object stays open; its owner closes it
+
+
+def _copy_text(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, str):
+        return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return str(value)
+
+
+def error_message(e: ValueError) -> str:
+    errors = getattr(e, "errors", None)
+    if callable(errors):  # pydantic.ValidationError
+        return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in errors())
+    return str(e)
+
+
+class CopyStream:
+    """
+    `read()` for cursor.copy_expert: pulls records, runs `convert` (raise ValueError
+    to reject a row), and returns COPY text lines prefixed with the source line
+    number. Rejected rows are counted, and the first `max_errors` kept for the caller.
+    psycopg2 turns exceptions raised here into QueryCanceled; the original is kept
+    in `failure` so the caller can re-raise it.
+    """
+
+    def __init__(self, records: Iterator[Tuple[int, Union[Dict, ValueError]]],
+                 convert: Callable[[Dict], Sequence], max_rows: int, max_errors: int = 20):
+        self.records = records
+        self.convert = convert
+        self.max_rows = max_rows
+        self.max_errors = max_errors
+        self.rows = 0
+        self.invalid = 0
+        self.errors: List[Tuple[int, str]] = []
+        self.failure: Optional[ImportFormatError] = None
+
+    def _reject(self, line: int, e: ValueError):
+        self.invalid += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, error_message(e)))
+
+    def read(self, size: int = 65536) -> str:
+        try:
+            return self._read(size)
+        except ImportFormatError as e:
+            self.failure = e
+            raise
+
+    def _read(self, size: int) -> str:
+        out, length = [], 0
+        for line, record in self.records:
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                values = self.convert(record)
+            except ValueError as e:
+                self._reject(line, e)
+                continue
+            self.rows += 1
+            if self.rows > self.max_rows:
+                raise ImportFormatError(f"more than {self.max_rows} rows")
+            text = "\t".join(_copy_text(v) for v in (line, *values)) + "\n"
+            out.append(text)
+            length += len(text)
+            if length >= size:
+                break
+        return "".join(out)
@@ -0,0 +1,196 @@
+"""
+Nightly insights baseline: per user, everything the insights / coach / weekly review
+endpoints need about the 6 days before `as_of` (checkin counts, metric sums, recent
+weigh-ins) plus the plateau fit over the last 14 weigh-ins (plateau.py). The
+endpoints add today's rows on top, so a fresh baseline is only invalidated by
+back-dated writes, which bump the user's "history" data version.
+
+    python manage.py snapshot-insights --jobs 8
+
+Users are split into UUID ranges; each worker process reads its range with one
+set-based statement (per-user LATERAL probes on the (user_id, date) keys, so the
+cost doesn't grow with history length) in a REPEATABLE READ snapshot, runs the
+plateau fit for each fetched chunk in one numpy pass and upserts the rows.
+"""
+import multiprocessing
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import psycopg2
+import psycopg2.extras
+
+from plateau import plateau_flags
+
+BATCH = 2000
+WINDOW_DAYS = 6     # days before as_of; today makes the 7th
+PLATEAU_WINDOW = 14
+
+
+def baseline_select(users: str) -> str:
+    """
+    The baseline query over `users` (any relation with an `id` column): the batch
+    reads a range of public.users, load_snapshot() a single id when no fresh row
+    exists. Column names match user_insights_snapshot; plateau is left to the caller.
+    """
+    return f"""
+    SELECT u.id AS user_id, %(as_of)s::date AS as_of, COALESCE(v.version, 0) AS history_version,
+           COALESCE(c.done_count, 0) AS done_count, COALESCE(c.total_count, 0) AS total_count,
+           COALESCE(w.weights, '{{}}') AS weights, COALESCE(w.weigh_dates, '{{}}') AS weigh_dates,
+           COALESCE(w.week_trends, '{{}}') AS week_trends,
+           NULL::boolean AS plateau,
+           m.metric_days, m.steps_sum, m.sleep_sum, m.sleep_n, m.protein_sum, m.protein_n,
+           m.fiber_sum, m.fiber_n, m.water_sum, m.water_n, m.strength_sum, m.cardio_sum
+    FROM {users} u
+    LEFT JOIN public.data_versions v ON v.user_id = u.id AND v.domain = 'history'
+    CROSS JOIN LATERAL (
+        SELECT SUM(done_count)::int AS done_count, SUM(total_count)::int AS total_count
+        FROM public.checkin_daily
+        WHERE user_id = u.id AND c_date >= %(since)s AND c_date < %(as_of)s) c
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*)::int AS metric_days,
+               COALESCE(SUM(steps), 0)::bigint AS steps_sum,
+               COALESCE(SUM(sleep_hours), 0)::float8 AS sleep_sum, COUNT(sleep_hours)::int AS sleep_n,
+               COALESCE(SUM(protein_g), 0)::bigint AS protein_sum, COUNT(protein_g)::int AS protein_n,
+               COALESCE(SUM(fiber_g), 0)::bigint AS fiber_sum, COUNT(fiber_g)::int AS fiber_n,
+               COALESCE(SUM(water_ml), 0)::bigint AS water_sum, COUNT(water_ml)::int AS water_n,
+               COALESCE(SUM(strength_min), 0)::bigint AS strength_sum,
+               COALESCE(SUM(cardio_min), 0)::bigint AS cardio_sum
+        FROM public.daily_metrics
+        WHERE user_id = u.id AND m_date >= %(since)s AND m_date < %(as_of)s) m
+    CROSS JOIN LATERAL (
+        SELECT array_agg(kg ORDER BY wi_date) AS weights, array_agg(wi_date ORDER BY wi_date) AS weigh_dates,
+               array_agg(trend ORDER BY wi_date) FILTER (WHERE wi_date >= %(since)s AND trend IS NOT NULL) AS week_trends
+        FROM (SELECT wi_date, (kg)::float8 AS kg, trend FROM public.weigh_ins
+              WHERE user_id = u.id AND wi_date < %(as_of)s
+              ORDER BY wi_date DESC LIMIT {PLATEAU_WINDOW}) recent) w
+"""
+
+METRIC_COLUMNS = ("metric_days", "steps_sum", "sleep_sum", "sleep_n", "protein_sum", "protein_n",
+                  "fiber_sum", "fiber_n", "water_sum", "water_n", "strength_sum", "cardio_sum")
+COLUMNS = ("user_id", "as_of", "history_version", "done_count", "total_count", "weights", "weigh_dates",
+           "week_trends", "plateau") + METRIC_COLUMNS
+
+UPSERT = f"""
+    INSERT INTO public.user_insights_snapshot ({", ".join(COLUMNS)}) VALUES %s
+    ON CONFLICT (user_id) DO UPDATE SET
+      {", ".join(f"{c} = EXCLUDED.{c}" for c in COLUMNS[1:])}, computed_at = CURRENT_TIMESTAMP
+"""
+
+
+def baseline_params(as_of: date) -> Dict:
+    return {"as_of": as_of, "since": as_of - timedelta(days=WINDOW_DAYS)}
+
+
+def partitions(n: int) -> List[Tuple[Optional[UUID], Optional[UUID]]]:
+    """n contiguous [lo, hi) ranges over the UUID space (open-ended at both ends)."""
+    bounds = [None] + [UUID(int=k * (1 << 128) // n) for k in range(1, n)] + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+# ---------- reading a baseline together with today's rows ----------
+def recent_weigh_ins(base: Dict, today_kg: Optional[float]) -> Tuple[List, List[float]]:
+    """(dates, kg) of the last PLATEAU_WINDOW weigh-ins up to today (as_of), oldest first."""
+    if today_kg is None:
+        return base["weigh_dates"], base["weights"]
+    return (base["weigh_dates"] + [base["as_of"]])[-PLATEAU_WINDOW:], (base["weights"] + [today_kg])[-PLATEAU_WINDOW:]
+
+
+def baseline_plateau(base: Dict, today_kg: Optional[float], method: str) -> bool:
+    """The stored flag when there is no weigh-in today, else a fit including it."""
+    if today_kg is None and base["plateau"] is not None:
+        return base["plateau"]
+    return bool(plateau_flags([recent_weigh_ins(base, today_kg)], method)[0])
+
+
+def completion_ratio(base: Dict, today: Optional[Sequence[int]]) -> float:
+    """Done / planned checkins over the last 7 days; `today` is (done, total) or None."""
+    done, total = base["done_count"], base["total_count"]
+    if today:
+        done, total = done + today[0], total + today[1]
+    return done / total if total else 0.0
+
+
+def week_totals(base: Dict, today: Optional[Sequence]) -> Dict[str, float]:
+    """
+    Metric sums and counts over the last 7 days. `today` is today's daily_metrics row
+    as (steps, sleep_hours, protein_g, fiber_g, water_ml, strength_min, cardio_min, ...).
+    """
+    out = {k: base[k] or 0 for k in METRIC_COLUMNS}
+    if today:
+        steps, sleep, protein, fiber, water, strength, cardio = today[:7]
+        out["metric_days"] += 1
+        out["steps_sum"] += steps or 0
+        out["strength_sum"] += strength or 0
+        out["cardio_sum"] += cardio or 0
+        for key, value in (("sleep", sleep), ("protein", protein), ("fiber", fiber), ("water", water)):
+            if value is not None:
+                out[f"{key}_sum"] += float(value)
+                out[f"{key}_n"] += 1
+    return out
+
+
+def trend_span(base: Dict, today_trend: Optional[float]) -> Optional[Tuple[float, float]]:
+    """(first, last) stored trend over the last 7 days, or None with fewer than two."""
+    ts = base["week_trends"] + ([today_trend] if today_trend is not None else [])
+    return (ts[0], ts[-1]) if len(ts) >= 2 else None
+
+
+# ---------- batch ----------
+_conn = None
+
+
+def _connect(dsn: str):
+    global _conn
+    _conn = psycopg2.connect(dsn)
+    # rows and the history version they were computed from come from one snapshot,
+    # so a back-dated write racing the job leaves the row mismatched, never wrong
+    _conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+    psycopg2.extras.register_uuid(conn_or_curs=_conn)
+
+
+def _rows(rows: List[Dict], method: str) -> List[Tuple]:
+    flags = plateau_flags([(r["weigh_dates"], r["weights"]) for r in rows], method)
+    for r, flag in zip(rows, flags.tolist()):
+        r["plateau"] = flag
+    return [tuple(r[c] for c in COLUMNS) for r in rows]
+
+
+def snapshot_partition(job: Tuple[date, str, Optional[UUID], Optional[UUID]]) -> int:
+    """Computes and upserts the baselines of one user range; returns the row count."""
+    as_of, method, lo, hi = job
+    params = {**baseline_params(as_of), "lo": lo, "hi": hi}
+    bounds = [c for c, b in (("id >= %(lo)s", lo), ("id < %(hi)s", hi)) if b is not None]
+    users = "(SELECT id FROM public.users" + (" WHERE " + " AND ".join(bounds) if bounds else "") + ")"
+    n = 0
+    try:
+        with _conn.cursor(name="insights_baseline", cursor_factory=psycopg2.extras.RealDictCursor) as src, \
+                _conn.cursor() as dst:
+            src.itersize = BATCH
+            src.execute(baseline_select(users), params)
+            while True:
+                rows = src.fetchmany(BATCH)
+                if not rows:
+                    break
+                psycopg2.extras.execute_values(dst, UPSERT, _rows(rows, method), page_size=500)
+                n += len(rows)
+        _conn.commit()
+    except Exception:
+        _conn.rollback()
+        raise
+    return n
+
+
+def build_snapshots(dsn: str, as_of: date, jobs: int, method: str = "ols", progress=None) -> int:
+    """
+    Baselines for every user, `jobs` worker processes over 4x as many user ranges.
+    `method` is the plateau fit; use the API's PLATEAU_METHOD so stored flags agree.
+    """
+    work = [(as_of, method, lo, hi) for lo, hi in partitions(max(1, jobs) * 4)]
+    total = 0
+    with multiprocessing.Pool(max(1, jobs), initializer=_connect, initargs=(dsn,)) as pool:
+        for done, n in enumerate(pool.imap_unordered(snapshot_partition, work), 1):
+            total += n
+            if progress:
+                progress(done, len(work), total)
+    return total
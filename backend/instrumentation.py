@@ -0,0 +1,227 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+import psycopg2.extensions
+
+log = logging.getLogger("boostfit.requests")
+
+_current: ContextVar[Optional["RequestStats"]] = ContextVar("request_stats", default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|%s")
+_VALUE_LISTS = re.compile(r"\(\?(?:\s*,\s*\?)*\)(?:\s*,\s*\(\?(?:\s*,\s*\?)*\))+")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(sql) -> str:
+    """Statement shape: literals and placeholders as ?, VALUES lists folded to one row, whitespace collapsed."""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    sql = _LITERALS.sub("?", str(sql))
+    sql = _VALUE_LISTS.sub(lambda m: m.group(0)[:m.group(0).index(")") + 1] + ", ...", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def fingerprint_id(fp: str) -> str:
+    return hashlib.blake2b(fp.encode(), digest_size=4).hexdigest()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode by the statement that takes an endpoint over its `query_budget`."""
+
+
+class RequestStats:
+    """What one request did on the database; filled in by instrumented cursors."""
+    __slots__ = ("scope", "strict", "queries", "db_time", "pool_wait", "slowest_time", "slowest_sql")
+
+    def __init__(self, scope: Optional[dict] = None, strict: bool = False):
+        self.scope = scope
+        self.strict = strict
+        self.queries = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql: Optional[str] = None
+
+    def budget(self) -> Optional[int]:
+        endpoint = self.scope.get("endpoint") if self.scope else None
+        return getattr(endpoint, "__query_budget__", None)
+
+    def statement(self, sql, elapsed: float):
+        self.queries += 1
+        self.db_time += elapsed
+        if elapsed >= self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_sql = sql
+        if self.strict:
+            budget = self.budget()
+            if budget is not None and self.queries > budget:
+                raise QueryBudgetExceeded(
+                    f"{self.scope.get('method')} {self.scope.get('path')}: statement #{self.queries} exceeds "
+                    f"the query budget of {budget}: {fingerprint(sql)[:200]}")
+
+    def summary(self) -> Dict:
+        fp = fingerprint(self.slowest_sql) if self.slowest_sql is not None else None
+        budget = self.budget()
+        return {
+            "queries": self.queries,
+            "db_ms": round(self.db_time * 1000, 2),
+            "pool_wait_ms": round(self.pool_wait * 1000, 2),
+            "slowest_ms": round(self.slowest_time * 1000, 2),
+            "slowest_id": fingerprint_id(fp) if fp else None,
+            "slowest_sql": fp,
+            "query_budget": budget,
+            "over_budget": budget is not None and self.queries > budget,
+        }
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def record_pool_wait(seconds: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+def query_budget(n: int) -> Callable:
+    """
+    Declares the most statements an endpoint may run per request. Put it under the
+    route decorator. Over budget is logged; in strict mode the offending statement raises.
+    """
+    def mark(fn):
+        fn.__query_budget__ = n
+        return fn
+    return mark
+
+
+def configure_logging(level: str = "INFO"):
+    """One JSON object per line on stderr (gunicorn's error log), unless handlers were configured elsewhere."""
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+    log.setLevel(level)
+
+
+# ---------- psycopg2 ----------
+class _TimedCursor:
+    """Mixed into whatever cursor class the caller asked for."""
+
+    def execute(self, query, vars=None):
+        stats = _current.get()
+        if stats is None:
+            return super().execute(query, vars)
+        t = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            stats.statement(query, time.perf_counter() - t)
+
+    def executemany(self, query, vars_list):
+        stats = _current.get()
+        if stats is None:
+            return super().executemany(query, vars_list)
+        t = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            stats.statement(query, time.perf_counter() - t)
+
+
+_timed_classes: Dict[type, type] = {}
+
+
+def _timed(cursor_class: type) -> type:
+    cls = _timed_classes.get(cursor_class)
+    if cls is None:
+        cls = _timed_classes[cursor_class] = type("Timed" + cursor_class.__name__, (_TimedCursor, cursor_class), {})
+    return cls
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """
+    connection_factory for the pool: cursors time their statements into the current
+    request's RequestStats (no-op outside a request) and commits count as DB time.
+    """
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.pop("cursor_factory", None) or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(*args, cursor_factory=_timed(factory), **kwargs)
+
+    def commit(self):
+        stats = _current.get()
+        if stats is None:
+            return super().commit()
+        t = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            stats.db_time += time.perf_counter() - t
+
+
+# ---------- ASGI ----------
+class QueryStatsMiddleware:
+    """
+    Collects RequestStats per HTTP request, adds a Server-Timing header (statement
+    count, DB and pool-wait time, the slowest statement's fingerprint id, total
+    time) and logs one JSON line per request to the "boostfit.requests" logger.
+    Work done after the response has started (streamed bodies) is only in the log.
+    """
+
+    def __init__(self, app, server_timing: bool = True, strict: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+        self.strict = strict
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope, strict=self.strict)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", self.header(stats, time.perf_counter() - started).encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self.log(scope, status, time.perf_counter() - started, stats)
+
+    @staticmethod
+    def header(stats: RequestStats, elapsed: float) -> str:
+        parts = [f'db;desc="{stats.queries} queries";dur={stats.db_time * 1000:.2f}',
+                 f"pool;dur={stats.pool_wait * 1000:.2f}"]
+        if stats.slowest_sql is not None:
+            parts.append(f'db-slowest;desc="{fingerprint_id(fingerprint(stats.slowest_sql))}";'
+                         f"dur={stats.slowest_time * 1000:.2f}")
+        parts.append(f"app;dur={elapsed * 1000:.2f}")
+        return ", ".join(parts)
+
+    @staticmethod
+    def log(scope, status: int, elapsed: float, stats: RequestStats):
+        summary = stats.summary()
+        level = logging.WARNING if summary["over_budget"] else logging.INFO
+        if not log.isEnabledFor(level):
+            return
+        route = scope.get("route")
+        log.log(level, json.dumps({
+            "method": scope.get("method"), "path": scope.get("path"),
+            "route": getattr(route, "path", None), "status": status,
+            "ms": round(elapsed * 1000, 2), **summary,
+        }, ensure_ascii=False))
@@ -1,21 +1,43 @@
 import os
 import json
+import base64
+import datetime
+import hashlib
+import heapq
+import itertools
+import math
+import random
+import time
 from uuid import UUID
 from datetime import date, timedelta
-from typing import List, Optional, Tuple, Dict
+from typing import Annotated, Any, List, Literal, Optional, Tuple, Dict, Union
+from collections import Counter
 from contextlib import contextmanager
 from decimal import Decimal
 
 import psycopg2
 import psycopg2.extras
-import psycopg2.pool
 import jwt
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query, Depends, Request
+from fastapi import FastAPI, HTTPException, Query, Depends, Request, Response, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-
-from utils import ewma, classify_energy
+from fastapi.responses import StreamingResponse
+from pydantic import AfterValidator, AliasChoices, BaseModel, Field, TypeAdapter, ValidationError
+
+from utils import ewma, ewma_warmup, round2, classify_energy
+from db import ConnectionPool, PoolTimeout, PoolClosed, dsn_from_env
+from token_cache import TokenCache
+from recipes import RecipeCatalog, RECIPE_COLUMNS
+from mealplan import SLOTS as MEAL_SLOTS, plan_days
+from shopping import BasketCache, normalize_ingredients, vector_from_json, sum_vectors
+import fastjson
+from importer import FORMATS as IMPORT_FORMATS, CopyStream, ImportFormatError, detect_format, error_message, read_records
+from exporter import EXPORT_TABLES, stream_export
+from insights import baseline_params, baseline_plateau, baseline_select, completion_ratio, trend_span, week_totals
+from plateau import METHODS as PLATEAU_METHODS, PlateauMemo
+from instrumentation import (InstrumentedConnection, QueryStatsMiddleware, configure_logging,
+                             query_budget, record_pool_wait)
+import metrics
 
 # =========================================
 #   Config
@@ -23,6 +45,15 @@ from utils import ewma, classify_energy
 load_dotenv('.env.local') # Load your local env file
 
 APP_VERSION = "2.4-final-fix"
+TREND_ALPHA = 0.3  # smoothing of the weigh_ins.trend column (see db/supabase.sql)
+XP_HABIT_DONE = 10       # once per habit and day
+XP_DAILY_COMPLETE = 25   # once per day with DAILY_COMPLETE_AT habits done
+DAILY_COMPLETE_AT = 3
+CHECKIN_BACKFILL_DAYS = int(os.getenv("CHECKIN_BACKFILL_DAYS", "7"))  # how far back toggles may go
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "100000"))
+PLATEAU_METHOD = os.getenv("PLATEAU_METHOD", "ols")  # or "theil_sen"; see plateau.py
+if PLATEAU_METHOD not in PLATEAU_METHODS:
+    raise RuntimeError(f"PLATEAU_METHOD must be one of {', '.join(PLATEAU_METHODS)}")
 psycopg2.extras.register_uuid()
 JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 JWT_ALGS = ["HS256"]
@@ -39,68 +70,181 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request statement count / DB time / pool wait as Server-Timing + a JSON log
+# line (see instrumentation.py). QUERY_BUDGET_STRICT=1 makes @query_budget fail hard.
+app.add_middleware(
+    QueryStatsMiddleware,
+    server_timing=os.getenv("SERVER_TIMING", "1") != "0",
+    strict=os.getenv("QUERY_BUDGET_STRICT", "0") == "1",
+)
+if os.getenv("REQUEST_LOG", "1") != "0":
+    configure_logging(os.getenv("REQUEST_LOG_LEVEL", "INFO"))
+
+# Prometheus latency / in-flight / worker gauges, served at /metrics (see metrics.py)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # =========================================
 #   DB Pool
 # =========================================
-db_pool = None
+db_pool: Optional[ConnectionPool] = None
+
+# Global recipes are served from memory; see recipes.py
+recipe_catalog = RecipeCatalog(
+    lambda row: recipe_from_row(row),
+    ttl=float(os.getenv("RECIPE_CATALOG_TTL", "30")),
+    vectorize=lambda row: vector_from_json(row["ingredients_norm"], row["ingredients"]),
+    encode=lambda row: fastjson.dumps(recipe_dict(row)),
+)
+# Aggregated shopping lists for all-global baskets; see shopping.py
+shopping_cache = BasketCache(maxsize=int(os.getenv("SHOPPING_CACHE_SIZE", "1024")))
+# Per-user plateau flags, until the user's next weigh-in; see snap_plateau()
+plateau_memo = PlateauMemo(maxsize=int(os.getenv("PLATEAU_CACHE_SIZE", "10000")))
 
 @app.on_event("startup")
 def startup_event():
     """Initializes the database connection pool on app startup."""
     global db_pool
-    
-    # Construct the DATABASE_URL from individual parts for the pooler
-    conn_str = "postgresql://{user}:{password}@{host}:{port}/{dbname}".format(
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-        dbname=os.getenv("DB_NAME")
+    db_pool = ConnectionPool(
+        dsn_from_env(),
+        minconn=int(os.getenv("DB_POOL_MIN", "1")),
+        maxconn=int(os.getenv("DB_POOL_MAX", "10")),
+        acquire_timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        max_waiters=int(os.getenv("DB_POOL_MAX_WAITERS", "100")),
+        connection_factory=InstrumentedConnection,
     )
-
-    db_pool = psycopg2.pool.SimpleConnectionPool(minconn=1, maxconn=10, dsn=conn_str)
+    metrics.watch_pool(db_pool.usage)
+    with db_pool.connection() as conn:
+        recipe_catalog.load(conn)
 
 
 @app.on_event("shutdown")
 def shutdown_event():
     """Closes the database connection pool on app shutdown."""
     if db_pool:
-        db_pool.closeall()
+        db_pool.close()
+
+def _pool_unavailable(e: Exception) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Database busy: {e}", headers={"Retry-After": "1"})
+
+def _acquired(started: float):
+    waited = time.perf_counter() - started
+    record_pool_wait(waited)
+    metrics.POOL_WAIT.observe(waited)
 
-# ... (The rest of your main.py file remains unchanged) ...
-# Omitted for brevity. The only change needed is the startup_event function above.
 def get_db():
     """FastAPI dependency to get a connection from the pool."""
-    conn = db_pool.getconn()
+    started = time.perf_counter()
     try:
-        psycopg2.extras.register_uuid(conn_or_curs=conn)
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
+        with db_pool.connection() as conn:
+            _acquired(started)
+            yield conn
+    except (PoolTimeout, PoolClosed) as e:
+        metrics.DB_ERRORS.labels(type(e).__name__).inc()
+        raise _pool_unavailable(e)
+    except psycopg2.Error as e:
+        metrics.DB_ERRORS.labels(type(e).__name__).inc()
         raise
-    finally:
-        db_pool.putconn(conn)
 
 # =========================================
 #   Auth
 # =========================================
+# Verified tokens are reused until their exp; see token_cache.py
+token_cache = TokenCache(
+    maxsize=int(os.getenv("JWT_CACHE_SIZE", "10000")),
+    negative_ttl=float(os.getenv("JWT_NEGATIVE_TTL", "60")),
+)
+
 def get_current_user_id(request: Request) -> UUID:
     auth = request.headers.get("authorization")
     if not auth or not auth.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Missing Bearer token")
 
     token = auth.split(" ")[1]
+    cached = token_cache.get(token)
+    if isinstance(cached, UUID):
+        return cached
+    if cached is not None:
+        raise HTTPException(status_code=401, detail=cached)
+
+    started = time.perf_counter()
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=JWT_ALGS, options={"verify_aud": False})
-        sub = payload.get("sub")
-        if not sub:
-            raise HTTPException(401, "Invalid token: no subject")
-        return UUID(sub)
     except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
+        detail = "Token expired"
+        metrics.JWT_VERIFY.labels("expired").observe(time.perf_counter() - started)
     except jwt.InvalidTokenError as e:
-        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+        detail = f"Invalid token: {e}"
+        metrics.JWT_VERIFY.labels("invalid").observe(time.perf_counter() - started)
+    else:
+        metrics.JWT_VERIFY.labels("ok").observe(time.perf_counter() - started)
+        sub = payload.get("sub")
+        if sub:
+            user_id = UUID(sub)
+            token_cache.accept(token, user_id, payload.get("exp"))
+            return user_id
+        detail = "Invalid token: no subject"
+    token_cache.reject(token, detail)
+    raise HTTPException(status_code=401, detail=detail)
+
+# =========================================
+#   Conditional GET
+# =========================================
+# data_versions holds one counter per (user, domain), bumped by triggers on every
+# write to the domain's table (see db/supabase.sql). A GET whose If-None-Match
+# still matches is answered 304 right after the version lookup.
+def data_version(db, user_id: UUID, domain: str) -> int:
+    with db.cursor() as cur:
+        cur.execute("SELECT version FROM data_versions WHERE user_id=%s AND domain=%s", (user_id, domain))
+        row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+def catalog_data_version(db, user_id: UUID, domain: str) -> int:
+    """data_version(), plus the recipe catalog's version check in the same statement when it is due."""
+    if not recipe_catalog.due():
+        return data_version(db, user_id, domain)
+    with db.cursor() as cur:
+        cur.execute("""SELECT COALESCE((SELECT version FROM data_versions WHERE user_id=%s AND domain=%s), 0),
+                              COALESCE((SELECT version FROM recipe_catalog_version), 0)""", (user_id, domain))
+        version, catalog_version = cur.fetchone()
+    recipe_catalog.refresh_to(db, catalog_version)
+    return int(version)
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == bare:
+            return True
+    return False
+
+def conditional(domain: str, daily: bool = False, catalog: bool = False):
+    """
+    Dependency for GETs served from one domain. The ETag covers the user, the domain
+    version, the path and query string, plus today's date (`daily`) or the global recipe
+    catalog version (`catalog`) for responses that also depend on those.
+    """
+    def dependency(request: Request, response: Response,
+                   user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
+        version = catalog_data_version(db, user_id, domain) if catalog else data_version(db, user_id, domain)
+        parts = [user_id, domain, version, request.url.path, request.url.query]
+        if daily:
+            parts.append(date.today().isoformat())
+        if catalog:
+            parts.append(recipe_catalog.version)
+        etag = make_etag(*parts)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return dependency
 
 # =========================================
 #   Models (No changes needed)
@@ -127,6 +271,23 @@ class MetricsPayload(BaseModel):
     hunger: Optional[int] = None
     notes: Optional[str] = None
 
+INT_MAX = 2**31 - 1
+
+# MetricsPayload within the daily_metrics column types (INT, NUMERIC(3,1), SMALLINT)
+class StoredMetrics(MetricsPayload):
+    steps: int = Field(0, ge=0, le=INT_MAX)
+    sleep_hours: Optional[float] = Field(None, ge=0, le=24)
+    protein_g: Optional[int] = Field(None, ge=0, le=INT_MAX)
+    fiber_g: Optional[int] = Field(None, ge=0, le=INT_MAX)
+    water_ml: Optional[int] = Field(None, ge=0, le=INT_MAX)
+    strength_min: int = Field(0, ge=0, le=1440)
+    cardio_min: int = Field(0, ge=0, le=1440)
+    mood: Optional[int] = Field(None, ge=-32768, le=32767)
+    hunger: Optional[int] = Field(None, ge=-32768, le=32767)
+
+# weigh_ins.kg is NUMERIC(5,2): rounded first, so the bounds check the stored value
+StoredKg = Annotated[float, AfterValidator(lambda kg: round(kg, 2)), Field(gt=0, le=999.99)]
+
 class GardenStateResponse(BaseModel):
     watered_today: bool
     perfect_streak: int
@@ -200,8 +361,88 @@ class Checkin(BaseModel):
     habit_id: int
     done: bool
 
+class CheckinToggle(BaseModel):
+    habit_id: int
+    done: bool
+    date: Optional[datetime.date] = None  # today when omitted
+
+class CheckinBulkRequest(BaseModel):
+    items: List[CheckinToggle] = Field(..., min_length=1, max_length=500)
+
+class CheckinResult(BaseModel):
+    habit_id: int
+    date: datetime.date
+    done: bool
+    changed: bool  # False when the checkin was already in that state
+
+class CheckinBulkResponse(BaseModel):
+    applied: List[CheckinResult]
+    skipped: List[CheckinToggle]  # unknown habits or dates outside the backfill window
+    xp_awarded: int
+    daily_complete: List[datetime.date]  # days whose daily_complete XP this request awarded
+
+# Offline sync: one queued write each; `id` is the client's idempotency key and
+# `date` the client's local day.
+class SyncMutationBase(BaseModel):
+    id: str = Field(..., min_length=1, max_length=64)
+    date: datetime.date
+
+class SyncCheckin(SyncMutationBase):
+    type: Literal["checkin"]
+    habit_id: int
+    done: bool
+
+class SyncWeighIn(SyncMutationBase):
+    type: Literal["weighin"]
+    kg: float = Field(..., gt=0)
+
+class SyncMetrics(SyncMutationBase, MetricsPayload):
+    type: Literal["metrics"]
+
+class SyncSchedule(SyncMutationBase):
+    type: Literal["schedule"]
+    items: List[ScheduleItem]
+
+SyncMutation = Annotated[Union[SyncCheckin, SyncWeighIn, SyncMetrics, SyncSchedule], Field(discriminator="type")]
+
+class SyncRequest(BaseModel):
+    since: Optional[str] = None  # token from the previous sync; omit for a full resync
+    mutations: List[SyncMutation] = Field(default_factory=list, max_length=500)
+
+# One row of an imported history file: a weigh-in, metrics, or both for one day.
+# Metrics left out of a row keep their stored value.
+class ImportRow(StoredMetrics):
+    date: datetime.date = Field(..., validation_alias=AliasChoices("date", "day"))
+    kg: Optional[StoredKg] = Field(None, validation_alias=AliasChoices("kg", "weight", "weight_kg"))
+
+IMPORT_METRICS = tuple(MetricsPayload.model_fields)
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportResponse(BaseModel):
+    rows: int              # valid rows read
+    invalid: int           # rows rejected by validation
+    weighins: int          # weigh-ins inserted or changed
+    metrics_days: int      # daily_metrics rows inserted or updated
+    first_date: Optional[datetime.date] = None
+    last_date: Optional[datetime.date] = None
+    errors: List[ImportRowError]  # the first invalid rows
+
+class SyncRejected(BaseModel):
+    id: str
+    reason: str
+
+class SyncResponse(BaseModel):
+    token: str
+    applied: List[str]
+    duplicates: List[str]  # already applied by an earlier sync
+    rejected: List[SyncRejected]
+    changes: Dict[str, Any]  # domain -> current state, only for domains changed since `since`
+
 class WeighIn(BaseModel):
-    date: Optional[date] = None
+    date: Optional[datetime.date] = None  # module-qualified: the field name shadows `date`
     kg: float = Field(..., gt=0)
 
 class TrendPoint(BaseModel):
@@ -315,15 +556,24 @@ class AdjustCaloriesResponse(BaseModel):
     suggestion_kcal_delta: int
     reason: str
 
+class DashboardResponse(BaseModel):
+    date: str
+    plan: Optional[PlanResponse] = None
+    done: Optional[Dict[int, bool]] = None
+    garden: Optional[GardenStateResponse] = None
+    gamify: Optional[GamifyStatusResponse] = None
+    insights: Optional[InsightsResponse] = None
+    schedule: Optional[ScheduleResponse] = None
+
 # =========================================
 #   Helpers (No changes needed)
 # =========================================
 def completion_ratio_last7(db, user_id: UUID) -> float:
     with db.cursor() as cur:
         cur.execute("""
-            SELECT COUNT(*) FILTER (WHERE done) * 1.0 / NULLIF(COUNT(*),0)
-            FROM checkins
-            WHERE user_id=%s AND checkin_date >= %s
+            SELECT SUM(done_count) * 1.0 / NULLIF(SUM(total_count),0)
+            FROM checkin_daily
+            WHERE user_id=%s AND c_date >= %s
         """, (user_id, date.today() - timedelta(days=6)))
         row = cur.fetchone()
         return float(row[0] or 0.0)
@@ -331,58 +581,31 @@ def completion_ratio_last7(db, user_id: UUID) -> float:
 def daily_complete(db, user_id: UUID, d: date) -> bool:
     with db.cursor() as cur:
         cur.execute("""
-            SELECT COUNT(*) FILTER (WHERE done) FROM checkins
-            WHERE user_id=%s AND checkin_date=%s
+            SELECT done_count FROM checkin_daily
+            WHERE user_id=%s AND c_date=%s
         """, (user_id, d))
-        cnt = int(cur.fetchone()[0] or 0)
+        row = cur.fetchone()
+        cnt = int(row[0]) if row else 0
     return cnt >= 3
 
-def perfect_streak_days(db, user_id: UUID, lookback: int = 30) -> int:
+def get_streaks(db, user_id: UUID) -> Optional[Dict]:
+    """The user's user_streaks row (maintained by trigger on checkin writes)."""
+    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute("""
+            SELECT perfect_start, perfect_end, soft_start, soft_end, longest_perfect, longest_soft
+            FROM user_streaks WHERE user_id=%s
+        """, (user_id,))
+        return cur.fetchone()
+
+def current_run(start: Optional[date], end: Optional[date]) -> int:
     """
-    Counts consecutive 'perfect' days (>=3 habits done) up to today.
+    Days of the run [start, end] up to today if it covers today, else 0. A run may
+    end tomorrow: day-keyed writes follow the client's local day (see writable_day).
     """
-    with db.cursor() as cur:
-        cur.execute("""
-            WITH daily_counts AS (
-                SELECT checkin_date, COUNT(*) FILTER (WHERE done) AS done_count
-                FROM checkins
-                WHERE user_id = %s AND checkin_date BETWEEN %s AND %s
-                GROUP BY checkin_date
-            ),
-            day_series AS (
-                SELECT generate_series(%s::date, %s::date, '1 day')::date AS day
-            ),
-            full_days AS (
-                SELECT
-                    d.day,
-                    CASE WHEN COALESCE(dc.done_count,0) >= 3 THEN 1 ELSE 0 END AS is_complete
-                FROM day_series d
-                LEFT JOIN daily_counts dc ON d.day = dc.checkin_date
-            ),
-            streaks AS (
-                SELECT
-                    day,
-                    is_complete,
-                    day - (ROW_NUMBER() OVER (PARTITION BY is_complete ORDER BY day))::int AS streak_group
-                FROM full_days
-            ),
-            today_grp AS (
-                SELECT streak_group FROM streaks
-                WHERE day = %s AND is_complete = 1
-                LIMIT 1
-            )
-            SELECT COUNT(*)
-            FROM streaks
-            WHERE is_complete = 1
-              AND streak_group = (SELECT streak_group FROM today_grp)
-        """, (
-            user_id,
-            date.today() - timedelta(days=lookback), date.today(),
-            date.today() - timedelta(days=lookback), date.today(),
-            date.today()
-        ))
-        row = cur.fetchone()
-        return int(row[0] or 0)
+    today = date.today()
+    if start is None or end is None or not start <= today <= end:
+        return 0
+    return (today - start).days + 1
 
 def growth_stage(streak: int) -> str:
     if streak >= 7: return "flower"
@@ -390,6 +613,32 @@ def growth_stage(streak: int) -> str:
     if streak >= 3: return "sprout"
     return "seed"
 
+GARDEN_HINTS = {
+    "seed": "Fais tes 3 habitudes pour faire germer la graine !",
+    "sprout": "Continue comme ça pour voir de nouvelles feuilles.",
+    "leafy": "Ta plante est en pleine croissance, vise la floraison !",
+    "flower": "Superbe fleur ! Maintiens la série pour la garder."
+}
+
+def garden_from_streaks(s: Optional[Dict]) -> GardenStateResponse:
+    last_perfect = s["perfect_end"] if s else None
+    streak = current_run(s["perfect_start"], last_perfect) if s else 0
+    # a perfect day dated tomorrow (a client east of the server) waters today too
+    watered = last_perfect is not None and last_perfect >= date.today()
+    # not watered means today isn't perfect yet: droop unless yesterday was
+    droopy = not watered and last_perfect != date.today() - timedelta(days=1)
+    return garden_state(streak, watered, droopy)
+
+def garden_state(streak: int, watered: bool, droopy: bool) -> GardenStateResponse:
+    stage = growth_stage(streak)
+    return GardenStateResponse(
+        watered_today=watered,
+        perfect_streak=streak,
+        stage=stage,
+        droopy=droopy,
+        hint=GARDEN_HINTS.get(stage, "Continue tes efforts !")
+    )
+
 def get_profile(db, user_id: UUID) -> Profile:
     with db.cursor() as cur:
         cur.execute("""
@@ -398,6 +647,10 @@ def get_profile(db, user_id: UUID) -> Profile:
             FROM user_profile WHERE user_id=%s
         """, (user_id,))
         row = cur.fetchone()
+    return profile_from_row(row)
+
+def profile_from_row(row) -> Profile:
+    """row: (sex, birth_year, height_cm, weight_kg, activity_factor, deficit_percent, diet, mode, units, timezone, reminder_time)"""
     if not row:
         return Profile(diet="omnivore", mode="simple", units="metric", timezone="Europe/Paris", reminder_time="18:00")
     return Profile(
@@ -467,15 +720,37 @@ def pick_plan_for_today(db, user_id: UUID) -> Tuple[str, List[Habit]]:
         """, (user_id, max_diff))
         hydra = cur.fetchone()
 
+    return energy, habits_to_plan([nutrition, movement, hydra])
+
+PLAN_SLOTS = (("nutrition",), ("movement",), ("hydration", "lifestyle"))
+
+def habits_to_plan(recs) -> List[Habit]:
     items: List[Habit] = []
-    for rec in (nutrition, movement, hydra):
+    for rec in recs:
         if rec:
             items.append(Habit(
                 id=rec["id"], name=rec["name"], icon=rec["icon"],
                 category=rec["category"], difficulty=int(rec["difficulty"]),
                 done=False
             ))
-    return energy, items
+    return items
+
+def choose_plan(habits: List[Dict], energy: str) -> List[Habit]:
+    """
+    Same picks as `pick_plan_for_today`, from the user's habits already sorted by
+    (difficulty ASC, created_at DESC, id DESC).
+    """
+    max_diff = {"low": 1, "medium": 2, "high": 3}[energy]
+    picks = []
+    for cats in PLAN_SLOTS:
+        picks.append(next((h for h in habits if h["category"] in cats and h["difficulty"] <= max_diff), None))
+    return habits_to_plan(picks)
+
+PLAN_MESSAGES = {
+    "low": "Énergie basse : micro-pas aujourd’hui. Chaque check compte 💪",
+    "medium": "Régulier = progrès. 3 actions simples et on célèbre 🎉",
+    "high": "Tu es en feu 🚀 On ose un cran au-dessus !",
+}
 
 def attach_today_done(db, items: List[Habit], user_id: UUID):
     if not items:
@@ -498,7 +773,10 @@ def latest_weight(db, user_id: UUID) -> Optional[float]:
     return float(row[0]) if row else None
 
 def compute_targets(db, user_id: UUID, sex: Optional[str] = None) -> TargetsResponse:
-    w = latest_weight(db, user_id) or 80.0
+    return targets_for(latest_weight(db, user_id), sex)
+
+def targets_for(weight_kg: Optional[float], sex: Optional[str] = None) -> TargetsResponse:
+    w = weight_kg or 80.0
     prot = int(max(round(1.6 * w), 90))
     fiber = 25 if sex == "female" else (30 if sex == "male" else 28)
     water = int(round(30 * w))
@@ -518,87 +796,70 @@ def mifflin_bmr(sex: str, age: int, height_cm: float, weight_kg: float) -> float
         return 10*weight_kg + 6.25*height_cm - 5*age + 5
     return 10*weight_kg + 6.25*height_cm - 5*age - 161
 
-def streak_soft(db, user_id: UUID, threshold: int = 2, lookback: int = 30) -> int:
-    with db.cursor() as cur:
-        cur.execute("""
-            SELECT checkin_date::date, COUNT(*) FILTER (WHERE done) AS done_count
-            FROM checkins
-            WHERE user_id=%s AND checkin_date >= %s
-            GROUP BY 1
-        """, (user_id, date.today() - timedelta(days=lookback-1)))
-        rows = {r[0]: int(r[1]) for r in cur.fetchall()}
-
-    streak = 0
-    day = date.today()
-    for _ in range(lookback):
-        if rows.get(day, 0) >= threshold:
-            streak += 1
-            day -= timedelta(days=1)
-        else:
-            break
-    return streak
+DEFAULT_TIP = "Garde le cap — micro-pas aujourd’hui, constance demain."
 
-def detect_plateau(db, user_id: UUID, window: int = 14) -> bool:
-    with db.cursor() as cur:
-        cur.execute("""
-            SELECT wi_date::date, (kg)::float
-            FROM weigh_ins
-            WHERE user_id=%s
-            ORDER BY wi_date DESC
-            LIMIT %s
-        """, (user_id, window))
-        rows = cur.fetchall()[::-1]
-
-    n = len(rows)
-    if n < 5:
-        return False
+def tip_tag(energy: str, plateau: bool) -> str:
+    return 'plateau' if plateau else ('energy_low' if energy == 'low' else 'hydration')
+
+class TipCache:
+    """Tip texts by tag. Tips are seed data: the snapshot re-reads them at most every `ttl` seconds."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.by_tag: Dict[str, List[str]] = {}
+        self.loaded_at: Optional[float] = None
 
-    xs = list(range(n))
-    ys = [float(w) for _, w in rows]
-    xbar = sum(xs)/n
-    ybar = sum(ys)/n
-    denom = sum((x - xbar)**2 for x in xs) or 1.0
-    slope = sum((x - xbar)*(y - ybar) for x, y in zip(xs, ys)) / denom  # kg per sample (~day)
-    return abs(slope) < 0.02
+    def due(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl
+
+    def load(self, by_tag: Dict[str, List[str]]):
+        self.by_tag = by_tag
+        self.loaded_at = time.monotonic()
+
+    def pick(self, tag: str) -> str:
+        texts = self.by_tag.get(tag)
+        return random.choice(texts) if texts else DEFAULT_TIP
+
+tip_cache = TipCache(ttl=float(os.getenv("TIPS_TTL", "300")))
 
 def pick_tip(db, energy: str, plateau: bool) -> str:
-    tag = 'plateau' if plateau else ('energy_low' if energy == 'low' else 'hydration')
     with db.cursor() as cur:
-        cur.execute("SELECT text FROM tips WHERE tag=%s ORDER BY RANDOM() LIMIT 1", (tag,))
+        cur.execute("SELECT text FROM tips WHERE tag=%s ORDER BY RANDOM() LIMIT 1", (tip_tag(energy, plateau),))
         row = cur.fetchone()
-    return row[0] if row else "Garde le cap — micro-pas aujourd’hui, constance demain."
+    return row[0] if row else DEFAULT_TIP
+
+def recipe_dict(r) -> Dict:
+    """Recipe row -> plain dict with the Recipe model's fields and types."""
+    return {
+        "id": r["id"], "name": r["name"], "kcal": int(r["kcal"]),
+        "protein_g": int(r["protein_g"]), "carbs_g": int(r["carbs_g"]),
+        "fat_g": int(r["fat_g"]), "prep_min": int(r["prep_min"]),
+        "tags": list(r["tags"]), "diet": r["diet"],
+        "ingredients": list(r["ingredients"]), "steps": list(r["steps"]),
+    }
 
-def fetch_recipes(db, user_id: UUID, diet: Optional[str] = None, tag: Optional[str] = None, max_kcal: Optional[int] = None) -> List[Recipe]:
-    q = """
-      SELECT id, name, kcal, protein_g, carbs_g, fat_g, prep_min, tags, diet, ingredients, steps
-      FROM recipes
-      WHERE (user_id IS NULL OR user_id = %s)
-    """
-    params = [user_id]
-    if diet:
-        q += " AND diet = %s"
-        params.append(diet)
-    if tag:
-        q += " AND %s = ANY(tags)"
-        params.append(tag)
-    if max_kcal:
-        q += " AND kcal <= %s"
-        params.append(max_kcal)
-    q += " ORDER BY prep_min ASC, kcal ASC LIMIT 50"
+def recipe_from_row(r) -> Recipe:
+    return Recipe(**recipe_dict(r))
 
-    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute(q, params)
-        rows = cur.fetchall()
+def recipes_response(recipes: List[Recipe], response: Response) -> Response:
+    """Catalog recipes reuse their load-time JSON; user recipes are encoded here."""
+    return fastjson.respond(fastjson.json_array(
+        recipe_catalog.encoded(r) or fastjson.dumps(r.model_dump()) for r in recipes
+    ), response)
 
-    def to_model(r):
-        return Recipe(
-            id=r["id"], name=r["name"], kcal=int(r["kcal"]),
-            protein_g=int(r["protein_g"]), carbs_g=int(r["carbs_g"]),
-            fat_g=int(r["fat_g"]), prep_min=int(r["prep_min"]),
-            tags=list(r["tags"]), diet=r["diet"],
-            ingredients=list(r["ingredients"]), steps=list(r["steps"])
-        )
-    return [to_model(r) for r in rows]
+def recipes_for_user(db, user_id: UUID) -> List[Recipe]:
+    """
+    The user's own recipes in one indexed query, which also does the global catalog's
+    version check when it is due; a catalog reload adds two statements.
+    """
+    return recipe_catalog.owned_by(db, user_id)
+
+def fetch_recipes(db, user_id: UUID, diet: Optional[str] = None, tag: Optional[str] = None, max_kcal: Optional[int] = None,
+                  own: Optional[List[Recipe]] = None) -> List[Recipe]:
+    if own is None:
+        own = recipes_for_user(db, user_id)
+    cands = recipe_catalog.candidates(diet, tag, kcal_max=max_kcal or None, extra=own)
+    return heapq.nsmallest(50, cands, key=lambda r: (r.prep_min, r.kcal, r.id))
 
 def get_metrics_for(db, user_id: UUID, d: date) -> MetricsPayload:
     with db.cursor() as cur:
@@ -608,6 +869,10 @@ def get_metrics_for(db, user_id: UUID, d: date) -> MetricsPayload:
             WHERE user_id=%s AND m_date=%s
         """, (user_id, d))
         row = cur.fetchone()
+    return metrics_from_row(row)
+
+def metrics_from_row(row) -> MetricsPayload:
+    """row: (steps, sleep_hours, protein_g, fiber_g, water_ml, strength_min, cardio_min, mood, hunger, notes)"""
     if not row:
         return MetricsPayload()
     return MetricsPayload(
@@ -624,27 +889,497 @@ def get_metrics_for(db, user_id: UUID, d: date) -> MetricsPayload:
     )
 
 def xp_total(db, user_id: UUID) -> int:
+    """Running balance from user_xp (maintained by trigger on xp_events)."""
     with db.cursor() as cur:
-        cur.execute("SELECT COALESCE(SUM(amount),0) FROM xp_events WHERE user_id=%s", (user_id,))
-        return int(cur.fetchone()[0] or 0)
+        cur.execute("SELECT total_xp FROM user_xp WHERE user_id=%s", (user_id,))
+        row = cur.fetchone()
+    return int(row[0]) if row else 0
 
 def _xp_threshold(level: int) -> int:
     return 100 * level * (level - 1) // 2
 
 def level_from_xp(xp: int) -> Tuple[int, int, int]:
-    level = 1
-    while xp >= _xp_threshold(level + 1):
-        level += 1
+    # Highest level with 50*L*(L-1) <= xp, i.e. L*(L-1) <= xp//50  <=>  (2L-1)^2 <= 4*(xp//50) + 1
+    level = (math.isqrt(4 * (max(xp, 0) // 50) + 1) + 1) // 2
     cur_th = _xp_threshold(level)
     next_th = _xp_threshold(level + 1)
     return level, cur_th, next_th
 
-def award_xp(db, user_id: UUID, reason: str, amount: int, meta: Optional[Dict] = None):
+LEVEL_NAMES = ["Novice", "Constant·e", "Momentum", "Transformer", "Athlète"]
+
+def gamify_from_xp(total: int) -> GamifyStatusResponse:
+    level, cur_th, next_th = level_from_xp(total)
+    progress = 0.0 if next_th == cur_th else (total - cur_th) / (next_th - cur_th)
+    return GamifyStatusResponse(
+        total_xp=total,
+        level=level,
+        level_name=LEVEL_NAMES[min(level-1, len(LEVEL_NAMES)-1)],
+        next_level_xp=next_th,
+        progress_01=round(progress, 3)
+    )
+
+def writable_day(day: date, today: date) -> bool:
+    """Day-keyed writes may go back CHECKIN_BACKFILL_DAYS, and one day ahead for clients east of the server."""
+    return today - timedelta(days=CHECKIN_BACKFILL_DAYS) <= day <= today + timedelta(days=1)
+
+def apply_checkins(db, user_id: UUID, toggles: List[CheckinToggle]) -> CheckinBulkResponse:
+    """
+    Applies habit toggles and their habit_done XP in one statement, then awards
+    daily_complete from the checkin_daily rows of the days that gained a done habit.
+    Repeated toggles of the same habit and day collapse to the last one. XP events
+    carry a dedupe_key (one habit_done per habit and day, one daily_complete per day),
+    so replays and concurrent taps never award twice. The second statement sees the
+    rollup after this request's writes, on rows its trigger updates hold locked, so
+    concurrent requests that reach the threshold together still award it once.
+    """
+    today = date.today()
+    latest: Dict[Tuple[int, date], CheckinToggle] = {}
+    skipped = []
+    for t in toggles:
+        day = t.date or today
+        if writable_day(day, today):
+            latest.pop((t.habit_id, day), None)
+            latest[(t.habit_id, day)] = t
+        else:
+            skipped.append(t)
+    if not latest:
+        return CheckinBulkResponse(applied=[], skipped=skipped, xp_awarded=0, daily_complete=[])
+
+    keys = list(latest)
     with db.cursor() as cur:
         cur.execute("""
-            INSERT INTO xp_events(user_id, reason, amount, meta)
-            VALUES (%s,%s,%s,%s)
-        """, (user_id, reason, amount, json.dumps(meta) if meta is not None else None))
+            WITH input AS (
+                SELECT t.habit_id, t.d, t.done
+                FROM unnest(%(habits)s::int[], %(days)s::date[], %(done)s::bool[]) AS t(habit_id, d, done)
+                JOIN habits h ON h.id = t.habit_id AND h.user_id = %(uid)s
+            ),
+            up AS (
+                INSERT INTO checkins (habit_id, user_id, checkin_date, done)
+                SELECT habit_id, %(uid)s, d, done FROM input
+                ON CONFLICT (user_id, habit_id, checkin_date) DO UPDATE SET done = EXCLUDED.done
+                WHERE COALESCE(checkins.done, FALSE) <> EXCLUDED.done
+                RETURNING habit_id, checkin_date, done
+            ),
+            xp AS (
+                INSERT INTO xp_events (user_id, reason, amount, meta, dedupe_key)
+                SELECT %(uid)s, 'habit_done', %(xp_done)s,
+                       jsonb_build_object('habit_id', habit_id, 'date', checkin_date),
+                       'habit_done:' || habit_id || ':' || checkin_date
+                FROM up WHERE done
+                ON CONFLICT (user_id, dedupe_key) WHERE dedupe_key IS NOT NULL DO NOTHING
+                RETURNING reason, amount, (meta->>'date')::date AS d
+            )
+            SELECT 'owned', habit_id, NULL::date, 0 FROM (SELECT DISTINCT habit_id FROM input) o
+            UNION ALL
+            SELECT 'changed', habit_id, checkin_date, done::int FROM up
+            UNION ALL
+            SELECT reason, NULL, d, amount FROM xp
+        """, {
+            "uid": user_id, "habits": [h for h, _ in keys], "days": [d for _, d in keys],
+            "done": [latest[k].done for k in keys], "xp_done": XP_HABIT_DONE,
+        })
+        rows = cur.fetchall()
+
+        # only a day that gained a done habit can have reached the threshold
+        done_days = sorted({d for kind, _, d, done in rows if kind == "changed" and done})
+        if done_days:
+            cur.execute("""
+                INSERT INTO xp_events (user_id, reason, amount, meta, dedupe_key)
+                SELECT user_id, 'daily_complete', %(xp_daily)s, jsonb_build_object('date', c_date),
+                       'daily_complete:' || c_date
+                FROM checkin_daily
+                WHERE user_id = %(uid)s AND c_date = ANY(%(days)s::date[]) AND done_count >= %(daily_at)s
+                ON CONFLICT (user_id, dedupe_key) WHERE dedupe_key IS NOT NULL DO NOTHING
+                RETURNING reason, NULL::int, (meta->>'date')::date, amount
+            """, {"uid": user_id, "days": done_days, "xp_daily": XP_DAILY_COMPLETE, "daily_at": DAILY_COMPLETE_AT})
+            rows += cur.fetchall()
+
+    owned = {hid for kind, hid, _, _ in rows if kind == "owned"}
+    changed = {(hid, d) for kind, hid, d, _ in rows if kind == "changed"}
+    applied = []
+    for (hid, day), t in latest.items():
+        if hid in owned:
+            applied.append(CheckinResult(habit_id=hid, date=day, done=t.done, changed=(hid, day) in changed))
+        else:
+            skipped.append(t)
+    return CheckinBulkResponse(
+        applied=applied,
+        skipped=skipped,
+        xp_awarded=sum(amount for kind, _, _, amount in rows if kind in ("habit_done", "daily_complete")),
+        daily_complete=sorted(d for kind, _, d, _ in rows if kind == "daily_complete"),
+    )
+
+# =========================================
+#   Per-user snapshot
+# =========================================
+# Each part is a scalar subquery; load_snapshot() glues the requested ones into a
+# single SELECT so a page load costs one round trip whatever it shows.
+SNAPSHOT_PARTS = {
+    # [[day, done, total], ...] for the last 7 days
+    "daily": """(SELECT COALESCE(json_agg(json_build_array(c_date, done_count, total_count)), '[]')
+                 FROM checkin_daily
+                 WHERE user_id = %(uid)s AND c_date BETWEEN %(week_start)s AND %(today)s)""",
+    "streaks": """(SELECT json_build_object(
+                      'perfect_start', perfect_start, 'perfect_end', perfect_end,
+                      'soft_start', soft_start, 'soft_end', soft_end)
+                   FROM user_streaks WHERE user_id = %(uid)s)""",
+    # habits in plan-picking order
+    "habits": """(SELECT COALESCE(json_agg(json_build_object(
+                     'id', id, 'name', name, 'icon', icon, 'category', category, 'difficulty', difficulty)
+                     ORDER BY difficulty ASC, created_at DESC, id DESC), '[]')
+                  FROM habits WHERE user_id = %(uid)s)""",
+    "done_today": """(SELECT COALESCE(json_object_agg(habit_id, done), '{}')
+                      FROM checkins WHERE user_id = %(uid)s AND checkin_date = %(today)s)""",
+    "xp": """(SELECT COALESCE(MAX(total_xp), 0) FROM user_xp WHERE user_id = %(uid)s)""",
+    # insights.py baseline of the 6 days before today: the nightly row while it is
+    # current, else the same query run live for this user
+    "baseline": f"""COALESCE(
+                    (SELECT to_json(s) FROM user_insights_snapshot s
+                     WHERE s.user_id = %(uid)s AND s.as_of = %(today)s AND s.weigh_dates IS NOT NULL
+                       AND s.history_version = COALESCE((SELECT version FROM data_versions
+                                                         WHERE user_id = %(uid)s AND domain = 'history'), 0)),
+                    (SELECT to_json(b) FROM ({baseline_select("(SELECT %(uid)s::uuid AS id)")}) b))""",
+    "daily_today": """(SELECT json_build_array(done_count, total_count)
+                       FROM checkin_daily WHERE user_id = %(uid)s AND c_date = %(today)s)""",
+    "weighin_today": """(SELECT json_build_array((kg)::float, trend)
+                         FROM weigh_ins WHERE user_id = %(uid)s AND wi_date = %(today)s)""",
+    # keys plateau_memo: a weigh-in write of any date bumps it
+    "weighins_version": """COALESCE((SELECT version FROM data_versions
+                                      WHERE user_id = %(uid)s AND domain = 'weighins'), 0)""",
+    "schedule": """(SELECT COALESCE(json_agg(json_build_object('habit_id', habit_id, 'slot', slot)), '[]')
+                    FROM habit_schedule WHERE user_id = %(uid)s AND s_date = %(today)s)""",
+    # only when tip_cache is due; load_snapshot moves it there
+    "tips": """(SELECT COALESCE(json_object_agg(tag, texts), '{}')
+                FROM (SELECT tag, array_agg(text) AS texts FROM tips GROUP BY tag) t)""",
+    # same column order as get_metrics_for()
+    "metrics_today": """(SELECT json_build_array(steps, sleep_hours, protein_g, fiber_g, water_ml,
+                                                 strength_min, cardio_min, mood, hunger, notes)
+                         FROM daily_metrics WHERE user_id = %(uid)s AND m_date = %(today)s)""",
+    # same column order as get_profile()
+    "profile": """(SELECT json_build_array(sex, birth_year, height_cm, weight_kg, activity_factor, deficit_percent,
+                                           diet, mode, units, timezone, to_char(reminder_time, 'HH24:MI'))
+                   FROM user_profile WHERE user_id = %(uid)s)""",
+}
+
+def load_snapshot(db, user_id: UUID, parts) -> Dict:
+    """Loads the requested SNAPSHOT_PARTS for one user in a single statement ("tips" only when tip_cache is due)."""
+    parts = [p for p in SNAPSHOT_PARTS if p in set(parts) and (p != "tips" or tip_cache.due())]
+    if not parts:
+        return {}
+    today = date.today()
+    q = "SELECT " + ",\n       ".join(f"{SNAPSHOT_PARTS[p]} AS {p}" for p in parts)
+    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q, {"uid": user_id, "today": today, "week_start": today - timedelta(days=6), **baseline_params(today)})
+        snap = dict(cur.fetchone())
+    snap["user_id"] = user_id
+    if "tips" in snap:
+        tip_cache.load(snap.pop("tips"))
+    if "daily" in snap:
+        snap["daily"] = {date.fromisoformat(d): (int(done), int(total)) for d, done, total in snap["daily"]}
+    if snap.get("streaks"):
+        snap["streaks"] = {k: date.fromisoformat(v) if v else None for k, v in snap["streaks"].items()}
+    if "done_today" in snap:
+        snap["done_today"] = {int(k): bool(v) for k, v in snap["done_today"].items()}
+    return snap
+
+def snap_today_kg(snap: Dict) -> Optional[float]:
+    return snap["weighin_today"][0] if snap["weighin_today"] else None
+
+def snap_latest_weight(snap: Dict) -> Optional[float]:
+    """Today's weigh-in, else the latest one before it (from the baseline)."""
+    weights = snap["baseline"]["weights"]
+    return snap_today_kg(snap) or (weights[-1] if weights else None)
+
+def snap_plateau(snap: Dict) -> bool:
+    """Memoized per user until their next weigh-in write (or the next day)."""
+    key = (snap["weighins_version"], date.today())
+    flag = plateau_memo.get(snap["user_id"], key)
+    if flag is None:
+        flag = baseline_plateau(snap["baseline"], snap_today_kg(snap), PLATEAU_METHOD)
+        plateau_memo.put(snap["user_id"], key, flag)
+    return flag
+
+def snap_completion_ratio(snap: Dict) -> float:
+    """Same as completion_ratio_last7(), from the snapshot's daily counts."""
+    since = date.today() - timedelta(days=6)
+    done = total = 0
+    for d, (dn, tot) in snap["daily"].items():
+        if d >= since:
+            done += dn
+            total += tot
+    return done / total if total else 0.0
+
+def snap_plan(snap: Dict) -> PlanResponse:
+    energy = classify_energy(snap_completion_ratio(snap))
+    items = choose_plan(snap["habits"], energy)
+    for it in items:
+        it.done = snap["done_today"].get(it.id, False)
+    return PlanResponse(date=date.today().isoformat(), energy=energy, items=items, message=PLAN_MESSAGES[energy])
+
+def snap_insights(snap: Dict) -> InsightsResponse:
+    cr7 = completion_ratio(snap["baseline"], snap["daily_today"])
+    energy = classify_energy(cr7)
+    plateau_flag = snap_plateau(snap)
+    return InsightsResponse(
+        energy=energy,
+        completion_ratio_7d=round(cr7, 3),
+        streak_soft=current_run(snap["streaks"]["soft_start"], snap["streaks"]["soft_end"]) if snap["streaks"] else 0,
+        plateau=plateau_flag,
+        tip=tip_cache.pick(tip_tag(energy, plateau_flag))
+    )
+
+PLATEAU_PARTS = ("baseline", "weighin_today", "weighins_version")
+INSIGHTS_PARTS = PLATEAU_PARTS + ("daily_today", "streaks", "tips")
+
+# section -> (snapshot parts it needs, builder)
+DASHBOARD_SECTIONS = {
+    "plan": (("daily", "habits", "done_today"), snap_plan),
+    "done": (("done_today",), lambda snap: snap["done_today"]),
+    "garden": (("streaks",), lambda snap: garden_from_streaks(snap["streaks"])),
+    "gamify": (("xp",), lambda snap: gamify_from_xp(int(snap["xp"]))),
+    "insights": (INSIGHTS_PARTS, snap_insights),
+    "schedule": (("schedule",), lambda snap: ScheduleResponse(date=date.today().isoformat(), items=snap["schedule"])),
+}
+
+# =========================================
+#   Offline sync
+# =========================================
+# A sync token records the day and the data_versions the client has seen; the next
+# sync returns only the domains whose version moved (day-keyed domains also when
+# the day did, since their window shifted). Each part is a scalar subquery, loaded
+# in one SELECT like the snapshot.
+SYNC_DOMAINS = ("checkins", "weighins", "metrics", "schedule", "habits", "xp", "profile")
+SYNC_DAILY_DOMAINS = ("checkins", "weighins", "metrics", "schedule")
+
+SYNC_PARTS = {
+    # [[habit_id, day, done], ...]
+    "checkins": """(SELECT COALESCE(json_agg(json_build_array(habit_id, checkin_date, done) ORDER BY checkin_date, habit_id), '[]')
+                    FROM checkins WHERE user_id = %(uid)s AND checkin_date >= %(oldest)s)""",
+    # [[day, kg, trend], ...]
+    "weighins": """(SELECT COALESCE(json_agg(json_build_array(wi_date, (kg)::float, round(trend::numeric, 2)) ORDER BY wi_date), '[]')
+                    FROM weigh_ins WHERE user_id = %(uid)s AND wi_date >= %(oldest)s)""",
+    "metrics": """(SELECT COALESCE(json_agg(json_build_object(
+                      'date', m_date, 'steps', steps, 'sleep_hours', sleep_hours, 'protein_g', protein_g,
+                      'fiber_g', fiber_g, 'water_ml', water_ml, 'strength_min', strength_min,
+                      'cardio_min', cardio_min, 'mood', mood, 'hunger', hunger, 'notes', notes) ORDER BY m_date), '[]')
+                   FROM daily_metrics WHERE user_id = %(uid)s AND m_date >= %(oldest)s)""",
+    # {day: [{habit_id, slot}, ...]}
+    "schedule": """(SELECT COALESCE(json_object_agg(s_date, items), '{}')
+                    FROM (SELECT s_date, json_agg(json_build_object('habit_id', habit_id, 'slot', slot)) AS items
+                          FROM habit_schedule WHERE user_id = %(uid)s AND s_date >= %(oldest)s
+                          GROUP BY s_date) s)""",
+    "habits": SNAPSHOT_PARTS["habits"],
+    "xp": SNAPSHOT_PARTS["xp"],
+    "profile": SNAPSHOT_PARTS["profile"],
+}
+
+def sync_token(day: date, versions: Dict[str, int]) -> str:
+    raw = day.isoformat() + ";" + ",".join(f"{d}={versions.get(d, 0)}" for d in SYNC_DOMAINS)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def parse_sync_token(token: Optional[str]) -> Tuple[Optional[date], Dict[str, int]]:
+    """(day, versions) from a sync token; (None, {}) when missing or unreadable, i.e. a full resync."""
+    if not token:
+        return None, {}
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        day, versions = raw.split(";", 1)
+        return date.fromisoformat(day), {d: int(v) for d, v in (kv.split("=") for kv in versions.split(",") if kv)}
+    except ValueError:
+        return None, {}
+
+def sync_versions(db, user_id: UUID) -> Dict[str, int]:
+    with db.cursor() as cur:
+        cur.execute("SELECT domain, version FROM data_versions WHERE user_id=%s AND domain = ANY(%s)",
+                    (user_id, list(SYNC_DOMAINS)))
+        return {d: int(v) for d, v in cur.fetchall()}
+
+def load_sync_changes(db, user_id: UUID, domains: List[str]) -> Dict[str, Any]:
+    if not domains:
+        return {}
+    today = date.today()
+    q = "SELECT " + ",\n       ".join(f"{SYNC_PARTS[d]} AS {d}" for d in domains)
+    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q, {"uid": user_id, "oldest": today - timedelta(days=CHECKIN_BACKFILL_DAYS)})
+        changes = dict(cur.fetchone())
+    if "xp" in changes:
+        changes["xp"] = gamify_from_xp(int(changes["xp"]))
+    if "profile" in changes:
+        changes["profile"] = profile_from_row(changes["profile"])
+    return changes
+
+def claim_mutations(db, user_id: UUID, mutations: List[SyncMutationBase]) -> set:
+    """Records idempotency keys; returns the ids not seen before. Replays of a key block until its first sync commits."""
+    if not mutations:
+        return set()
+    with db.cursor() as cur:
+        rows = psycopg2.extras.execute_values(cur, """
+            INSERT INTO sync_mutations (user_id, mutation_id, kind) VALUES %s
+            ON CONFLICT (user_id, mutation_id) DO NOTHING
+            RETURNING mutation_id
+        """, [(user_id, m.id, m.type) for m in mutations], page_size=len(mutations), fetch=True)
+    return {r[0] for r in rows}
+
+STORED_WEIGHIN = TypeAdapter(Dict[str, StoredKg])  # {'kg': ...}, so errors name the field
+
+def column_error(m: SyncMutationBase) -> Optional[str]:
+    """Why a weigh-in or metrics mutation doesn't fit its table's columns, or None."""
+    try:
+        if m.type == "weighin":
+            STORED_WEIGHIN.validate_python({"kg": m.kg})
+        elif m.type == "metrics":
+            StoredMetrics.model_validate(m.model_dump(include=set(IMPORT_METRICS)))
+    except ValidationError as e:
+        return error_message(e)
+    return None
+
+def apply_sync_writes(db, user_id: UUID, mutations: List[SyncMutationBase]) -> List[SyncRejected]:
+    """
+    Applies new mutations with one batched write per kind. Writes to the same
+    (kind, day[, habit]) collapse to the last one in queue order. A mutation whose
+    values don't fit the columns is rejected alone, so it can't fail the batch.
+    """
+    today = date.today()
+    rejected = [SyncRejected(id=m.id, reason="date outside the sync window")
+                for m in mutations if not writable_day(m.date, today)]
+    checked = [(m, column_error(m)) for m in mutations if writable_day(m.date, today)]
+    rejected += [SyncRejected(id=m.id, reason=err) for m, err in checked if err]
+    mutations = [m for m, err in checked if not err]
+
+    checkins = [m for m in mutations if m.type == "checkin"]
+    if checkins:
+        result = apply_checkins(db, user_id, [CheckinToggle(habit_id=m.habit_id, done=m.done, date=m.date)
+                                              for m in checkins])
+        known = {a.habit_id for a in result.applied}
+        rejected += [SyncRejected(id=m.id, reason="unknown habit") for m in checkins if m.habit_id not in known]
+
+    weighins = {m.date: m for m in mutations if m.type == "weighin"}
+    metrics_days = {m.date: m for m in mutations if m.type == "metrics"}
+    schedules = {m.date: m for m in mutations if m.type == "schedule"}
+    with db.cursor() as cur:
+        if weighins:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO weigh_ins (user_id, wi_date, kg) VALUES %s
+                ON CONFLICT (user_id, wi_date) DO UPDATE SET kg=EXCLUDED.kg
+            """, [(user_id, d, m.kg) for d, m in weighins.items()], page_size=len(weighins))
+        if metrics_days:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO daily_metrics (user_id, m_date, steps, sleep_hours, protein_g, fiber_g, water_ml, strength_min, cardio_min, mood, hunger, notes)
+                VALUES %s
+                ON CONFLICT (user_id, m_date) DO UPDATE SET
+                    steps=EXCLUDED.steps,
+                    sleep_hours=EXCLUDED.sleep_hours,
+                    protein_g=EXCLUDED.protein_g,
+                    fiber_g=EXCLUDED.fiber_g,
+                    water_ml=EXCLUDED.water_ml,
+                    strength_min=EXCLUDED.strength_min,
+                    cardio_min=EXCLUDED.cardio_min,
+                    mood=EXCLUDED.mood,
+                    hunger=EXCLUDED.hunger,
+                    notes=EXCLUDED.notes
+            """, [(user_id, d, m.steps, m.sleep_hours, m.protein_g, m.fiber_g, m.water_ml,
+                   m.strength_min, m.cardio_min, m.mood, m.hunger, m.notes) for d, m in metrics_days.items()],
+               page_size=len(metrics_days))
+        if schedules:
+            # a schedule replaces the whole day; items for habits the user doesn't own are dropped
+            cur.execute("DELETE FROM habit_schedule WHERE user_id=%s AND s_date = ANY(%s)", (user_id, list(schedules)))
+            values = list({(d, item.habit_id): (user_id, d, item.habit_id, item.slot)
+                           for d, m in schedules.items() for item in m.items}.values())
+            if values:
+                psycopg2.extras.execute_values(cur, """
+                    INSERT INTO habit_schedule (user_id, s_date, habit_id, slot)
+                    SELECT v.user_id, v.s_date, v.habit_id, v.slot
+                    FROM (VALUES %s) AS v(user_id, s_date, habit_id, slot)
+                    JOIN habits h ON h.id = v.habit_id AND h.user_id = v.user_id
+                """, values, page_size=len(values))
+    return rejected
+
+# =========================================
+#   History import
+# =========================================
+def import_row_values(record: Dict) -> Tuple:
+    """Staging columns for one record: (date, kg, has_metrics, *IMPORT_METRICS), unset metrics as NULL."""
+    row = ImportRow.model_validate(record)
+    if row.date > date.today() + timedelta(days=1):
+        raise ValueError(f"date: {row.date} is in the future")
+    given = row.model_fields_set
+    metrics_values = [getattr(row, f) if f in given else None for f in IMPORT_METRICS]
+    return (row.date, row.kg, any(v is not None for v in metrics_values), *metrics_values)
+
+def import_history(db, user_id: UUID, binary, fmt: str, skip_invalid: bool) -> ImportResponse:
+    """
+    COPYs the file into a temp staging table as it is parsed, then merges it with one
+    upsert: the last row of a day wins, per kind. The weigh-in trend is recomputed once
+    from the earliest changed day instead of by the per-row trigger.
+    """
+    stream = CopyStream(read_records(binary, fmt), import_row_values, max_rows=IMPORT_MAX_ROWS)
+    with db.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE import_rows (
+                line INT, d DATE, kg NUMERIC(5,2), has_metrics BOOLEAN,
+                steps INT, sleep_hours NUMERIC(3,1), protein_g INT, fiber_g INT, water_ml INT,
+                strength_min INT, cardio_min INT, mood SMALLINT, hunger SMALLINT, notes TEXT
+            ) ON COMMIT DROP
+        """)
+        try:
+            cur.copy_expert("COPY import_rows FROM STDIN", stream)
+        except psycopg2.Error:
+            if stream.failure is not None:
+                raise stream.failure
+            raise
+        if stream.invalid and not skip_invalid:
+            raise HTTPException(status_code=422, detail={
+                "message": f"{stream.invalid} invalid rows, nothing imported (retry with skip_invalid=true to import the rest)",
+                "errors": [{"line": line, "error": err} for line, err in stream.errors]})
+
+        cur.execute("SELECT set_config('boostfit.defer_trend', 'on', true)")
+        cur.execute("""
+            WITH wi AS (
+                INSERT INTO weigh_ins (user_id, wi_date, kg)
+                SELECT DISTINCT ON (d) %(uid)s, d, kg FROM import_rows
+                WHERE kg IS NOT NULL
+                ORDER BY d, line DESC
+                ON CONFLICT (user_id, wi_date) DO UPDATE SET kg = EXCLUDED.kg
+                WHERE weigh_ins.kg <> EXCLUDED.kg
+                RETURNING wi_date
+            ),
+            dm AS (
+                INSERT INTO daily_metrics (user_id, m_date, steps, sleep_hours, protein_g, fiber_g, water_ml,
+                                           strength_min, cardio_min, mood, hunger, notes)
+                SELECT %(uid)s, r.d,
+                       COALESCE(r.steps, m.steps, 0), COALESCE(r.sleep_hours, m.sleep_hours),
+                       COALESCE(r.protein_g, m.protein_g), COALESCE(r.fiber_g, m.fiber_g),
+                       COALESCE(r.water_ml, m.water_ml), COALESCE(r.strength_min, m.strength_min, 0),
+                       COALESCE(r.cardio_min, m.cardio_min, 0), COALESCE(r.mood, m.mood),
+                       COALESCE(r.hunger, m.hunger), COALESCE(r.notes, m.notes)
+                FROM (SELECT DISTINCT ON (d) * FROM import_rows WHERE has_metrics ORDER BY d, line DESC) r
+                LEFT JOIN daily_metrics m ON m.user_id = %(uid)s AND m.m_date = r.d
+                ON CONFLICT (user_id, m_date) DO UPDATE SET
+                    steps=EXCLUDED.steps,
+                    sleep_hours=EXCLUDED.sleep_hours,
+                    protein_g=EXCLUDED.protein_g,
+                    fiber_g=EXCLUDED.fiber_g,
+                    water_ml=EXCLUDED.water_ml,
+                    strength_min=EXCLUDED.strength_min,
+                    cardio_min=EXCLUDED.cardio_min,
+                    mood=EXCLUDED.mood,
+                    hunger=EXCLUDED.hunger,
+                    notes=EXCLUDED.notes
+                RETURNING m_date
+            )
+            SELECT (SELECT COUNT(*) FROM wi), (SELECT MIN(wi_date) FROM wi), (SELECT COUNT(*) FROM dm),
+                   (SELECT MIN(d) FROM import_rows), (SELECT MAX(d) FROM import_rows)
+        """, {"uid": user_id})
+        weighins, trend_from, metrics_days, first, last = cur.fetchone()
+        if trend_from is not None:
+            cur.execute("SELECT public.weigh_in_trend_from(%s, %s), set_config('boostfit.defer_trend', 'off', true)",
+                        (user_id, trend_from))
+
+    return ImportResponse(
+        rows=stream.rows, invalid=stream.invalid, weighins=weighins, metrics_days=metrics_days,
+        first_date=first, last_date=last,
+        errors=[ImportRowError(line=line, error=err) for line, err in stream.errors],
+    )
 
 # =========================================
 #   API (No changes needed)
@@ -654,54 +1389,53 @@ def health(db = Depends(get_db)):
     with db.cursor() as cur:
         cur.execute("SELECT 1")
         if cur.fetchone()[0] == 1:
-            return {"status": "ok", "version": APP_VERSION}
+            return {"status": "ok", "version": APP_VERSION, "pool": db_pool.stats(), "auth_cache": token_cache.stats(),
+                    "recipes": recipe_catalog.stats()}
     raise HTTPException(status_code=500, detail="Database connection failed")
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Prometheus scrape target. Never touches the database, and runs on the event loop
+    so a saturated threadpool or pool can still be observed.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
 
 @app.get("/api/habits", response_model=List[Habit])
+@query_budget(5)
 def get_habits(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     energy, items = pick_plan_for_today(db, user_id)
     items = attach_today_done(db, items, user_id)
     return items
 
 @app.post("/api/checkins")
+@query_budget(2)
 def create_or_update_checkin(checkin: Checkin, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
-    today = date.today()
-    with db.cursor() as cur:
-        cur.execute("""
-            SELECT done FROM checkins
-            WHERE habit_id=%s AND user_id=%s AND checkin_date=%s
-        """, (checkin.habit_id, user_id, today))
-        prev = cur.fetchone()
-        prev_done = bool(prev[0]) if prev else False
-
-        cur.execute("""
-            INSERT INTO checkins (habit_id, user_id, checkin_date, done)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (user_id, habit_id, checkin_date) DO UPDATE SET done=EXCLUDED.done
-        """, (checkin.habit_id, user_id, today, checkin.done))
-
-        if checkin.done and not prev_done:
-            award_xp(db, user_id, "habit_done", 10, {"habit_id": checkin.habit_id})
-            cur.execute("""
-                SELECT COUNT(*) FROM checkins
-                WHERE user_id=%s AND checkin_date=%s AND done
-            """, (user_id, today))
-            done_cnt = int(cur.fetchone()[0] or 0)
-            if done_cnt >= 3:
-                award_xp(db, user_id, "daily_complete", 25, None)
-
-    return {"status": "success", "habit_id": checkin.habit_id, "done": checkin.done}
+    result = apply_checkins(db, user_id, [CheckinToggle(habit_id=checkin.habit_id, done=checkin.done)])
+    if not result.applied:
+        raise HTTPException(status_code=404, detail="Habit not found")
+    return {"status": "success", "habit_id": checkin.habit_id, "done": checkin.done, "xp_awarded": result.xp_awarded}
+
+@app.post("/api/checkins/bulk", response_model=CheckinBulkResponse)
+@query_budget(2)
+def checkins_bulk(req: CheckinBulkRequest, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
+    """
+    Many toggles (e.g. rapid taps coalesced by the PWA, or an offline queue) in one
+    write. Safe to retry: re-applying the same toggles changes nothing and awards no XP.
+    """
+    return apply_checkins(db, user_id, req.items)
 
-@app.get("/api/weighins", response_model=List[WeighIn])
-def list_weighins(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
-    with db.cursor() as cur:
+@app.get("/api/weighins", response_model=List[WeighIn], dependencies=[Depends(conditional("weighins"))])
+@query_budget(2)
+def list_weighins(response: Response, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
+    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         cur.execute("""
-            SELECT wi_date, kg FROM weigh_ins
+            SELECT wi_date AS date, (kg)::float AS kg FROM weigh_ins
             WHERE user_id=%s ORDER BY wi_date ASC
         """, (user_id,))
         rows = cur.fetchall()
-    return [{"date": r[0], "kg": float(r[1])} for r in rows]
+    return fastjson.respond(fastjson.dumps(rows), response)
 
 @app.post("/api/weighins")
 def add_weighin(w: WeighIn, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
@@ -711,30 +1445,65 @@ def add_weighin(w: WeighIn, user_id: UUID = Depends(get_current_user_id), db = D
             INSERT INTO weigh_ins (user_id, wi_date, kg)
             VALUES (%s, %s, %s)
             ON CONFLICT (user_id, wi_date) DO UPDATE SET kg=EXCLUDED.kg
+            RETURNING trend
         """, (user_id, wi_date, w.kg))
-    return {"status": "success", "date": wi_date.isoformat(), "kg": w.kg}
-
-@app.get("/api/trend", response_model=List[TrendPoint])
-def trend(alpha: float = 0.3, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
+        (t,) = cur.fetchone()
+    return {"status": "success", "date": wi_date.isoformat(), "kg": w.kg,
+            "trend": float(round2(t)) if t is not None else None}
+
+@app.get("/api/trend", response_model=List[TrendPoint], dependencies=[Depends(conditional("weighins"))])
+@query_budget(3)
+def trend(
+    alpha: float = Query(0.3, gt=0, le=1),
+    from_: Optional[date] = Query(None, alias="from", description="first day to return (inclusive)"),
+    to: Optional[date] = Query(None, description="last day to return (inclusive)"),
+    seed: Optional[float] = Query(None, gt=0, description="trend value just before the first returned point"),
+    user_id: UUID = Depends(get_current_user_id),
+    db = Depends(get_db)
+):
+    """
+    The default alpha is served from the stored weigh_ins.trend column. Other alphas
+    are smoothed on the fly; without `seed`, a window starting at `from` replays only
+    the few weigh-ins needed for earlier history to vanish below display precision
+    (see utils.ewma_warmup).
+    """
+    if alpha == TREND_ALPHA and seed is None:
+        with db.cursor() as cur:
+            cur.execute("""
+                SELECT wi_date::text, (kg)::float, trend FROM weigh_ins
+                WHERE user_id=%(uid)s
+                  AND (%(from)s::date IS NULL OR wi_date >= %(from)s)
+                  AND (%(to)s::date IS NULL OR wi_date <= %(to)s)
+                ORDER BY wi_date ASC
+            """, {"uid": user_id, "from": from_, "to": to})
+            rows = cur.fetchall()
+        if all(t is not None for _, _, t in rows):
+            trends = round2([t for _, _, t in rows]).tolist()
+            return [{"date": d, "weight": w, "trend": t} for (d, w, _), t in zip(rows, trends)]
+
+    warmup = 0 if seed is not None or from_ is None else ewma_warmup(alpha)
     with db.cursor() as cur:
         cur.execute("""
-            SELECT wi_date::text, (kg)::float FROM weigh_ins
-            WHERE user_id=%s ORDER BY wi_date ASC
-        """, (user_id,))
+            (SELECT wi_date::text AS d, (kg)::float, false FROM weigh_ins
+             WHERE user_id=%(uid)s AND wi_date < %(from)s
+             ORDER BY wi_date DESC LIMIT %(warmup)s)
+            UNION ALL
+            (SELECT wi_date::text AS d, (kg)::float, true FROM weigh_ins
+             WHERE user_id=%(uid)s
+               AND (%(from)s::date IS NULL OR wi_date >= %(from)s)
+               AND (%(to)s::date IS NULL OR wi_date <= %(to)s))
+            ORDER BY d ASC
+        """, {"uid": user_id, "from": from_, "to": to, "warmup": warmup})
         rows = cur.fetchall()
-    points = ewma(rows, alpha=alpha)
-    return [{"date": d, "weight": float(w), "trend": float(t)} for (d, w, t) in points]
+    points = ewma([(d, w) for d, w, _ in rows], alpha=alpha, seed=seed)
+    return [{"date": d, "weight": w, "trend": t} for (d, w, t), (_, _, keep) in zip(points, rows) if keep]
 
 @app.get("/api/plan/today", response_model=PlanResponse)
+@query_budget(5)
 def plan_today(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     energy, items = pick_plan_for_today(db, user_id)
     items = attach_today_done(db, items, user_id)
-    msg = {
-        "low": "Énergie basse : micro-pas aujourd’hui. Chaque check compte 💪",
-        "medium": "Régulier = progrès. 3 actions simples et on célèbre 🎉",
-        "high": "Tu es en feu 🚀 On ose un cran au-dessus !",
-    }[energy]
-    return PlanResponse(date=date.today().isoformat(), energy=energy, items=items, message=msg)
+    return PlanResponse(date=date.today().isoformat(), energy=energy, items=items, message=PLAN_MESSAGES[energy])
 
 # ---------- Nutrition Coach ----------
 @app.post("/api/coach/estimate", response_model=CoachEstimateResponse)
@@ -779,28 +1548,30 @@ def coach_macro_split(req: MacroSplitRequest):
         notes=notes
     )
 
-@app.get("/api/recipes", response_model=List[Recipe])
+@app.get("/api/recipes", response_model=List[Recipe], dependencies=[Depends(conditional("recipes", catalog=True))])
+@query_budget(4)  # data + catalog version, the user's recipes; +2 on a catalog reload
 def list_recipes(
+    response: Response,
     diet: Optional[str] = Query(None, description="omnivore|vegetarian"),
     tag: Optional[str] = Query(None, description="breakfast|lunch|dinner|snack|high-protein|easy"),
     max_kcal: Optional[int] = Query(None),
     user_id: UUID = Depends(get_current_user_id),
     db = Depends(get_db)
 ):
-    return fetch_recipes(db, user_id, diet=diet, tag=tag, max_kcal=max_kcal)
+    return recipes_response(fetch_recipes(db, user_id, diet=diet, tag=tag, max_kcal=max_kcal), response)
 
 @app.post("/api/recipes", response_model=Recipe, status_code=201)
 def create_recipe(recipe: RecipeCreate, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     """Creates a new recipe for the user."""
     with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         cur.execute("""
-            INSERT INTO recipes (user_id, name, kcal, protein_g, carbs_g, fat_g, prep_min, tags, diet, ingredients, steps)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id, name, kcal, protein_g, carbs_g, fat_g, prep_min, tags, diet, ingredients, steps
-        """, (
+            INSERT INTO recipes (user_id, name, kcal, protein_g, carbs_g, fat_g, prep_min, tags, diet, ingredients, steps, ingredients_norm)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING """ + RECIPE_COLUMNS, (
             user_id, recipe.name, recipe.kcal, recipe.protein_g, recipe.carbs_g,
             recipe.fat_g, recipe.prep_min, recipe.tags, recipe.diet,
-            json.dumps(recipe.ingredients), recipe.steps
+            json.dumps(recipe.ingredients), recipe.steps,
+            json.dumps(normalize_ingredients(recipe.ingredients))
         ))
         new_recipe = cur.fetchone()
     return Recipe(**new_recipe)
@@ -808,89 +1579,61 @@ def create_recipe(recipe: RecipeCreate, user_id: UUID = Depends(get_current_user
 
 @app.get("/api/coach/snacks", response_model=List[Recipe])
 def coach_snacks(
+    response: Response,
     diet: str = "omnivore",
     max_kcal: int = 240,
     min_protein: int = 12,
     limit: int = 3,
     db = Depends(get_db)
 ):
-    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("""
-            SELECT id, name, kcal, protein_g, carbs_g, fat_g, prep_min, tags, diet, ingredients, steps
-            FROM recipes
-            WHERE diet=%s
-              AND 'snack' = ANY(tags)
-              AND kcal <= %s
-              AND protein_g >= %s
-            ORDER BY protein_g DESC, prep_min ASC, kcal ASC
-            LIMIT %s
-        """, (diet, max_kcal, min_protein, limit))
-        rows = cur.fetchall()
-    return [Recipe(
-        id=r["id"], name=r["name"], kcal=int(r["kcal"]),
-        protein_g=int(r["protein_g"]), carbs_g=int(r["carbs_g"]),
-        fat_g=int(r["fat_g"]), prep_min=int(r["prep_min"]),
-        tags=list(r["tags"]), diet=r["diet"],
-        ingredients=list(r["ingredients"]), steps=list(r["steps"])
-    ) for r in rows]
+    recipe_catalog.refresh_if_stale(db)
+    cands = [r for r in recipe_catalog.candidates(diet, "snack", kcal_max=max_kcal) if r.protein_g >= min_protein]
+    return recipes_response(heapq.nsmallest(max(limit, 0), cands, key=lambda r: (-r.protein_g, r.prep_min, r.kcal, r.id)), response)
+
+def solve_mealplans(db, user_id: UUID, diet: Optional[str], calorie_target: int,
+                    protein_target: Optional[int], days: int) -> List[MealPlanResponse]:
+    """Fetches candidates once (catalog + the user's own recipes) and plans `days` days jointly; see mealplan.py."""
+    own = recipes_for_user(db, user_id)
+    if protein_target is None:
+        protein_target = compute_targets(db, user_id).protein_g
+    cands = {mt: recipe_catalog.candidates(diet, mt, extra=own) for mt, _ in MEAL_SLOTS}
+    out = []
+    for i, picks in enumerate(plan_days(cands, calorie_target, protein_target, days=days)):
+        out.append(MealPlanResponse(
+            date=(date.today() + timedelta(days=i)).isoformat(),
+            total_kcal=sum(r.kcal for _, r in picks),
+            total_protein_g=sum(r.protein_g for _, r in picks),
+            items=[MealItem(meal_type=mt, recipe=r) for mt, r in picks]
+        ))
+    return out
 
 @app.post("/api/mealplan/today", response_model=MealPlanResponse)
+@query_budget(4)  # the user's recipes + catalog version, latest weight; +2 on a catalog reload
 def mealplan_today(
     diet: Optional[str] = "omnivore",
-    calorie_target: Optional[int] = 1800,
+    calorie_target: int = Query(1800, gt=0),
+    protein_target: Optional[int] = Query(None, gt=0, description="defaults to the user's protein target"),
     user_id: UUID = Depends(get_current_user_id),
     db = Depends(get_db)
 ):
-    want = [
-        ("breakfast", int(0.20 * calorie_target)),
-        ("lunch",     int(0.35 * calorie_target)),
-        ("dinner",    int(0.35 * calorie_target)),
-        ("snack",     int(0.05 * calorie_target)),
-        ("snack",     int(0.05 * calorie_target)),
-    ]
-    items: List[MealItem] = []
-    total_kcal = 0
-    total_protein = 0
+    return solve_mealplans(db, user_id, diet, calorie_target, protein_target, days=1)[0]
 
-    for meal_type, target_kcal in want:
-        with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("""
-                SELECT id, name, kcal, protein_g, carbs_g, fat_g, prep_min, tags, diet, ingredients, steps
-                FROM recipes
-                WHERE (user_id IS NULL OR user_id = %s)
-                  AND diet = %s
-                  AND %s = ANY(tags)
-                  AND kcal BETWEEN %s AND %s
-                ORDER BY (ABS(kcal - %s)) ASC, protein_g DESC, prep_min ASC
-                LIMIT 1
-            """, (user_id, diet, meal_type, max(150, target_kcal-150), target_kcal+150, target_kcal))
-            r = cur.fetchone()
-        if not r:
-            recs = fetch_recipes(db, user_id, diet=diet, tag=meal_type)
-            if not recs:
-                continue
-            rec = recs[0]
-        else:
-            rec = Recipe(
-                id=r["id"], name=r["name"], kcal=int(r["kcal"]),
-                protein_g=int(r["protein_g"]), carbs_g=int(r["carbs_g"]),
-                fat_g=int(r["fat_g"]), prep_min=int(r["prep_min"]),
-                tags=list(r["tags"]), diet=r["diet"],
-                ingredients=list(r["ingredients"]), steps=list(r["steps"])
-            )
-        items.append(MealItem(meal_type=meal_type, recipe=rec))
-        total_kcal += rec.kcal
-        total_protein += rec.protein_g
-
-    return MealPlanResponse(
-        date=date.today().isoformat(),
-        total_kcal=total_kcal,
-        total_protein_g=total_protein,
-        items=items
-    )
+@app.post("/api/mealplan/week", response_model=List[MealPlanResponse])
+@query_budget(4)  # the user's recipes + catalog version, latest weight; +2 on a catalog reload
+def mealplan_week(
+    diet: Optional[str] = "omnivore",
+    calorie_target: int = Query(1800, gt=0),
+    protein_target: Optional[int] = Query(None, gt=0, description="defaults to the user's protein target"),
+    days: int = Query(7, ge=1, le=14),
+    user_id: UUID = Depends(get_current_user_id),
+    db = Depends(get_db)
+):
+    """One plan per day starting today; recipes repeat across days only when the catalog runs short."""
+    return solve_mealplans(db, user_id, diet, calorie_target, protein_target, days=days)
 
 @app.get("/api/mealplan/alternatives", response_model=List[Recipe])
 def mealplan_alternatives(
+    response: Response,
     meal_type: str,
     diet: str = "omnivore",
     near_kcal: int = 500,
@@ -899,53 +1642,45 @@ def mealplan_alternatives(
 ):
     lo = max(150, near_kcal - 120)
     hi = near_kcal + 120
-    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("""
-            SELECT id, name, kcal, protein_g, carbs_g, fat_g, prep_min, tags, diet, ingredients, steps
-            FROM recipes
-            WHERE (user_id IS NULL OR user_id = %s)
-              AND diet=%s
-              AND %s = ANY(tags)
-              AND kcal BETWEEN %s AND %s
-            ORDER BY protein_g DESC, ABS(kcal - %s) ASC, prep_min ASC
-            LIMIT 3
-        """, (user_id, diet, meal_type, lo, hi, near_kcal))
-        rows = cur.fetchall()
-    return [Recipe(
-        id=r["id"], name=r["name"], kcal=int(r["kcal"]),
-        protein_g=int(r["protein_g"]), carbs_g=int(r["carbs_g"]),
-        fat_g=int(r["fat_g"]), prep_min=int(r["prep_min"]),
-        tags=list(r["tags"]), diet=r["diet"],
-        ingredients=list(r["ingredients"]), steps=list(r["steps"])
-    ) for r in rows]
+    cands = recipe_catalog.candidates(diet, meal_type, lo, hi, extra=recipes_for_user(db, user_id))
+    return recipes_response(heapq.nsmallest(3, cands, key=lambda r: (-r.protein_g, abs(r.kcal - near_kcal), r.prep_min, r.id)), response)
 
 @app.post("/api/shopping-list", response_model=List[ShoppingListItem])
 def shopping_list(req: ShoppingListRequest, db = Depends(get_db)):
+    """
+    Sums the recipes' normalized ingredient vectors (canonical names, base units g/ml/pièce).
+    A recipe id listed twice counts twice, so a multi-day plan can be sent as-is.
+    """
     if not req.recipe_ids:
         return []
-    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("""
-            SELECT ingredients
-            FROM recipes
-            WHERE id = ANY(%s)
-        """, (req.recipe_ids,))
-        rows = cur.fetchall()
-    acc: Dict[Tuple[str, str], float] = {}
-    for r in rows:
-        for ing in r["ingredients"]:
-            key = (ing["name"], ing.get("unit", ""))
-            qty = float(ing.get("qty", 0))
-            acc[key] = acc.get(key, 0.0) + qty
-    out = [ShoppingListItem(name=k[0], unit=k[1], qty=round(v, 2)) for k, v in acc.items()]
-    out.sort(key=lambda x: x.name)
+    counts = Counter(req.recipe_ids)
+    recipe_catalog.refresh_if_stale(db)
+    key = (recipe_catalog.version, tuple(sorted(counts.items())))
+    cached = shopping_cache.get(key)
+    if cached is not None:
+        return cached
+
+    vectors = {rid: recipe_catalog.vector(rid) for rid in counts}
+    missing = [rid for rid, v in vectors.items() if v is None]
+    if missing:
+        with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT id, ingredients, ingredients_norm FROM recipes WHERE id = ANY(%s)", (missing,))
+            for r in cur.fetchall():
+                vectors[r["id"]] = vector_from_json(r["ingredients_norm"], r["ingredients"])
+    out = [ShoppingListItem(name=n, unit=u, qty=round(q, 2))
+           for n, u, q in sum_vectors((vectors[rid], k) for rid, k in counts.items() if vectors.get(rid) is not None)]
+    if not missing:
+        shopping_cache.put(key, out)
     return out
 
 # ---------- Metrics & Targets ----------
-@app.get("/api/metrics/today", response_model=MetricsPayload)
+@app.get("/api/metrics/today", response_model=MetricsPayload, dependencies=[Depends(conditional("metrics", daily=True))])
+@query_budget(2)
 def metrics_today_get(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     return get_metrics_for(db, user_id, date.today())
 
-@app.get("/api/metrics/week", response_model=List[MetricsDay])
+@app.get("/api/metrics/week", response_model=List[MetricsDay], dependencies=[Depends(conditional("metrics", daily=True))])
+@query_budget(2)
 def metrics_week(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     user = user_id
     start = date.today() - timedelta(days=6)
@@ -998,32 +1733,27 @@ def metrics_today_upsert(payload: MetricsPayload, user_id: UUID = Depends(get_cu
     return payload
 
 @app.get("/api/targets", response_model=TargetsResponse)
+@query_budget(1)
 def get_targets(sex: Optional[str] = Query(None, pattern="^(male|female)$"), user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     return compute_targets(db, user_id, sex=sex)
 
 @app.get("/api/review/weekly", response_model=WeeklyReviewResponse)
+@query_budget(1)
 def review_weekly(sex: Optional[str] = Query(None, pattern="^(male|female)$"), user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
-    targets = compute_targets(db, user_id, sex=sex)
+    snap = load_snapshot(db, user_id, PLATEAU_PARTS + ("metrics_today",))
+    targets = targets_for(snap_latest_weight(snap), sex)
     end = date.today()
     start = end - timedelta(days=6)
 
-    with db.cursor() as cur:
-        cur.execute("""
-            SELECT m_date, steps, sleep_hours, protein_g, fiber_g, water_ml, strength_min, cardio_min
-            FROM daily_metrics
-            WHERE user_id=%s AND m_date BETWEEN %s AND %s
-            ORDER BY m_date ASC
-        """, (user_id, start, end))
-        rows = cur.fetchall()
-
+    week = week_totals(snap["baseline"], snap["metrics_today"])
     days = max(1, (end - start).days + 1)
-    steps_avg = (sum((r[1] or 0) for r in rows) / days)
-    sleep_avg = (sum(float(r[2] or 0) for r in rows if r[2] is not None) / max(1, sum(1 for r in rows if r[2] is not None)))
-    protein_avg = (sum((r[3] or 0) for r in rows if r[3] is not None) / max(1, sum(1 for r in rows if r[3] is not None)))
-    fiber_avg = (sum((r[4] or 0) for r in rows if r[4] is not None) / max(1, sum(1 for r in rows if r[4] is not None)))
-    water_avg = (sum((r[5] or 0) for r in rows if r[5] is not None) / max(1, sum(1 for r in rows if r[5] is not None)))
-    strength_sum = sum((r[6] or 0) for r in rows)
-    cardio_sum = sum((r[7] or 0) for r in rows)
+    steps_avg = week["steps_sum"] / days
+    sleep_avg = week["sleep_sum"] / max(1, week["sleep_n"])
+    protein_avg = week["protein_sum"] / max(1, week["protein_n"])
+    fiber_avg = week["fiber_sum"] / max(1, week["fiber_n"])
+    water_avg = week["water_sum"] / max(1, week["water_n"])
+    strength_sum = week["strength_sum"]
+    cardio_sum = week["cardio_sum"]
 
     adherence = {
         "steps": min(1.0, steps_avg / targets.steps if targets.steps > 0 else 0),
@@ -1035,20 +1765,13 @@ def review_weekly(sex: Optional[str] = Query(None, pattern="^(male|female)$"), u
         "cardio": min(1.0, cardio_sum / targets.cardio_min_week_min if targets.cardio_min_week_min > 0 else 0)
     }
 
-    with db.cursor() as cur:
-        cur.execute("""
-            SELECT wi_date::text, (kg)::float FROM weigh_ins
-            WHERE user_id=%s AND wi_date BETWEEN %s AND %s
-            ORDER BY wi_date ASC
-        """, (user_id, start, end))
-        wr = cur.fetchall()
+    span = trend_span(snap["baseline"], snap["weighin_today"][1] if snap["weighin_today"] else None)
     trend_delta = None
-    if wr:
-        pts = ewma([(d, float(w)) for d, w in wr], alpha=0.3)
-        if len(pts) >= 2:
-            trend_delta = round(pts[-1][2] - pts[0][2], 2)
+    if span:
+        first, last = round2(list(span)).tolist()
+        trend_delta = round(last - first, 2)
 
-    plateau_flag = detect_plateau(db, user_id)
+    plateau_flag = snap_plateau(snap)
 
     suggestions = []
     if adherence["protein"] < 0.8:
@@ -1070,28 +1793,22 @@ def review_weekly(sex: Optional[str] = Query(None, pattern="^(male|female)$"), u
     )
 
 @app.get("/api/insights/today", response_model=InsightsResponse)
+@query_budget(1)
 def insights_today(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
-    cr7 = completion_ratio_last7(db, user_id)
-    energy = classify_energy(cr7)
-    streak = streak_soft(db, user_id)
-    plateau_flag = detect_plateau(db, user_id)
-    tip = pick_tip(db, energy, plateau_flag)
-    return InsightsResponse(
-        energy=energy,
-        completion_ratio_7d=round(cr7, 3),
-        streak_soft=streak,
-        plateau=plateau_flag,
-        tip=tip
-    )
+    return snap_insights(load_snapshot(db, user_id, INSIGHTS_PARTS))
 
 @app.get("/api/coach/message", response_model=CoachMessageResponse)
+@query_budget(1)
 def coach_message(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
-    cr7 = completion_ratio_last7(db, user_id)
-    energy = classify_energy(cr7)
-    plateau = detect_plateau(db, user_id)
-    targets = compute_targets(db, user_id, "male")  # sex fallback
-    today = get_metrics_for(db, user_id, date.today())
+    snap = load_snapshot(db, user_id, PLATEAU_PARTS + ("daily_today", "metrics_today"))
+    return coach_message_for(
+        energy=classify_energy(completion_ratio(snap["baseline"], snap["daily_today"])),
+        plateau=snap_plateau(snap),
+        targets=targets_for(snap_latest_weight(snap), "male"),  # sex fallback
+        today=metrics_from_row(snap["metrics_today"]),
+    )
 
+def coach_message_for(energy: str, plateau: bool, targets: TargetsResponse, today: MetricsPayload) -> CoachMessageResponse:
     low_protein = (today.protein_g or 0) < 0.7 * targets.protein_g
     low_steps = (today.steps or 0) < 0.7 * targets.steps
     low_sleep = (today.sleep_hours or 0) < 0.8 * targets.sleep_hours
@@ -1156,20 +1873,10 @@ def coach_message(user_id: UUID = Depends(get_current_user_id), db = Depends(get
         ]
     )
 
-@app.get("/api/gamify/status", response_model=GamifyStatusResponse)
+@app.get("/api/gamify/status", response_model=GamifyStatusResponse, dependencies=[Depends(conditional("xp"))])
+@query_budget(2)
 def gamify_status(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
-    total = xp_total(db, user_id)
-    level, cur_th, next_th = level_from_xp(total)
-    progress = 0.0 if next_th == cur_th else (total - cur_th) / (next_th - cur_th)
-    names = ["Novice", "Constant·e", "Momentum", "Transformer", "Athlète"]
-    name = names[min(level-1, len(names)-1)]
-    return GamifyStatusResponse(
-        total_xp=total,
-        level=level,
-        level_name=name,
-        next_level_xp=next_th,
-        progress_01=round(progress, 3)
-    )
+    return gamify_from_xp(xp_total(db, user_id))
 
 @app.post("/api/challenges/join", response_model=ChallengeJoinResponse)
 def challenges_join(code: str, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
@@ -1207,6 +1914,7 @@ def challenges_join(code: str, user_id: UUID = Depends(get_current_user_id), db
     )
 
 @app.get("/api/challenges/active", response_model=ChallengeActiveResponse)
+@query_budget(2)
 def challenges_active(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         cur.execute("""
@@ -1226,11 +1934,11 @@ def challenges_active(user_id: UUID = Depends(get_current_user_id), db = Depends
         day = max(1, min(day, int(row["duration_days"])))
 
         cur.execute("""
-            SELECT COUNT(*) FROM daily_metrics
+            SELECT COUNT(*) AS total FROM daily_metrics
             WHERE user_id=%s AND m_date BETWEEN %s AND %s
               AND COALESCE(water_ml,0) >= 1500
         """, (user_id, start, start + timedelta(days=int(row["duration_days"]) - 1)))
-        progress_days = int(cur.fetchone()[0] or 0)
+        progress_days = int(cur.fetchone()["total"] or 0)
 
     return ChallengeActiveResponse(
         code=row["code"], title=row["title"], start_date=start.isoformat(),
@@ -1240,27 +1948,22 @@ def challenges_active(user_id: UUID = Depends(get_current_user_id), db = Depends
 
 @app.post("/api/coach/adjust-calories", response_model=AdjustCaloriesResponse)
 def coach_adjust_calories(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
-    profile = get_profile(db, user_id)
-    tgt = compute_targets(db, user_id, sex=profile.sex)
-    end_d = date.today()
-    start_d = end_d - timedelta(days=6)
-
-    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute("""
-            SELECT steps, sleep_hours, protein_g FROM daily_metrics
-            WHERE user_id=%s AND m_date BETWEEN %s AND %s
-        """, (user_id, start_d, end_d))
-        rows = cur.fetchall()
-
-    def mean_safe(vs):
-        vs = [x for x in vs if x is not None]
-        return (sum(vs)/len(vs)) if vs else 0.0
+    snap = load_snapshot(db, user_id, PLATEAU_PARTS + ("profile", "metrics_today"))
+    profile = profile_from_row(snap["profile"])
+    return adjust_calories_for(
+        tgt=targets_for(snap_latest_weight(snap), sex=profile.sex),
+        week=week_totals(snap["baseline"], snap["metrics_today"]),
+        plateau=snap_plateau(snap),
+    )
 
-    steps_avg = mean_safe([r["steps"] or 0 for r in rows])
-    sleep_avg = mean_safe([r["sleep_hours"] for r in rows])
-    protein_avg = mean_safe([r["protein_g"] for r in rows])
+def adjust_calories_for(tgt: TargetsResponse, week: Dict, plateau: bool) -> AdjustCaloriesResponse:
+    """week: insights.week_totals() over the last 7 days; averages are per logged day."""
+    def mean_safe(total, n):
+        return total / n if n else 0.0
 
-    plateau = detect_plateau(db, user_id)
+    steps_avg = mean_safe(week["steps_sum"], week["metric_days"])
+    sleep_avg = mean_safe(week["sleep_sum"], week["sleep_n"])
+    protein_avg = mean_safe(week["protein_sum"], week["protein_n"])
 
     if plateau and steps_avg >= 0.8*tgt.steps and sleep_avg >= 0.8*tgt.sleep_hours and protein_avg >= 0.8*tgt.protein_g:
         return AdjustCaloriesResponse(suggestion_kcal_delta=-100, reason="Plateau + bonne adhérence : petite baisse calorique.")
@@ -1270,34 +1973,12 @@ def coach_adjust_calories(user_id: UUID = Depends(get_current_user_id), db = Dep
 
 # ---------- Garden & Schedule ----------
 @app.get("/api/garden/state", response_model=GardenStateResponse)
+@query_budget(1)
 def get_garden_state(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
-    today = date.today()
-    yesterday = today - timedelta(days=1)
-
-    streak = perfect_streak_days(db, user_id)
-    watered = daily_complete(db, user_id, today)
-
-    droopy = False
-    if streak == 0:
-        droopy = not daily_complete(db, user_id, yesterday)
-
-    hints = {
-        "seed": "Fais tes 3 habitudes pour faire germer la graine !",
-        "sprout": "Continue comme ça pour voir de nouvelles feuilles.",
-        "leafy": "Ta plante est en pleine croissance, vise la floraison !",
-        "flower": "Superbe fleur ! Maintiens la série pour la garder."
-    }
-    stage = growth_stage(streak)
-
-    return GardenStateResponse(
-        watered_today=watered,
-        perfect_streak=streak,
-        stage=stage,
-        droopy=droopy,
-        hint=hints.get(stage, "Continue tes efforts !")
-    )
+    return garden_from_streaks(get_streaks(db, user_id))
 
 @app.get("/api/schedule/today", response_model=ScheduleResponse)
+@query_budget(1)
 def get_schedule(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         cur.execute("""
@@ -1320,17 +2001,41 @@ def save_schedule(items: List[ScheduleItem], user_id: UUID = Depends(get_current
             """, values)
     return {"status": "success"}
 
+# ---------- Dashboard ----------
+@app.get("/api/dashboard/today", response_model=DashboardResponse, response_model_exclude_none=True)
+@query_budget(1)
+def dashboard_today(
+    sections: Optional[str] = Query(None, description="comma-separated subset of " + ",".join(DASHBOARD_SECTIONS)),
+    user_id: UUID = Depends(get_current_user_id),
+    db = Depends(get_db)
+):
+    """
+    Today + Coach page data in one request.
+
+    Query budget: 1 token decode, 1 pool checkout and exactly 1 SQL statement,
+    whatever the selected sections (only the subqueries they need are included).
+    The individual endpoints it replaces cost ~20 statements together.
+    """
+    wanted = [s.strip() for s in sections.split(",") if s.strip()] if sections else list(DASHBOARD_SECTIONS)
+    unknown = [s for s in wanted if s not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(400, f"Unknown sections: {', '.join(unknown)}")
+
+    snap = load_snapshot(db, user_id, {p for s in wanted for p in DASHBOARD_SECTIONS[s][0]})
+    out = {s: DASHBOARD_SECTIONS[s][1](snap) for s in wanted}
+    return DashboardResponse(date=date.today().isoformat(), **out)
+
 # ---------- Habit Management ----------
 @app.get("/api/habits/manage", response_model=List[Habit])
-def list_all_habits(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
+def list_all_habits(response: Response, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     """Lists all habits created by the user."""
-    with db.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+    with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         cur.execute("""
-            SELECT id, name, icon, category, difficulty FROM habits
+            SELECT id, name, icon, category, difficulty, false AS done FROM habits
             WHERE user_id = %s ORDER BY category, difficulty
         """, (user_id,))
         rows = cur.fetchall()
-    return [Habit(id=r['id'], name=r['name'], icon=r['icon'], category=r['category'], difficulty=r['difficulty']) for r in rows]
+    return fastjson.respond(fastjson.dumps(rows), response)
 
 @app.post("/api/habits/manage", response_model=Habit, status_code=201)
 def create_habit(habit: HabitCreate, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
@@ -1354,7 +2059,8 @@ def delete_habit(habit_id: int, user_id: UUID = Depends(get_current_user_id), db
     return {}
 
 # ---------- Profile ----------
-@app.get("/api/profile", response_model=Profile)
+@app.get("/api/profile", response_model=Profile, dependencies=[Depends(conditional("profile"))])
+@query_budget(2)
 def profile_get(user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
     return get_profile(db, user_id)
 
@@ -1363,6 +2069,103 @@ def profile_put(p: Profile, user_id: UUID = Depends(get_current_user_id), db = D
     out = upsert_profile(db, user_id, p)
     return out
 
+# ---------- History Import ----------
+@app.post("/api/import", response_model=ImportResponse)
+@query_budget(5)
+def import_file(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON (one object per line)"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="defaults to the file name / content type"),
+    skip_invalid: bool = Query(False, description="import the valid rows even if some are rejected"),
+    user_id: UUID = Depends(get_current_user_id),
+    db = Depends(get_db),
+):
+    """
+    Imports weigh-in and daily-metrics history. Columns / keys: date (or day), kg (or
+    weight, weight_kg) and any MetricsPayload field; a row may carry a weight, metrics,
+    or both. Imports are all-or-nothing unless `skip_invalid`.
+    """
+    fmt = format or detect_format(file.filename, file.content_type)
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=415, detail="Unknown file format; pass format=csv or format=ndjson")
+    try:
+        return import_history(db, user_id, file.file, fmt, skip_invalid)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+# ---------- Export ----------
+@app.get("/api/export")
+def export_data(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    tables: Optional[List[str]] = Query(None, description=f"any of {', '.join(EXPORT_TABLES)} (default: all); csv takes exactly one"),
+    user_id: UUID = Depends(get_current_user_id),
+):
+    """
+    Streams the user's data. The connection is held by the response body rather than
+    `get_db` (whose cleanup runs before streaming starts): the generator is primed
+    here so a busy pool still answers 503, and from then on closing it releases the
+    connection, even if the client goes away early.
+    """
+    tables = tables or list(EXPORT_TABLES)
+    unknown = [t for t in tables if t not in EXPORT_TABLES]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown tables: {', '.join(unknown)}")
+    if format == "csv" and len(tables) != 1:
+        raise HTTPException(status_code=422, detail="CSV exports one table at a time; pass a single `tables`")
+
+    def body():
+        started = time.perf_counter()
+        with db_pool.connection() as conn:
+            _acquired(started)
+            header = {"user_id": user_id, "app_version": APP_VERSION, "tables": tables,
+                      "exported_at": datetime.datetime.now(datetime.timezone.utc)}
+            yield from stream_export(conn, user_id, tables, format, header)
+
+    stream = body()
+    try:
+        first = next(stream)
+    except (PoolTimeout, PoolClosed) as e:
+        metrics.DB_ERRORS.labels(type(e).__name__).inc()
+        raise _pool_unavailable(e)
+    name = f"boostfit-{tables[0] if format == 'csv' else 'export'}-{date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        itertools.chain([first], stream),
+        media_type="text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{name}"', "Cache-Control": "no-store"},
+    )
+
+# ---------- Offline Sync ----------
+@app.post("/api/sync", response_model=SyncResponse)
+@query_budget(9)
+def sync(req: SyncRequest, user_id: UUID = Depends(get_current_user_id), db = Depends(get_db)):
+    """
+    Applies a PWA's queued writes in one transaction and returns what changed since
+    `since`. Mutations whose id was already synced are skipped, so a retried or
+    replayed queue is harmless. Keep the returned token for the next sync.
+    """
+    unique, ids = [], set()  # first use of each id, in queue order
+    for m in req.mutations:
+        if m.id not in ids:
+            ids.add(m.id)
+            unique.append(m)
+    fresh = claim_mutations(db, user_id, unique)
+    new = [m for m in unique if m.id in fresh]
+    rejected = apply_sync_writes(db, user_id, new)
+
+    today = date.today()
+    seen_day, seen = parse_sync_token(req.since)
+    versions = sync_versions(db, user_id)
+    changed = [d for d in SYNC_DOMAINS
+               if seen_day is None or versions.get(d, 0) != seen.get(d)
+               or (seen_day != today and d in SYNC_DAILY_DOMAINS)]
+    rejected_ids = {r.id for r in rejected}
+    return SyncResponse(
+        token=sync_token(today, versions),
+        applied=[m.id for m in new if m.id not in rejected_ids],
+        duplicates=[m.id for m in unique if m.id not in fresh],
+        rejected=rejected,
+        changes=load_sync_changes(db, user_id, changed),
+    )
+
 @app.get("/")
 def root():
     return {"message": "Bienvenue sur l'API de motivation (Supabase) !", "version": APP_VERSION}
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Maintenance commands for the backend database.
+
+    python manage.py rebuild-checkin-daily [--user UUID]
+    python manage.py rebuild-xp [--user UUID]
+    python manage.py compact-xp [--keep-months N]
+    python manage.py rebuild-trend [--user UUID]
+    python manage.py normalize-ingredients [--all]
+    python manage.py prune-sync [--keep-days N]
+    python manage.py snapshot-insights [--jobs N] [--plateau-method ols|theil_sen]
+    python manage.py refresh-reminders
+"""
+import argparse
+import json
+import os
+from datetime import date
+
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from db import dsn_from_env
+from insights import build_snapshots
+from plateau import METHODS as PLATEAU_METHODS
+from shopping import normalize_ingredients
+
+
+def rebuild_checkin_daily(conn, args):
+    with conn.cursor() as cur:
+        cur.execute("SELECT public.rebuild_checkin_daily(%s)", (args.user,))
+        print(f"checkin_daily: {cur.fetchone()[0]} day rows rebuilt")
+
+
+def rebuild_xp(conn, args):
+    with conn.cursor() as cur:
+        cur.execute("SELECT public.rebuild_user_xp(%s)", (args.user,))
+        print(f"user_xp: {cur.fetchone()[0]} balances rebuilt")
+
+
+def compact_xp(conn, args):
+    today = date.today()
+    months = today.year * 12 + today.month - 1 - args.keep_months
+    before = date(months // 12, months % 12 + 1, 1)
+    with conn.cursor() as cur:
+        cur.execute("SELECT public.compact_xp_events(%s)", (before,))
+        print(f"xp_events: {cur.fetchone()[0]} monthly summaries written for events before {before}")
+
+
+def rebuild_trend(conn, args):
+    with conn.cursor() as cur:
+        cur.execute("SELECT public.rebuild_weigh_in_trends(%s)", (args.user,))
+        print(f"weigh_ins: {cur.fetchone()[0]} trend values rebuilt")
+
+
+def normalize_recipe_ingredients(conn, args):
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, ingredients FROM recipes" + ("" if args.all else " WHERE ingredients_norm IS NULL"))
+        rows = [(json.dumps(normalize_ingredients(ingredients)), rid) for rid, ingredients in cur.fetchall()]
+        psycopg2.extras.execute_batch(cur, "UPDATE recipes SET ingredients_norm = %s WHERE id = %s", rows)
+    print(f"recipes: {len(rows)} ingredient vectors written")
+
+
+def prune_sync(conn, args):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM sync_mutations WHERE applied_at < now() - %s * interval '1 day'", (args.keep_days,))
+        print(f"sync_mutations: {cur.rowcount} idempotency keys older than {args.keep_days} days removed")
+
+
+def snapshot_insights(conn, args):
+    def progress(done, parts, rows):
+        print(f"  {done}/{parts} user ranges, {rows} rows", flush=True)
+    method = args.plateau_method or os.getenv("PLATEAU_METHOD", "ols")
+    n = build_snapshots(dsn_from_env(), date.today(), args.jobs, method, progress=progress if args.verbose else None)
+    print(f"user_insights_snapshot: {n} baselines written for {date.today()}")
+
+
+def refresh_reminders(conn, args):
+    with conn.cursor() as cur:
+        cur.execute("SELECT public.refresh_reminder_minutes()")
+        print(f"user_profile: {cur.fetchone()[0]} reminder buckets recomputed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("rebuild-checkin-daily", help="rebuild the per-day checkin rollup (and user_streaks) from raw checkins")
+    p.add_argument("--user", help="only rebuild this user id")
+    p.set_defaults(func=rebuild_checkin_daily)
+
+    p = sub.add_parser("rebuild-xp", help="rebuild user_xp balances from the xp_events ledger")
+    p.add_argument("--user", help="only rebuild this user id")
+    p.set_defaults(func=rebuild_xp)
+
+    p = sub.add_parser("compact-xp", help="fold old xp_events into monthly summary rows")
+    p.add_argument("--keep-months", type=int, default=3, help="full months of raw events to keep (default: 3)")
+    p.set_defaults(func=compact_xp)
+
+    p = sub.add_parser("rebuild-trend", help="recompute the stored weigh-in trend (EWMA) values")
+    p.add_argument("--user", help="only rebuild this user id")
+    p.set_defaults(func=rebuild_trend)
+
+    p = sub.add_parser("normalize-ingredients", help="precompute recipes.ingredients_norm for the shopping list")
+    p.add_argument("--all", action="store_true", help="recompute every recipe, not only missing vectors")
+    p.set_defaults(func=normalize_recipe_ingredients)
+
+    p = sub.add_parser("prune-sync", help="forget old /api/sync idempotency keys")
+    p.add_argument("--keep-days", type=int, default=30,
+                   help="days of keys to keep; older replays would be applied again (default: 30)")
+    p.set_defaults(func=prune_sync)
+
+    p = sub.add_parser("snapshot-insights", help="precompute today's insights baselines for every user (run nightly)")
+    p.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                   help="worker processes, each with its own connection (default: CPU count)")
+    p.add_argument("--verbose", action="store_true", help="report progress per user range")
+    p.add_argument("--plateau-method", choices=PLATEAU_METHODS,
+                   help="slope fit for the stored plateau flags (default: $PLATEAU_METHOD or ols)")
+    p.set_defaults(func=snapshot_insights)
+
+    p = sub.add_parser("refresh-reminders",
+                       help="recompute reminder_utc_minute (backfill; reminders.py also does it hourly for DST)")
+    p.set_defaults(func=refresh_reminders)
+
+    args = parser.parse_args(argv)
+    load_dotenv('.env.local')
+    conn = psycopg2.connect(dsn_from_env())
+    try:
+        args.func(conn, args)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
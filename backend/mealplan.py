@@ -0,0 +1,111 @@
+import heapq
+from collections import Counter
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# (meal_type, share of the day's calories)
+SLOTS: List[Tuple[str, float]] = [
+    ("breakfast", 0.20),
+    ("lunch",     0.35),
+    ("dinner",    0.35),
+    ("snack",     0.05),
+    ("snack",     0.05),
+]
+
+# cost weights, in "fraction of the daily target" units
+PROTEIN_WEIGHT = 1.0     # per fraction of the protein target missed (overshooting is free)
+SHAPE_WEIGHT = 0.25      # per fraction of the kcal target a meal strays from its slot share
+REUSE_PENALTY = 0.05     # per earlier use, among recipes reused once the catalog runs short
+PREP_WEIGHT = 0.0005     # per minute of prep, a tiebreak
+
+
+SLOTS_PER_TYPE = Counter(meal_type for meal_type, _ in SLOTS)
+
+
+def _least_used(cands: Sequence[Any], used: Mapping[int, int], need: int) -> List[Any]:
+    """The candidates used least so far in the plan: fresh ones while `need` of them remain."""
+    if not used or not cands:
+        return list(cands)
+    counts = sorted(used.get(r.id, 0) for r in cands)
+    cap = counts[min(need, len(counts)) - 1]
+    return [r for r in cands if used.get(r.id, 0) <= cap]
+
+
+def _shortlist(cands: Sequence[Any], slot_kcal: float, size: int, used: Mapping[int, int]) -> List[Any]:
+    """Candidates nearest the slot's kcal share (fresh ones first), plus the most protein-dense ones in a sane kcal band."""
+    def near_key(r):
+        return (abs(r.kcal - slot_kcal) * (1 + used.get(r.id, 0)), -r.protein_g, r.prep_min, r.id)
+    near = heapq.nsmallest(size, cands, key=near_key)
+    band = [r for r in cands if 0.5 * slot_kcal <= r.kcal <= 1.5 * slot_kcal]
+    dense = heapq.nsmallest(size // 2, band, key=lambda r: (used.get(r.id, 0), -r.protein_g / max(r.kcal, 1), r.id))
+    seen = {r.id for r in near}
+    return near + [r for r in dense if r.id not in seen]
+
+
+def plan_day(cands_by_type: Mapping[str, Sequence[Any]], kcal_target: int, protein_target: int,
+             used: Optional[Mapping[int, int]] = None, beam_width: int = 24,
+             shortlist: int = 10) -> List[Tuple[str, Any]]:
+    """
+    Picks one recipe per slot (no repeats within the day) minimizing
+    |kcal - target| + missed protein + per-slot shape, with a beam search over the
+    slots. Recipes in `used` are only considered once a meal type has too few
+    unused ones left. Slots without candidates are skipped.
+    """
+    used = used or {}
+    T = float(max(kcal_target, 1))
+    P = float(max(protein_target, 1))
+    slots = []
+    shortlists: Dict[Tuple[str, float], List[Any]] = {}  # the two snack slots share one
+    for meal_type, share in SLOTS:
+        if (meal_type, share) not in shortlists:
+            pool = _least_used(cands_by_type.get(meal_type, ()), used, SLOTS_PER_TYPE[meal_type])
+            shortlists[meal_type, share] = _shortlist(pool, share * T, shortlist, used)
+        opts = shortlists[meal_type, share]
+        if opts:
+            # per option: (recipe, kcal, protein, fixed cost: shape + reuse + prep)
+            slots.append((meal_type, share, [
+                (r, r.kcal, r.protein_g,
+                 SHAPE_WEIGHT * abs(r.kcal - share * T) / T + REUSE_PENALTY * used.get(r.id, 0) + PREP_WEIGHT * r.prep_min)
+                for r in opts]))
+    if not slots:
+        return []
+
+    # optimistic completion of a partial plan: remaining slots hit their share and their best protein
+    rest_share = [0.0] * (len(slots) + 1)
+    rest_protein = [0] * (len(slots) + 1)
+    for i in range(len(slots) - 1, -1, -1):
+        rest_share[i] = rest_share[i + 1] + slots[i][1]
+        rest_protein[i] = rest_protein[i + 1] + max(o[2] for o in slots[i][2])
+
+    # state: (score, kcal, protein, fixed cost, picks); picks = ((slot index, recipe), ...)
+    beam = [(0.0, 0, 0, 0.0, ())]
+    for i, (meal_type, share, options) in enumerate(slots):
+        # repeated meal types (the two snacks) are interchangeable: only keep picks in id order
+        same_type = [j for j in range(i) if slots[j][0] == meal_type]
+        kcal_rest = rest_share[i + 1] * T
+        protein_rest = rest_protein[i + 1]
+        grown = []
+        for _, kcal, protein, fixed, picks in beam:
+            taken = {r.id for _, r in picks}
+            floor = max((r.id for j, r in picks if j in same_type), default=None)
+            for r, rk, rp, rc in options:
+                if r.id in taken or (floor is not None and r.id <= floor):
+                    continue
+                k, pr, f = kcal + rk, protein + rp, fixed + rc
+                sc = abs(k + kcal_rest - T) / T + PROTEIN_WEIGHT * max(0.0, P - pr - protein_rest) / P + f
+                grown.append((sc, k, pr, f, picks + ((i, r),)))
+        if grown:
+            beam = heapq.nsmallest(beam_width, grown, key=lambda st: (st[0], [r.id for _, r in st[4]]))
+    return [(slots[i][0], r) for i, r in beam[0][4]]
+
+
+def plan_days(cands_by_type: Mapping[str, Sequence[Any]], kcal_target: int, protein_target: int,
+              days: int = 1, **kw) -> List[List[Tuple[str, Any]]]:
+    """Plans `days` consecutive days; a recipe repeats only once its meal type has no unused one left."""
+    used: Dict[int, int] = {}
+    out = []
+    for _ in range(days):
+        picks = plan_day(cands_by_type, kcal_target, protein_target, used=used, **kw)
+        for _, r in picks:
+            used[r.id] = used.get(r.id, 0) + 1
+        out.append(picks)
+    return out
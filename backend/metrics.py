@@ -0,0 +1,108 @@
+"""
+Prometheus metrics. Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set by gunicorn.conf.py
+or the Dockerfile) makes every worker write its samples to mmap files that /metrics
+aggregates; without it (plain uvicorn) the default in-process registry is used.
+Nothing here touches the database.
+"""
+import os
+import time
+from typing import Callable, Optional
+
+import anyio.to_thread
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency until the response body is sent",
+    ["method", "route", "status"])
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being handled", multiprocess_mode="livesum")
+
+POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Pooled connections by state, per worker", ["state"], multiprocess_mode="liveall")
+POOL_WAITERS = Gauge(
+    "db_pool_waiters", "Callers queued for a connection, per worker", multiprocess_mode="liveall")
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection",
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+DB_ERRORS = Counter(
+    "db_errors_total", "Database and pool errors raised out of request handlers", ["error"])
+
+THREADPOOL_BUSY = Gauge(
+    "threadpool_busy_threads", "Sync handlers/dependencies running on the threadpool, per worker",
+    multiprocess_mode="liveall")
+THREADPOOL_SIZE = Gauge(
+    "threadpool_max_threads", "Threadpool size, per worker", multiprocess_mode="liveall")
+THREADPOOL_QUEUED = Gauge(
+    "threadpool_queued_tasks", "Calls waiting for a free threadpool thread, per worker",
+    multiprocess_mode="liveall")
+
+JWT_VERIFY = Histogram(
+    "jwt_verify_seconds", "Bearer token signature verification (token cache misses only)", ["outcome"],
+    buckets=(.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025))
+
+_pool_usage: Optional[Callable] = None
+
+
+def watch_pool(usage: Callable):
+    """Registers a `ConnectionPool.usage`-like callable sampled into the pool gauges."""
+    global _pool_usage
+    _pool_usage = usage
+
+
+def sample_worker():
+    """Refreshes this worker's pool and threadpool gauges. Must run on the event loop."""
+    if _pool_usage is not None:
+        checked_out, idle, waiting = _pool_usage()
+        POOL_CONNECTIONS.labels("checked_out").set(checked_out)
+        POOL_CONNECTIONS.labels("idle").set(idle)
+        POOL_WAITERS.set(waiting)
+    limiter = anyio.to_thread.current_default_thread_limiter().statistics()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+    THREADPOOL_QUEUED.set(limiter.tasks_waiting)
+
+
+def render() -> bytes:
+    """Exposition text for all workers (multiprocess) or this process."""
+    sample_worker()
+    if not MULTIPROCESS:
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI: latency per matched route template (unmatched paths share one label
+    so scanners can't blow up cardinality), in-flight count, and a refresh of the
+    per-worker gauges after each request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(scope["method"], getattr(route, "path", "<unmatched>"),
+                                   str(status)).observe(time.perf_counter() - started)
+            sample_worker()
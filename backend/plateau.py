@@ -0,0 +1,130 @@
+"""
+Weight-plateau detection over the most recent weigh-ins, for one user or thousands
+at once. Series are packed into a padded (users x points) float64 grid with a
+validity mask, and the slope of every row is fitted in a single numpy pass.
+
+x is the weigh-in date in days, so gaps between weigh-ins count as time and the
+slope is in kg per day whatever the weigh-in frequency. Two fits are offered:
+
+- "ols": least squares, the original fit.
+- "theil_sen": median of the pairwise slopes. One outlier weigh-in (water, a
+  holiday) can't tilt it, so it neither hides nor fakes a plateau.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Hashable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+METHODS = ("ols", "theil_sen")
+PLATEAU_SLOPE = 0.02   # |kg per day| below which the weight counts as flat
+MIN_POINTS = 5
+
+Series = Tuple[Sequence[Union[date, str]], Sequence[float]]  # (dates, kg), oldest first
+
+
+def _day(d: Union[date, str]) -> int:
+    return (d if isinstance(d, date) else date.fromisoformat(d)).toordinal()
+
+
+def pack(series: Sequence[Series]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (x, y, mask) grids for many series: x in days since each series' first date
+    (dates may be date objects or ISO strings), left-aligned, padding masked out.
+    """
+    lengths = np.fromiter((len(ws) for _, ws in series), dtype=np.int64, count=len(series))
+    if any(len(ds) != n for (ds, _), n in zip(series, lengths.tolist())):
+        raise ValueError("each series needs one date per weight")
+    mask = np.arange(lengths.max(initial=0)) < lengths[:, None]
+    # one conversion for all points; grid[mask] fills row by row, in series order
+    total = int(lengths.sum())
+    days = np.fromiter((_day(d) for ds, _ in series for d in ds), dtype=np.int64, count=total)
+    has = lengths > 0
+    first = np.zeros(len(series), dtype=np.int64)
+    first[has] = days[(np.cumsum(lengths) - lengths)[has]]
+    x = np.zeros(mask.shape, dtype=np.float64)
+    y = np.zeros(mask.shape, dtype=np.float64)
+    x[mask] = days - np.repeat(first, lengths)
+    y[mask] = np.fromiter((w for _, ws in series for w in ws), dtype=np.float64, count=total)
+    return x, y, mask
+
+
+def ols_slopes(x: np.ndarray, y: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Least-squares slope of each row over its masked points (0 when x doesn't vary)."""
+    n = np.maximum(mask.sum(axis=1), 1)
+    xbar = np.where(mask, x, 0.0).sum(axis=1) / n
+    ybar = np.where(mask, y, 0.0).sum(axis=1) / n
+    dx = np.where(mask, x - xbar[:, None], 0.0)
+    dy = np.where(mask, y - ybar[:, None], 0.0)
+    denom = (dx * dx).sum(axis=1)
+    return (dx * dy).sum(axis=1) / np.where(denom == 0.0, 1.0, denom)
+
+
+def theil_sen_slopes(x: np.ndarray, y: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Median of the pairwise slopes of each row (NaN for rows with no usable pair)."""
+    i, j = np.triu_indices(x.shape[1], k=1)
+    dx = x[:, j] - x[:, i]
+    ok = mask[:, i] & mask[:, j] & (dx != 0)
+    pair = np.full(dx.shape, np.inf)
+    np.divide(y[:, j] - y[:, i], dx, out=pair, where=ok)
+    k = ok.sum(axis=1)
+    if not k.any():
+        return np.full(x.shape[0], np.nan)
+    pair.sort(axis=1)  # unusable pairs (inf) sort last
+    rows = np.arange(x.shape[0])
+    mid = (pair[rows, np.maximum(k - 1, 0) // 2] + pair[rows, np.minimum(k // 2, pair.shape[1] - 1)]) / 2
+    return np.where(k > 0, mid, np.nan)
+
+
+def slopes(series: Sequence[Series], method: str = "ols") -> np.ndarray:
+    """kg per day for each series."""
+    if method not in METHODS:
+        raise ValueError(f"unknown plateau method {method!r} (expected one of {', '.join(METHODS)})")
+    x, y, mask = pack(series)
+    fit = theil_sen_slopes if method == "theil_sen" else ols_slopes
+    return fit(x, y, mask)
+
+
+def plateau_flags(series: Sequence[Series], method: str = "ols") -> np.ndarray:
+    """One bool per series: at least MIN_POINTS weigh-ins and |slope| < PLATEAU_SLOPE."""
+    if not series:
+        return np.zeros(0, dtype=bool)
+    enough = np.fromiter((len(ws) >= MIN_POINTS for _, ws in series), dtype=bool, count=len(series))
+    with np.errstate(invalid="ignore"):
+        return enough & (np.abs(slopes(series, method)) < PLATEAU_SLOPE)
+
+
+def is_plateau(dates: Sequence[Union[date, str]], weights: Sequence[float], method: str = "ols") -> bool:
+    return bool(plateau_flags([(dates, weights)], method)[0])
+
+
+class PlateauMemo:
+    """
+    Last plateau result per user, kept while `key` (the user's weigh-in data version
+    and the day) stays the same; LRU-bounded to `maxsize` users.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[Hashable, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user: Hashable, key: Hashable) -> Optional[bool]:
+        with self._lock:
+            entry = self._data.get(user)
+            if entry is None or entry[0] != key:
+                self.misses += 1
+                return None
+            self._data.move_to_end(user)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user: Hashable, key: Hashable, value: bool):
+        with self._lock:
+            self._data[user] = (key, value)
+            self._data.move_to_end(user)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
@@ -0,0 +1,143 @@
+import time
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import psycopg2.extras
+
+RECIPE_COLUMNS = "id, name, kcal, protein_g, carbs_g, fat_g, prep_min, tags, diet, ingredients, steps"
+
+
+class _Index:
+    """Immutable snapshot: recipes grouped by (diet, tag), each group sorted by kcal."""
+
+    def __init__(self, recipes: Sequence[Any], vectors: Optional[Dict[int, Any]] = None,
+                 encoded: Optional[Dict[int, bytes]] = None):
+        self.by_id: Dict[int, Any] = {r.id: r for r in recipes}
+        self.vectors: Dict[int, Any] = vectors or {}
+        self.encoded: Dict[int, bytes] = encoded or {}
+        groups: Dict[Tuple[Optional[str], Optional[str]], List[Any]] = {}
+        for r in recipes:
+            for diet in (None, r.diet):
+                groups.setdefault((diet, None), []).append(r)
+                for tag in set(r.tags):
+                    groups.setdefault((diet, tag), []).append(r)
+        self.groups: Dict[Tuple[Optional[str], Optional[str]], Tuple[List[int], List[Any]]] = {}
+        for key, items in groups.items():
+            items.sort(key=lambda r: (r.kcal, r.id))
+            self.groups[key] = ([r.kcal for r in items], items)
+
+
+class RecipeCatalog:
+    """
+    In-process copy of the global recipes (user_id IS NULL), indexed by diet and tag
+    with kcal-sorted arrays for range lookups.
+
+    Parsed once per load; `refresh_if_stale` re-reads recipe_catalog_version at most
+    every `ttl` seconds and reloads when a global recipe changed. User-owned recipes
+    are not cached: callers fetch them with `owned_by` and pass them as `extra`.
+    `vectorize` and `encode`, if given, precompute per-recipe values from the raw row
+    at load time: the normalized ingredient vector (see shopping.py) and the JSON
+    encoding served by list endpoints (see fastjson.py).
+    """
+
+    def __init__(self, make: Callable[[Dict], Any], ttl: float = 30.0,
+                 vectorize: Optional[Callable[[Dict], Any]] = None,
+                 encode: Optional[Callable[[Dict], bytes]] = None):
+        self.make = make
+        self.vectorize = vectorize
+        self.encode = encode
+        self.ttl = ttl
+        self.version: Optional[int] = None
+        self._index = _Index([])
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    # ---------- loading ----------
+    def load(self, db):
+        with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT version FROM recipe_catalog_version")
+            row = cur.fetchone()
+            version = row["version"] if row else 0
+            cur.execute(f"SELECT {RECIPE_COLUMNS}, ingredients_norm FROM recipes WHERE user_id IS NULL")
+            rows = cur.fetchall()
+        recipes = [self.make(r) for r in rows]
+        vectors = {r["id"]: self.vectorize(r) for r in rows} if self.vectorize else None
+        encoded = {r["id"]: self.encode(r) for r in rows} if self.encode else None
+        index = _Index(recipes, vectors, encoded)
+        with self._lock:
+            self._index = index
+            self.version = version
+            self._checked_at = time.monotonic()
+            self.loads += 1
+
+    def due(self) -> bool:
+        """True when the next request should re-read recipe_catalog_version."""
+        return self.version is None or time.monotonic() - self._checked_at >= self.ttl
+
+    def refresh_to(self, db, version: int):
+        """Reloads (two statements) if `version`, freshly read by the caller, differs from the loaded one."""
+        if self.version is None or version != self.version:
+            self.load(db)
+        else:
+            self._checked_at = time.monotonic()
+
+    def refresh_if_stale(self, db):
+        if not self.due():
+            return
+        with db.cursor() as cur:
+            cur.execute("SELECT version FROM recipe_catalog_version")
+            row = cur.fetchone()
+        self.refresh_to(db, row[0] if row else 0)
+
+    def owned_by(self, db, user_id) -> List[Any]:
+        """
+        The user's own recipes. When the catalog is due for a version check, the same
+        statement reads recipe_catalog_version and the catalog is refreshed from it.
+        """
+        if not self.due():
+            with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(f"SELECT {RECIPE_COLUMNS} FROM recipes WHERE user_id = %s", (user_id,))
+                return [self.make(r) for r in cur.fetchall()]
+        with db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT v.version AS catalog_version, r.*
+                FROM (SELECT COALESCE((SELECT version FROM recipe_catalog_version), 0) AS version) v
+                LEFT JOIN LATERAL (SELECT {RECIPE_COLUMNS} FROM recipes WHERE user_id = %s) r ON true""", (user_id,))
+            rows = cur.fetchall()
+        self.refresh_to(db, rows[0]["catalog_version"])
+        return [self.make({k: v for k, v in r.items() if k != "catalog_version"}) for r in rows if r["id"] is not None]
+
+    # ---------- lookups ----------
+    def get(self, recipe_id: int):
+        return self._index.by_id.get(recipe_id)
+
+    def vector(self, recipe_id: int):
+        return self._index.vectors.get(recipe_id)
+
+    def encoded(self, recipe) -> Optional[bytes]:
+        """Pre-encoded JSON for a recipe object handed out by this catalog, else None."""
+        index = self._index
+        return index.encoded.get(recipe.id) if index.by_id.get(recipe.id) is recipe else None
+
+    def __len__(self) -> int:
+        return len(self._index.by_id)
+
+    def candidates(self, diet: Optional[str] = None, tag: Optional[str] = None,
+                   kcal_min: Optional[int] = None, kcal_max: Optional[int] = None,
+                   extra: Iterable[Any] = ()) -> List[Any]:
+        """Recipes matching diet/tag with kcal_min <= kcal <= kcal_max, plus matching `extra` ones."""
+        kcals, items = self._index.groups.get((diet or None, tag or None), ((), ()))
+        lo = 0 if kcal_min is None else bisect_left(kcals, kcal_min)
+        hi = len(kcals) if kcal_max is None else bisect_right(kcals, kcal_max)
+        out = list(items[lo:hi])
+        for r in extra:
+            if ((not diet or r.diet == diet) and (not tag or tag in r.tags)
+                    and (kcal_min is None or r.kcal >= kcal_min)
+                    and (kcal_max is None or r.kcal <= kcal_max)):
+                out.append(r)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {"recipes": len(self), "version": self.version, "loads": self.loads}
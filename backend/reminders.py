@@ -0,0 +1,263 @@
+"""
+Reminder dispatcher: sends each user's daily nudge at user_profile.reminder_time in
+their timezone, unless today's habits are already done.
+
+    python reminders.py [--notifier file:/tmp/reminders.ndjson | http://host/hook] [--once]
+
+Profiles are bucketed by the UTC minute their reminder falls on (reminder_utc_minute,
+maintained in SQL), so each tick reads only the users due that minute, in keyset
+chunks of BATCH. Each chunk is claimed in reminder_sends before it is queued; the
+queue is bounded, so a slow notifier holds back claiming instead of piling up
+batches in memory. Minutes missed while the dispatcher was down or behind are
+caught up (at most CATCHUP_MINUTES), and claims make that replay-safe.
+"""
+import argparse
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from uuid import UUID
+
+import psycopg2
+import psycopg2.extras
+import requests
+from dotenv import load_dotenv
+
+import fastjson
+from db import dsn_from_env
+
+log = logging.getLogger("boostfit.reminders")
+
+BATCH = 500               # users claimed and sent per notifier call
+QUEUE_BATCHES = 8         # claimed batches waiting for a sender
+SENDERS = 4
+SEND_ATTEMPTS = 3
+CATCHUP_MINUTES = 15
+DAILY_COMPLETE_AT = 3     # same as main.DAILY_COMPLETE_AT: a plan's worth of habits
+
+# Next BATCH candidates of one bucket after `after`, each with a flag telling whether
+# it was claimed for sending. Candidates that already got today's reminder, or have
+# done min(DAILY_COMPLETE_AT, their habit count) habits today, are returned unclaimed.
+DUE_SQL = """
+    WITH cand AS (
+        SELECT p.user_id, p.timezone, to_char(p.reminder_time, 'HH24:MI') AS reminder_time,
+               (%(at)s::timestamptz AT TIME ZONE COALESCE(p.timezone, 'Europe/Paris'))::date AS local_day
+        FROM user_profile p
+        WHERE p.reminder_utc_minute = %(minute)s AND p.user_id > %(after)s
+        ORDER BY p.user_id
+        LIMIT %(batch)s
+    ),
+    progress AS (
+        SELECT c.*, COALESCE(cd.done_count, 0) AS done,
+               (SELECT COUNT(*) FROM habits h WHERE h.user_id = c.user_id) AS habits
+        FROM cand c
+        LEFT JOIN checkin_daily cd ON cd.user_id = c.user_id AND cd.c_date = c.local_day
+    ),
+    claimed AS (
+        INSERT INTO reminder_sends (user_id, sent_on)
+        SELECT user_id, local_day FROM progress
+        WHERE habits = 0 OR done < LEAST(%(complete_at)s, habits)
+        ON CONFLICT (user_id) DO UPDATE SET sent_on = EXCLUDED.sent_on
+        WHERE reminder_sends.sent_on < EXCLUDED.sent_on
+        RETURNING user_id
+    )
+    SELECT p.user_id, p.timezone, p.reminder_time, p.local_day, p.done, p.habits,
+           cl.user_id IS NOT NULL AS claimed
+    FROM progress p LEFT JOIN claimed cl ON cl.user_id = p.user_id
+    ORDER BY p.user_id
+"""
+
+
+# ---------- notifiers ----------
+class FileNotifier:
+    """Appends one JSON line per reminder; for local runs and tests."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, batch: List[Dict]):
+        data = b"".join(fastjson.dumps(r) + b"\n" for r in batch)
+        with self._lock, open(self.path, "ab") as f:
+            f.write(data)
+
+
+class HttpNotifier:
+    """POSTs {"reminders": [...]} to a webhook (push service, or a stub sink locally)."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()  # requests.Session isn't thread-safe
+
+    def send(self, batch: List[Dict]):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        r = session.post(self.url, data=fastjson.dumps({"reminders": batch}),
+                         headers={"Content-Type": "application/json"}, timeout=self.timeout)
+        r.raise_for_status()
+
+
+def notifier_from_url(url: str):
+    if url.startswith(("http://", "https://")):
+        return HttpNotifier(url)
+    if url.startswith("file:"):
+        return FileNotifier(url[len("file:"):])
+    raise ValueError(f"unsupported notifier {url!r} (expected file:PATH or an http(s) URL)")
+
+
+# ---------- dispatcher ----------
+def minute_of_day(at: datetime) -> int:
+    return at.hour * 60 + at.minute
+
+
+class Dispatcher:
+    def __init__(self, dsn: str, notifier, batch: int = BATCH, senders: int = SENDERS,
+                 queue_batches: int = QUEUE_BATCHES):
+        self.dsn = dsn
+        self.notifier = notifier
+        self.batch = batch
+        self.queue: "queue.Queue[Optional[List[Dict]]]" = queue.Queue(maxsize=queue_batches)
+        self.stopping = threading.Event()
+        self.sent = 0
+        self.failed = 0
+        self._conn = None
+        self._refreshed_hour: Optional[datetime] = None
+        self._senders = [threading.Thread(target=self._sender, name=f"reminder-sender-{i}", daemon=True)
+                         for i in range(senders)]
+
+    # ----- database -----
+    def _cursor(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(self.dsn)
+            psycopg2.extras.register_uuid(conn_or_curs=self._conn)
+        return self._conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    def _refresh_buckets(self, at: datetime):
+        """Re-buckets profiles once per UTC hour, before its first minute, so DST changes apply."""
+        hour = at.replace(minute=0)
+        if self._refreshed_hour == hour:
+            return
+        with self._cursor() as cur:
+            cur.execute("SELECT public.refresh_reminder_minutes() AS n")
+            moved = cur.fetchone()["n"]
+        self._conn.commit()
+        self._refreshed_hour = hour
+        if moved:
+            log.info("re-bucketed %d reminders", moved)
+
+    def dispatch_minute(self, at: datetime) -> int:
+        """Claims and queues every reminder due at UTC minute `at`; returns how many were queued."""
+        self._refresh_buckets(at)
+        after, queued = UUID(int=0), 0
+        while not self.stopping.is_set():
+            with self._cursor() as cur:
+                cur.execute(DUE_SQL, {"at": at, "minute": minute_of_day(at), "after": after,
+                                      "batch": self.batch, "complete_at": DAILY_COMPLETE_AT})
+                rows = cur.fetchall()
+            self._conn.commit()
+            if not rows:
+                break
+            after = rows[-1]["user_id"]
+            due = [{"user_id": r["user_id"], "date": r["local_day"], "time": r["reminder_time"],
+                    "timezone": r["timezone"], "done": r["done"], "habits": r["habits"]}
+                   for r in rows if r["claimed"]]
+            if due:
+                self.queue.put(due)  # blocks while senders are behind
+                queued += len(due)
+            if len(rows) < self.batch:
+                break
+        return queued
+
+    # ----- sending -----
+    def _sender(self):
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is None:
+                    return
+                self._send(batch)
+            finally:
+                self.queue.task_done()
+
+    def _send(self, batch: List[Dict]):
+        for attempt in range(1, SEND_ATTEMPTS + 1):
+            try:
+                self.notifier.send(batch)
+                self.sent += len(batch)
+                return
+            except Exception as e:
+                if attempt == SEND_ATTEMPTS:
+                    # already claimed: these users get no reminder today (at most once)
+                    self.failed += len(batch)
+                    log.error("dropping %d reminders after %d attempts: %s", len(batch), attempt, e)
+                    return
+                log.warning("notifier failed (attempt %d): %s", attempt, e)
+                time.sleep(2 ** (attempt - 1))
+
+    # ----- loop -----
+    def start(self):
+        for t in self._senders:
+            t.start()
+
+    def stop(self):
+        """Lets queued batches go out, then stops the senders."""
+        self.stopping.set()
+        for _ in self._senders:
+            self.queue.put(None)
+        for t in self._senders:
+            t.join()
+        if self._conn is not None:
+            self._conn.close()
+
+    def run(self, once: bool = False):
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        cursor = now - timedelta(minutes=0 if once else CATCHUP_MINUTES)
+        while not self.stopping.is_set():
+            now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+            cursor = max(cursor, now - timedelta(minutes=CATCHUP_MINUTES))
+            while cursor <= now and not self.stopping.is_set():
+                try:
+                    n = self.dispatch_minute(cursor)
+                except psycopg2.Error as e:
+                    log.error("minute %s failed, retrying: %s", cursor.strftime("%H:%M"), e)
+                    if self._conn is not None:
+                        self._conn.close()
+                    self.stopping.wait(5)
+                    continue
+                if n:
+                    log.info("%s UTC: %d reminders queued", cursor.strftime("%H:%M"), n)
+                cursor += timedelta(minutes=1)
+            if once:
+                return
+            self.stopping.wait(max(0.0, (cursor - datetime.now(timezone.utc)).total_seconds()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notifier", default=os.getenv("REMINDER_NOTIFIER", "file:reminders.ndjson"),
+                        help="file:PATH or http(s) URL (default: $REMINDER_NOTIFIER or file:reminders.ndjson)")
+    parser.add_argument("--once", action="store_true", help="dispatch the current minute and exit")
+    args = parser.parse_args(argv)
+
+    load_dotenv('.env.local')
+    logging.basicConfig(level=os.getenv("REMINDER_LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+    dispatcher = Dispatcher(dsn_from_env(), notifier_from_url(args.notifier))
+    signal.signal(signal.SIGTERM, lambda *_: dispatcher.stopping.set())
+    dispatcher.start()
+    try:
+        dispatcher.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dispatcher.stop()
+    log.info("stopped: %d sent, %d dropped", dispatcher.sent, dispatcher.failed)
+
+
+if __name__ == "__main__":
+    main()
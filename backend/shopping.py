@@ -0,0 +1,110 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+# unit spelling -> (base unit, factor to base)
+UNITS: Dict[str, Tuple[str, float]] = {
+    "g": ("g", 1.0), "gr": ("g", 1.0), "gramme": ("g", 1.0), "grammes": ("g", 1.0),
+    "kg": ("g", 1000.0), "kilo": ("g", 1000.0), "kilos": ("g", 1000.0),
+    "mg": ("g", 0.001),
+    "ml": ("ml", 1.0), "cl": ("ml", 10.0), "dl": ("ml", 100.0),
+    "l": ("ml", 1000.0), "litre": ("ml", 1000.0), "litres": ("ml", 1000.0),
+    "c. à soupe": ("ml", 15.0), "c.à.s": ("ml", 15.0), "cas": ("ml", 15.0), "càs": ("ml", 15.0), "tbsp": ("ml", 15.0),
+    "c. à café": ("ml", 5.0), "c.à.c": ("ml", 5.0), "cac": ("ml", 5.0), "càc": ("ml", 5.0), "tsp": ("ml", 5.0),
+    "tasse": ("ml", 240.0), "tasses": ("ml", 240.0), "cup": ("ml", 240.0),
+    "": ("pièce", 1.0), "pièce": ("pièce", 1.0), "pièces": ("pièce", 1.0), "piece": ("pièce", 1.0),
+    "pc": ("pièce", 1.0), "pcs": ("pièce", 1.0), "unité": ("pièce", 1.0), "unités": ("pièce", 1.0),
+}
+
+# canonical spelling for names that show up in several forms
+ALIASES: Dict[str, str] = {
+    "oeuf": "œufs", "oeufs": "œufs", "œuf": "œufs",
+    "salade verte": "salade",
+    "huile olive": "huile d'olive",
+    "flocon d'avoine": "flocons d'avoine",
+    "tomate": "tomates",
+}
+
+_SPACES = re.compile(r"\s+")
+
+# one normalized ingredient line: (canonical name, base unit, quantity in base unit)
+Vector = Tuple[Tuple[str, str, float], ...]
+
+
+def canonical_name(name: str) -> str:
+    n = unicodedata.normalize("NFC", str(name)).replace("’", "'").strip().lower()
+    n = _SPACES.sub(" ", n)
+    return ALIASES.get(n, n)
+
+
+def to_base(qty, unit: Optional[str]) -> Tuple[str, float]:
+    """Returns (base unit, quantity in it). Unknown units are kept as-is."""
+    u = _SPACES.sub(" ", unicodedata.normalize("NFC", str(unit or "")).strip().lower())
+    base, factor = UNITS.get(u, (u, 1.0))
+    try:
+        q = float(qty or 0)
+    except (TypeError, ValueError):
+        q = 0.0
+    return base, q * factor
+
+
+def normalize_ingredients(ingredients: Iterable[Dict]) -> Vector:
+    """Per-recipe ingredient vector: canonical names, base units, merged and sorted."""
+    acc: Dict[Tuple[str, str], float] = {}
+    for ing in ingredients or ():
+        unit, q = to_base(ing.get("qty", 0), ing.get("unit", ""))
+        key = (canonical_name(ing.get("name", "")), unit)
+        acc[key] = acc.get(key, 0.0) + q
+    return tuple((n, u, q) for (n, u), q in sorted(acc.items()))
+
+
+def vector_from_json(stored: Optional[Sequence], ingredients: Iterable[Dict]) -> Vector:
+    """Uses the stored `ingredients_norm` when present, otherwise normalizes on the fly."""
+    if stored is not None:
+        return tuple((n, u, float(q)) for n, u, q in stored)
+    return normalize_ingredients(ingredients)
+
+
+def _sort_key(name: str) -> str:
+    # accent-insensitive so "œufs" and "épinards" sort with the o's and e's
+    folded = unicodedata.normalize("NFKD", name.replace("œ", "oe").replace("æ", "ae"))
+    return "".join(c for c in folded if not unicodedata.combining(c))
+
+
+def sum_vectors(weighted: Iterable[Tuple[Vector, int]]) -> List[Tuple[str, str, float]]:
+    """Adds up recipe vectors (each times its multiplicity); sorted by name, then unit."""
+    acc: Dict[Tuple[str, str], float] = {}
+    for vec, times in weighted:
+        for n, u, q in vec:
+            acc[(n, u)] = acc.get((n, u), 0.0) + q * times
+    return [(n, u, q) for (n, u), q in sorted(acc.items(), key=lambda kv: (_sort_key(kv[0][0]), kv[0]))]
+
+
+class BasketCache:
+    """Small LRU of aggregated shopping lists keyed by (catalog version, recipe-id multiset)."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
@@ -0,0 +1,126 @@
+"""
+Shared fixtures: main.app with strict query budgets, served from a FakeConnection
+instead of Postgres. Endpoints run their real code; the fake only answers statements.
+"""
+import os
+import sys
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.environ["QUERY_BUDGET_STRICT"] = "1"
+os.environ["REQUEST_LOG"] = "0"
+
+import instrumentation  # noqa: E402
+
+USER = UUID("00000000-0000-4000-8000-000000000001")
+
+# (substring of the statement, rows as dicts); the first match answers
+Rules = Sequence[Tuple[str, Callable[[], List[Dict]]]]
+
+
+class FakeCursor:
+    """Counts each statement into the current request's RequestStats, like the pool's cursors."""
+
+    def __init__(self, conn: "FakeConnection", dict_rows: bool):
+        self.conn = self.connection = conn
+        self.dict_rows = dict_rows
+        self.rows: List[Dict] = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def mogrify(self, template, args=None) -> bytes:
+        return b"(" + b",".join(repr(a).encode() for a in (args or ())) + b")"
+
+    def execute(self, sql, params=None):
+        if isinstance(sql, bytes):
+            sql = sql.decode()
+        stats = instrumentation.current()
+        if stats is not None:
+            stats.statement(sql, 0.0)
+        self.conn.statements.append(sql)
+        self.rows = self.conn.answer(sql)
+        self.rowcount = len(self.rows)
+
+    def _row(self, r: Dict):
+        return dict(r) if self.dict_rows else tuple(r.values())
+
+    def fetchone(self):
+        return self._row(self.rows[0]) if self.rows else None
+
+    def fetchall(self):
+        return [self._row(r) for r in self.rows]
+
+    def fetchmany(self, size=None):
+        out, self.rows = self.rows[:size], self.rows[size:]
+        return [self._row(r) for r in out]
+
+
+class FakeConnection:
+    encoding = "UTF8"  # read by psycopg2.extras.execute_values
+
+    def __init__(self, rules: Rules):
+        self.rules = rules
+        self.statements: List[str] = []
+
+    def answer(self, sql: str) -> List[Dict]:
+        for needle, rows in self.rules:
+            if needle in sql:
+                return rows()
+        return []
+
+    def cursor(self, name: Optional[str] = None, cursor_factory=None):
+        return FakeCursor(self, dict_rows=cursor_factory is not None)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def app():
+    import main
+    yield main.app
+    main.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def serve(app):
+    """serve(conn) -> TestClient whose requests run as USER on `conn` (no startup, no pool)."""
+    from fastapi.testclient import TestClient
+    import main
+
+    def make(conn: FakeConnection) -> TestClient:
+        app.dependency_overrides[main.get_db] = lambda: conn
+        app.dependency_overrides[main.get_current_user_id] = lambda: USER
+        return TestClient(app)
+    return make
+
+
+@pytest.fixture
+def catalog():
+    """main.recipe_catalog, unloaded; its ttl is restored afterwards."""
+    import main
+    saved = main.recipe_catalog.ttl
+    main.recipe_catalog.version = None
+    yield main.recipe_catalog
+    main.recipe_catalog.ttl = saved
+
+
+def queries(response) -> int:
+    """Statement count from the Server-Timing header set by QueryStatsMiddleware."""
+    timing = response.headers["server-timing"]
+    return int(timing.split('db;desc="', 1)[1].split(" ", 1)[0])
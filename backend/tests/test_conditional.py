@@ -0,0 +1,65 @@
+"""Conditional GETs: ETags from data_versions, 304 while the version holds."""
+import pytest
+
+from conftest import FakeConnection, queries
+from main import etag_matches, make_etag
+
+
+def test_etag_matching():
+    etag = make_etag("u", "weighins", 3, "/api/weighins", "")
+    bare = etag[2:]
+    assert etag.startswith('W/"')
+    assert etag_matches(etag, etag) and etag_matches(bare, etag)
+    assert etag_matches(f'W/"other", {etag}', etag) and etag_matches("*", etag)
+    assert not etag_matches(None, etag) and not etag_matches('W/"other"', etag)
+    assert make_etag("u", "weighins", 4, "/api/weighins", "") != etag
+
+
+@pytest.fixture
+def weighins_db():
+    """A FakeConnection whose weigh-in insert bumps the domain version, like the trigger does."""
+    state = {"version": 3, "rows": [{"date": "2026-01-05", "kg": 80.0}]}
+
+    def insert():
+        state["version"] += 1
+        state["rows"].append({"date": "2026-01-06", "kg": 79.6})
+        return [{"trend": 79.9}]
+
+    conn = FakeConnection([
+        ("SELECT version FROM data_versions", lambda: [{"version": state["version"]}]),
+        ("INSERT INTO weigh_ins", insert),
+        ("FROM weigh_ins", lambda: list(state["rows"])),
+    ])
+    return conn, state
+
+
+def test_matching_if_none_match_is_304_until_a_write(serve, weighins_db):
+    conn, state = weighins_db
+    client = serve(conn)
+
+    first = client.get("/api/weighins")
+    assert first.status_code == 200 and len(first.json()) == 1
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    again = client.get("/api/weighins", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+    assert queries(again) == 1  # the version lookup only
+
+    assert client.post("/api/weighins", json={"date": "2026-01-06", "kg": 79.6}).status_code == 200
+    assert state["version"] == 4
+
+    after = client.get("/api/weighins", headers={"If-None-Match": etag})
+    assert after.status_code == 200 and len(after.json()) == 2
+    assert after.headers["etag"] != etag
+    assert client.get("/api/weighins", headers={"If-None-Match": after.headers["etag"]}).status_code == 304
+
+
+def test_etag_depends_on_the_query_string(serve, weighins_db):
+    conn, _ = weighins_db
+    client = serve(conn)
+    a = client.get("/api/weighins").headers["etag"]
+    b = client.get("/api/weighins?page=2").headers["etag"]
+    assert a != b
+    assert client.get("/api/weighins?page=2", headers={"If-None-Match": a}).status_code == 200
@@ -0,0 +1,74 @@
+"""The numpy EWMA must give the same rounded trend as the original Decimal loop."""
+import random
+from decimal import Decimal
+
+import pytest
+
+from utils import ewma, ewma_batch, ewma_warmup
+
+ALPHAS = [0.05, 0.1, 0.25, 0.3, 0.5, 0.9, 1.0]
+LENGTHS = [1, 2, 7, 90, 1500]  # 1500 spans more than one closed-form block
+
+
+def decimal_ewma(points, alpha=0.3, seed=None):
+    """The original utils.ewma, plus a starting trend."""
+    trend = None if seed is None else Decimal(str(seed))
+    out = []
+    alpha = Decimal(str(alpha))
+    for d, w in points:
+        w = Decimal(str(w))
+        trend = w if trend is None else alpha * w + (1 - alpha) * trend
+        out.append((d, w, round(trend, 2)))
+    return out
+
+
+def series(n, rng):
+    kg = rng.uniform(55, 130)
+    points = []
+    for i in range(n):
+        kg = min(max(kg + rng.uniform(-0.8, 0.8), 40), 250)
+        points.append((f"day{i}", round(kg, rng.choice((1, 2)))))
+    return points
+
+
+def expected(points, alpha, seed=None):
+    return [(d, float(w), float(t)) for d, w, t in decimal_ewma(points, alpha, seed)]
+
+
+@pytest.mark.parametrize("alpha", ALPHAS)
+@pytest.mark.parametrize("n", LENGTHS)
+def test_matches_decimal_loop(alpha, n):
+    rng = random.Random(n * 1000 + int(alpha * 100))
+    for _ in range(20 if n < 1000 else 3):
+        points = series(n, rng)
+        assert ewma(points, alpha) == expected(points, alpha)
+
+
+@pytest.mark.parametrize("alpha", ALPHAS)
+def test_seed_continues_the_series(alpha):
+    rng = random.Random(7)
+    for _ in range(20):
+        points = series(60, rng)
+        seed = rng.choice([None, round(rng.uniform(60, 120), 2)])
+        assert ewma(points, alpha, seed) == expected(points, alpha, seed)
+
+
+@pytest.mark.parametrize("alpha", [0.1, 0.3, 0.5])
+def test_warmup_window_matches_full_history(alpha):
+    rng = random.Random(11)
+    warm = ewma_warmup(alpha)
+    for _ in range(10):
+        points = series(warm + 200, rng)
+        full = expected(points, alpha)
+        start = len(points) - 30
+        window = ewma(points[start - warm:], alpha)[warm:]
+        assert window == full[start:]
+
+
+def test_batch_matches_per_series():
+    rng = random.Random(3)
+    batch = {u: series(rng.randint(0, 120), rng) for u in range(25)}
+    seeds = {u: round(rng.uniform(60, 120), 2) for u in range(0, 25, 3)}
+    got = ewma_batch(batch, 0.3, seeds)
+    for u, points in batch.items():
+        assert got[u] == expected(points, 0.3, seeds.get(u))
@@ -0,0 +1,42 @@
+"""ImportRow is validated as stored: every value must fit its weigh_ins / daily_metrics column."""
+import io
+
+import pytest
+from pydantic import ValidationError
+
+from importer import CopyStream, read_records
+from main import INT_MAX, ImportRow, import_row_values
+
+
+@pytest.mark.parametrize("kg,stored", [("80.456", 80.46), (999.994, 999.99), ("0.005", 0.01)])
+def test_kg_rounded_before_bounds(kg, stored):
+    assert ImportRow(date="2026-01-05", weight=kg).kg == stored
+
+
+@pytest.mark.parametrize("kg", ["999.995", 1000, "0.004", 0])
+def test_kg_out_of_range_after_rounding(kg):
+    with pytest.raises(ValidationError):
+        ImportRow(date="2026-01-05", kg=kg)
+
+
+@pytest.mark.parametrize("column", ["steps", "protein_g", "fiber_g", "water_ml"])
+def test_int_columns_bounded(column):
+    assert getattr(ImportRow(date="2026-01-05", **{column: INT_MAX}), column) == INT_MAX
+    for value in (INT_MAX + 1, -1):
+        with pytest.raises(ValidationError):
+            ImportRow(date="2026-01-05", **{column: value})
+
+
+@pytest.mark.parametrize("column", ["mood", "hunger"])
+def test_smallint_columns_bounded(column):
+    with pytest.raises(ValidationError):
+        ImportRow(date="2026-01-05", **{column: 32768})
+
+
+def test_overflowing_row_is_a_line_error_not_a_copy_failure():
+    csv = b"date,kg,steps\n2026-01-05,80.1,3000000000\n2026-01-06,80.0,9000\n"
+    stream = CopyStream(read_records(io.BytesIO(csv), "csv"), import_row_values, max_rows=10)
+    copied = stream.read()
+    assert stream.invalid == 1 and stream.rows == 1
+    assert stream.errors[0][0] == 2 and stream.errors[0][1].startswith("steps:")
+    assert "3000000000" not in copied and "9000" in copied
@@ -0,0 +1,62 @@
+"""Beam meal-plan solver: target adherence, repeats across a multi-day plan, and speed."""
+import random
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from mealplan import SLOTS, plan_day, plan_days
+
+# kcal ranges per meal type, as in bench/datagen.py
+KINDS = {"breakfast": (250, 450), "lunch": (400, 700), "dinner": (400, 750), "snack": (100, 260)}
+
+
+def catalog(per_type: int, seed: int = 1):
+    rng = random.Random(seed)
+    out, next_id = {}, 1
+    for meal_type, (lo, hi) in KINDS.items():
+        out[meal_type] = []
+        for _ in range(per_type):
+            kcal = rng.randint(lo, hi)
+            out[meal_type].append(SimpleNamespace(id=next_id, kcal=kcal, protein_g=rng.randint(kcal // 40, kcal // 12),
+                                                  prep_min=rng.randint(5, 60)))
+            next_id += 1
+    return out
+
+
+def test_day_hits_kcal_and_protein_targets():
+    cands = catalog(100)
+    for kcal_target, protein_target in [(1500, 90), (1800, 110), (2200, 130)]:
+        picks = plan_day(cands, kcal_target, protein_target)
+        assert [mt for mt, _ in picks] == [mt for mt, _ in SLOTS]
+        assert abs(sum(r.kcal for _, r in picks) - kcal_target) <= 0.05 * kcal_target
+        assert sum(r.protein_g for _, r in picks) >= protein_target
+
+
+def test_day_never_repeats_a_recipe():
+    cands = catalog(3)
+    snacks = [r for mt, r in plan_day(cands, 1800, 110) if mt == "snack"]
+    assert len(snacks) == 2 and snacks[0].id != snacks[1].id
+
+
+def test_week_has_no_repeats_while_the_catalog_lasts():
+    week = plan_days(catalog(20), 1800, 110, days=7)
+    ids = [r.id for day in week for _, r in day]
+    assert len(ids) == 7 * len(SLOTS) and len(set(ids)) == len(ids)
+
+
+def test_short_catalog_repeats_evenly():
+    cands = catalog(20)
+    cands["breakfast"] = cands["breakfast"][:3]
+    week = plan_days(cands, 1800, 110, days=7)
+    uses = Counter(r.id for day in week for mt, r in day if mt == "breakfast")
+    assert len(uses) == 3 and max(uses.values()) - min(uses.values()) <= 1
+
+
+def test_week_well_under_100ms():
+    cands = catalog(500)  # a 2000-recipe catalog
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        plan_days(cands, 1800, 110, days=7)
+        best = min(best, time.perf_counter() - started)
+    assert best < 0.1
@@ -0,0 +1,85 @@
+"""Plateau fits over padded grids: OLS and Theil-Sen slopes in kg per day."""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from plateau import MIN_POINTS, PLATEAU_SLOPE, is_plateau, pack, plateau_flags, slopes
+
+START = date(2026, 3, 2)
+
+
+def days(*offsets):
+    return [START + timedelta(days=o) for o in offsets]
+
+
+def test_slope_is_per_day_not_per_weigh_in():
+    # weekly weigh-ins losing 0.7 kg each: 0.1 kg/day, not 0.7 per sample
+    ds = days(*range(0, 42, 7))
+    ws = [90 - 0.7 * i for i in range(6)]
+    for method in ("ols", "theil_sen"):
+        assert slopes([(ds, ws)], method)[0] == pytest.approx(-0.1)
+    assert not is_plateau(ds, ws)
+
+
+def test_methods_agree_on_clean_linear_data():
+    ds = days(0, 1, 3, 4, 8, 9, 13)
+    for slope in (-0.15, -0.01, 0.0, 0.05):
+        ws = [80 + slope * (d - START).days for d in ds]
+        ols, ts = slopes([(ds, ws)], "ols")[0], slopes([(ds, ws)], "theil_sen")[0]
+        assert ols == pytest.approx(slope) and ts == pytest.approx(slope)
+
+
+def test_one_outlier_does_not_flip_theil_sen():
+    ds = days(*range(10))
+    flat = [80.0, 80.1, 79.9, 80.0, 80.1, 79.9, 80.0, 80.1, 79.9, 80.0]
+    spiked = flat[:8] + [83.5] + flat[9:]  # a salty dinner
+    assert is_plateau(ds, flat, "theil_sen") and is_plateau(ds, spiked, "theil_sen")
+    assert not is_plateau(ds, spiked, "ols")
+
+    losing = [80 - 0.1 * i for i in range(10)]
+    dipped = losing[:8] + [74.0] + losing[9:]
+    assert not is_plateau(ds, dipped, "theil_sen")
+
+
+def test_rows_of_different_lengths_and_empty_rows():
+    rows = [
+        (days(*range(8)), [80.0] * 8),                    # flat, long enough
+        ([], []),                                          # no weigh-ins
+        (days(0, 2, 4), [80.0, 80.0, 80.0]),               # flat, too short
+        (days(*range(6)), [80 - 0.2 * i for i in range(6)]),  # losing
+        ([d.isoformat() for d in days(*range(5))], [70.0] * 5),  # ISO dates, exactly MIN_POINTS
+    ]
+    x, y, mask = pack(rows)
+    assert mask.sum(axis=1).tolist() == [8, 0, 3, 6, 5]
+    assert x[3, :6].tolist() == list(range(6)) and not mask[1].any()
+    for method in ("ols", "theil_sen"):
+        assert plateau_flags(rows, method).tolist() == [True, False, False, False, True]
+        alone = [plateau_flags([row], method)[0] for row in rows]
+        assert plateau_flags(rows, method).tolist() == alone
+
+
+def test_identical_dates_have_no_slope():
+    ds = [START] * MIN_POINTS
+    ws = [80.0, 81.0, 79.0, 80.5, 80.2]
+    assert np.isnan(slopes([(ds, ws)], "theil_sen")[0])  # no pair with dx != 0
+    assert slopes([(ds, ws)], "ols")[0] == 0.0
+    assert not is_plateau(ds, ws, "theil_sen")
+
+
+def test_mixed_rows_with_and_without_usable_pairs():
+    rows = [([START] * 6, [80.0] * 6), (days(*range(6)), [80.0] * 6)]
+    s = slopes(rows, "theil_sen")
+    assert np.isnan(s[0]) and s[1] == 0.0
+    assert plateau_flags(rows, "theil_sen").tolist() == [False, True]
+
+
+def test_threshold_and_errors():
+    ds = days(*range(10))
+    assert is_plateau(ds, [80 - 0.5 * PLATEAU_SLOPE * i for i in range(10)])
+    assert not is_plateau(ds, [80 - 2 * PLATEAU_SLOPE * i for i in range(10)])
+    assert plateau_flags([]).shape == (0,)
+    with pytest.raises(ValueError, match="unknown plateau method"):
+        slopes([(ds, [80.0] * 10)], "median")
+    with pytest.raises(ValueError, match="one date per weight"):
+        pack([(ds[:3], [80.0] * 4)])
@@ -0,0 +1,177 @@
+"""
+ConnectionPool bookkeeping with in-memory connections: FIFO hand-over, the bounded
+wait queue, what release does with dirty connections, and the idle health ping.
+"""
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions as ext
+import pytest
+
+from db import ConnectionPool, PoolTimeout
+
+
+class Conn:
+    def __init__(self, n: int):
+        self.n = n
+        self.closed = 0
+        self.status = ext.TRANSACTION_STATUS_IDLE
+        self.pings = 0
+        self.ping_error = None
+        self.rollback_error = None
+        self.rollbacks = 0
+
+    @property
+    def info(self):
+        return self
+
+    @property
+    def transaction_status(self):
+        return self.status
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                conn.pings += 1
+                if conn.ping_error:
+                    raise conn.ping_error
+
+        return Cursor()
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.rollback_error:
+            raise self.rollback_error
+        self.status = ext.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self.status = ext.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class Pool(ConnectionPool):
+    """ConnectionPool whose connections are Conn objects, numbered as they are opened."""
+
+    def __init__(self, **kw):
+        self.opened = []
+        super().__init__("postgresql://test", **kw)
+
+    def _connect(self):
+        self.opened.append(Conn(len(self.opened)))
+        return self.opened[-1]
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_waiters_are_served_in_arrival_order():
+    pool = Pool(minconn=1, maxconn=1, acquire_timeout=2)
+    held = pool.acquire()
+    order = []
+
+    def take(i):
+        conn = pool.acquire()
+        order.append(i)
+        pool.release(conn)
+
+    threads = []
+    for i in range(4):
+        threads.append(threading.Thread(target=take, args=(i,)))
+        threads[-1].start()
+        wait_for(lambda: pool.usage()[2] == i + 1)
+    pool.release(held)
+    for t in threads:
+        t.join()
+    assert order == [0, 1, 2, 3]
+    assert len(pool.opened) == 1
+
+
+def test_full_wait_queue_rejects_immediately():
+    pool = Pool(minconn=0, maxconn=1, max_waiters=1, acquire_timeout=2)
+    held = pool.acquire()
+    waiter = threading.Thread(target=lambda: pool.release(pool.acquire()))
+    waiter.start()
+    wait_for(lambda: pool.usage()[2] == 1)
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout, match="wait queue is full"):
+        pool.acquire()
+    assert time.monotonic() - started < 0.5
+    assert pool.stats()["rejected"] == 1
+
+    pool.release(held)
+    waiter.join()
+
+
+def test_wait_times_out():
+    pool = Pool(minconn=0, maxconn=1)
+    pool.acquire()
+    with pytest.raises(PoolTimeout, match="no database connection available"):
+        pool.acquire(timeout=0.05)
+    assert pool.stats()["timeouts"] == 1 and pool.usage() == (1, 0, 0)
+
+
+def test_release_rolls_back_an_open_transaction():
+    pool = Pool(minconn=0, maxconn=1)
+    conn = pool.acquire()
+    conn.status = ext.TRANSACTION_STATUS_INTRANS
+    pool.release(conn)
+    assert conn.rollbacks == 1 and not conn.closed
+    assert pool.acquire() is conn
+
+
+@pytest.mark.parametrize("how", ["discard", "unknown status", "failed rollback", "closed"])
+def test_release_discards_unusable_connections(how):
+    pool = Pool(minconn=0, maxconn=1)
+    conn = pool.acquire()
+    if how == "unknown status":
+        conn.status = ext.TRANSACTION_STATUS_UNKNOWN
+    elif how == "failed rollback":
+        conn.status = ext.TRANSACTION_STATUS_INERROR
+        conn.rollback_error = psycopg2.OperationalError("server closed the connection")
+    elif how == "closed":
+        conn.closed = 2
+    pool.release(conn, discard=how == "discard")
+    assert conn.closed
+    assert pool.usage() == (0, 0, 0) and pool.stats()["discarded"] == 1
+    assert pool.acquire() is not conn  # the freed slot opens a new connection
+
+
+def test_connection_context_discards_on_operational_error():
+    pool = Pool(minconn=1, maxconn=1)
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection() as conn:
+            raise psycopg2.OperationalError("terminating connection")
+    assert conn.closed and pool.usage() == (0, 0, 0)
+
+
+def test_idle_connection_pinged_before_reuse():
+    pool = Pool(minconn=1, maxconn=1, check_after=60)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn and conn.pings == 0  # fresh: no ping
+    pool.release(conn)
+
+    pool.check_after = 0
+    assert pool.acquire() is conn and conn.pings == 1
+    pool.release(conn)
+
+    conn.ping_error = psycopg2.OperationalError("server closed the connection")
+    fresh = pool.acquire()
+    assert fresh is not conn and conn.closed
+    assert pool.usage() == (1, 0, 0) and pool.stats()["discarded"] == 1
@@ -0,0 +1,147 @@
+"""
+Budgeted endpoints under QUERY_BUDGET_STRICT=1: a statement over an endpoint's
+@query_budget raises QueryBudgetExceeded, which the TestClient re-raises.
+"""
+from datetime import date, timedelta
+
+import pytest
+from fastapi import FastAPI
+
+from conftest import FakeConnection, queries
+from instrumentation import QueryBudgetExceeded, QueryStatsMiddleware, query_budget
+
+RECIPE = {"name": "r", "kcal": 400, "protein_g": 30, "carbs_g": 40, "fat_g": 10, "prep_min": 10,
+          "tags": [], "diet": "omnivore", "ingredients": [], "steps": []}
+CATALOG = [{"id": i + 1, **RECIPE, "name": tag, "tags": [tag], "ingredients_norm": None}
+           for i, tag in enumerate(("breakfast", "lunch", "dinner", "snack"))]
+NO_OWN_RECIPE = {"id": None, **{k: None for k in RECIPE}}
+
+
+def recipe_rules(catalog_version):
+    return [
+        ("AS catalog_version", lambda: [{"catalog_version": catalog_version[0], **NO_OWN_RECIPE}]),
+        ("FROM data_versions WHERE user_id=%s AND domain=%s), 0),",
+         lambda: [{"version": 3, "catalog_version": catalog_version[0]}]),
+        ("SELECT version FROM recipe_catalog_version", lambda: [{"version": catalog_version[0]}]),
+        ("WHERE user_id IS NULL", lambda: CATALOG),
+        ("FROM recipes WHERE user_id = %s", lambda: []),
+        ("FROM weigh_ins", lambda: [{"kg": 80.0}]),
+        ("FROM data_versions", lambda: [{"version": 3}]),
+    ]
+
+
+RECIPE_ENDPOINTS = [
+    ("GET", "/api/recipes"),
+    ("POST", "/api/mealplan/today"),
+    ("POST", "/api/mealplan/week?days=3"),
+]
+
+
+@pytest.mark.parametrize("method,path", RECIPE_ENDPOINTS)
+def test_recipe_endpoints_within_budget(serve, catalog, method, path):
+    version = [1]
+    client = serve(FakeConnection(recipe_rules(version)))
+
+    # first request loads the catalog: the worst case
+    r = client.request(method, path)
+    assert r.status_code == 200
+    worst = queries(r)
+
+    catalog.ttl = 0  # version check due on every request, same version: no reload
+    r = client.request(method, path)
+    assert r.status_code == 200
+    assert queries(r) == worst - 2
+
+    version[0] = 2  # a global recipe changed: reload
+    r = client.request(method, path)
+    assert r.status_code == 200 and queries(r) == worst
+    assert catalog.version == 2
+
+    catalog.ttl = 3600  # checked recently: the version check folds away entirely
+    r = client.request(method, path)
+    assert r.status_code == 200 and queries(r) == worst - 2
+
+
+def test_strict_mode_raises_over_budget():
+    from fastapi.testclient import TestClient
+    conn = FakeConnection([])
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware, strict=True)
+
+    @app.get("/two")
+    @query_budget(1)
+    def two():
+        for _ in range(2):
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        return {}
+
+    with pytest.raises(QueryBudgetExceeded, match="statement #2 exceeds the query budget of 1"):
+        TestClient(app).get("/two")
+
+
+def test_sync_full_queue_within_budget(serve):
+    import main
+    today = date.today()
+    days = [today - timedelta(days=n) for n in range(main.CHECKIN_BACKFILL_DAYS + 1)]
+    mutations = (
+        [{"id": f"c{i}", "type": "checkin", "date": str(days[i % len(days)]), "habit_id": i % 40, "done": True}
+         for i in range(300)]
+        + [{"id": f"w{i}", "type": "weighin", "date": str(days[i % len(days)]), "kg": 80.0} for i in range(99)]
+        + [{"id": f"m{i}", "type": "metrics", "date": str(days[i % len(days)]), "steps": 5000} for i in range(100)]
+        + [{"id": "s0", "type": "schedule", "date": str(today),
+            "items": [{"habit_id": h, "slot": "morning"} for h in range(250)]}]
+    )
+    conn = FakeConnection([
+        ("INSERT INTO sync_mutations", lambda: [{"mutation_id": m["id"]} for m in mutations]),
+        ("WITH input AS", lambda: [{"kind": "owned", "habit_id": h, "d": None, "amount": 0} for h in range(40)]
+         + [{"kind": "changed", "habit_id": i % 40, "d": days[i % len(days)], "amount": 1} for i in range(300)]),
+        ("domain = ANY", lambda: [{"domain": "xp", "version": 5}]),
+        ("AS xp", lambda: [{"xp": 120}]),
+    ])
+    r = serve(conn).post("/api/sync", json={"since": main.sync_token(today, {}), "mutations": mutations})
+    assert r.status_code == 200, r.text
+    assert len(r.json()["applied"]) == len(mutations)
+    assert queries(r) == 9
+
+
+def test_sync_rejects_values_the_columns_cant_hold(serve):
+    import main
+    today = str(date.today())
+    mutations = [
+        {"id": "heavy", "type": "weighin", "date": today, "kg": 999.995},
+        {"id": "moody", "type": "metrics", "date": today, "mood": 40000},
+        {"id": "walker", "type": "metrics", "date": today, "steps": 3_000_000_000},
+        {"id": "ok", "type": "weighin", "date": today, "kg": 80.5},
+    ]
+    conn = FakeConnection([("INSERT INTO sync_mutations", lambda: [{"mutation_id": m["id"]} for m in mutations])])
+    r = serve(conn).post("/api/sync", json={"since": main.sync_token(date.today(), {}), "mutations": mutations})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["applied"] == ["ok"]
+    assert {x["id"]: x["reason"].split(":")[0] for x in body["rejected"]} == \
+        {"heavy": "kg", "moody": "mood", "walker": "steps"}
+    writes = [s for s in conn.statements if "INSERT INTO weigh_ins" in s or "INSERT INTO daily_metrics" in s]
+    assert len(writes) == 1 and "80.5" in writes[0] and "999.995" not in writes[0]
+
+
+def test_insights_read_tips_only_when_the_cache_is_due(serve):
+    import main
+    tips = {"hydration": ["drink"], "energy_low": ["rest"], "plateau": ["patience"]}
+    snap = {"baseline": {"plateau": False, "done_count": 6, "total_count": 6}, "weighin_today": None,
+            "weighins_version": 1, "daily_today": [3, 3], "streaks": None}
+    conn = FakeConnection([("AS tips", lambda: [{**snap, "tips": tips}]), ("AS baseline", lambda: [snap])])
+    client = serve(conn)
+    main.tip_cache.loaded_at, saved_ttl = None, main.tip_cache.ttl
+    try:
+        for _ in range(2):
+            r = client.get("/api/insights/today")
+            assert r.status_code == 200 and queries(r) == 1
+            assert r.json()["tip"] == "drink"
+        assert ["FROM tips" in s for s in conn.statements] == [True, False]
+
+        main.tip_cache.ttl = 0
+        assert client.get("/api/insights/today").json()["tip"] == "drink"
+        assert "FROM tips" in conn.statements[-1]
+    finally:
+        main.tip_cache.ttl = saved_ttl
@@ -0,0 +1,209 @@
+"""
+Reminder dispatcher. The paging, queueing and retry tests run on an in-memory
+connection; the claim tests need a Postgres with db/supabase.sql applied and run
+only when TEST_DATABASE_URL points at one.
+"""
+import os
+import threading
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from uuid import UUID, uuid4
+
+import pytest
+
+import reminders
+from reminders import DUE_SQL, Dispatcher
+
+
+class Collect:
+    def __init__(self, fail: int = 0):
+        self.batches = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def send(self, batch):
+        with self._lock:
+            if self.fail:
+                self.fail -= 1
+                raise ConnectionError("push service down")
+            self.batches.append(batch)
+
+    @property
+    def users(self):
+        return [r["user_id"] for b in self.batches for r in b]
+
+
+def run_minute(dispatcher: Dispatcher, at: datetime) -> int:
+    dispatcher.start()
+    try:
+        return dispatcher.dispatch_minute(at)
+    finally:
+        dispatcher.stop()
+
+
+# ---------- in memory ----------
+class FakeDueCursor:
+    """Answers DUE_SQL from `profiles` (user_id -> claimable), in keyset order."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if sql is DUE_SQL:
+            self.owner.afters.append(params["after"])
+            users = sorted(u for u in self.owner.profiles if u > params["after"])[:params["batch"]]
+            self.rows = [{"user_id": u, "timezone": "UTC", "reminder_time": "07:30", "local_day": date(2026, 3, 2),
+                          "done": 0, "habits": 3, "claimed": self.owner.profiles[u]} for u in users]
+        else:
+            self.rows = [{"n": 0}]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeDispatcher(Dispatcher):
+    def __init__(self, profiles, notifier, **kw):
+        super().__init__("postgresql://unused", notifier, **kw)
+        self.profiles = profiles
+        self.afters = []
+        self._conn = self
+
+    def _cursor(self):
+        return FakeDueCursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+AT = datetime(2026, 3, 2, 7, 30, tzinfo=timezone.utc)
+
+
+def test_pages_by_keyset_and_sends_only_claimed_rows():
+    profiles = {UUID(int=i): i % 3 != 0 for i in range(1, 12)}
+    notifier = Collect()
+    d = FakeDispatcher(profiles, notifier, batch=4, senders=2, queue_batches=1)
+    assert run_minute(d, AT) == sum(profiles.values())
+    assert d.afters == [UUID(int=0), UUID(int=4), UUID(int=8)]
+    assert sorted(notifier.users) == [u for u, claimed in profiles.items() if claimed]
+    assert d.sent == sum(profiles.values()) and d.failed == 0
+
+
+def test_failed_batches_are_retried_then_dropped(monkeypatch):
+    monkeypatch.setattr(reminders.time, "sleep", lambda s: None)
+    profiles = {UUID(int=i): True for i in range(1, 4)}
+
+    notifier = Collect(fail=reminders.SEND_ATTEMPTS - 1)
+    d = FakeDispatcher(profiles, notifier, senders=1)
+    run_minute(d, AT)
+    assert d.sent == 3 and d.failed == 0
+
+    notifier = Collect(fail=reminders.SEND_ATTEMPTS)
+    d = FakeDispatcher(profiles, notifier, senders=1)
+    run_minute(d, AT)
+    assert d.sent == 0 and d.failed == 3 and notifier.users == []
+
+
+# ---------- against Postgres ----------
+DSN = os.getenv("TEST_DATABASE_URL")
+needs_db = pytest.mark.skipif(not DSN, reason="TEST_DATABASE_URL not set")
+
+REMINDER = dtime(3, 17)  # a UTC minute no seeded profile uses
+
+
+@pytest.fixture
+def db():
+    import psycopg2
+    import psycopg2.extras
+    conn = psycopg2.connect(DSN)
+    conn.autocommit = True
+    psycopg2.extras.register_uuid(conn_or_curs=conn)
+    created = []
+
+    def user(habits: int, done: int, tz: str = "UTC") -> UUID:
+        uid = uuid4()
+        created.append(uid)
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO auth.users (id, email) VALUES (%s, %s)", (uid, f"{uid}@test"))
+            cur.execute("INSERT INTO public.users (id) VALUES (%s) ON CONFLICT DO NOTHING", (uid,))
+            cur.execute("INSERT INTO user_profile (user_id, timezone, reminder_time) VALUES (%s, %s, %s)",
+                        (uid, tz, REMINDER))
+            for i in range(habits):
+                cur.execute("INSERT INTO habits (user_id, name) VALUES (%s, %s) RETURNING id", (uid, f"h{i}"))
+                (hid,) = cur.fetchone()
+                if i < done:
+                    cur.execute("INSERT INTO checkins (habit_id, user_id, checkin_date, done) VALUES (%s, %s, %s, TRUE)",
+                                (hid, uid, date.today()))
+        return uid
+
+    user.conn = conn
+    yield user
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM auth.users WHERE id = ANY(%s)", (created,))
+    conn.close()
+
+
+def due_at(day: date) -> datetime:
+    return datetime.combine(day, REMINDER, tzinfo=timezone.utc)
+
+
+@needs_db
+def test_skips_users_done_for_the_day(db):
+    behind, fresh, no_habits, small_behind = db(4, 1), db(4, 0), db(0, 0), db(2, 1)
+    done_three, small_done = db(4, 3), db(2, 2)  # min(3, habits) done
+    notifier = Collect()
+    run_minute(Dispatcher(DSN, notifier, batch=2), due_at(date.today()))
+    sent = set(notifier.users)
+    assert {behind, fresh, no_habits, small_behind} <= sent
+    assert not {done_three, small_done} & sent
+
+
+@needs_db
+def test_claimed_reminder_is_not_sent_twice(db):
+    users = {db(3, 0) for _ in range(6)}
+    today = due_at(date.today())
+
+    # two dispatchers racing on the same minute split the users between them
+    first, racing = Collect(), Collect()
+    threads = [threading.Thread(target=run_minute, args=(Dispatcher(DSN, n, batch=2), today)) for n in (first, racing)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    sent = [u for u in first.users + racing.users if u in users]
+    assert sorted(sent) == sorted(users)
+
+    # a replayed minute (catch-up after a restart) sends nothing
+    again = Collect()
+    run_minute(Dispatcher(DSN, again, batch=2), today)
+    assert not users & set(again.users)
+
+    tomorrow = Collect()
+    run_minute(Dispatcher(DSN, tomorrow, batch=2), due_at(date.today() + timedelta(days=1)))
+    assert users <= set(tomorrow.users)
+
+
+@needs_db
+def test_unknown_timezone_does_not_stop_rebucketing(db):
+    lost, moved = db(0, 0, tz="Nowhere/Land"), db(0, 0)
+    with db.conn.cursor() as cur:
+        cur.execute("UPDATE user_profile SET reminder_utc_minute = 5 WHERE user_id = %s", (moved,))  # stale bucket
+        cur.execute("SELECT public.refresh_reminder_minutes()")
+        assert cur.fetchone()[0] >= 1
+        cur.execute("SELECT user_id, reminder_utc_minute FROM user_profile WHERE user_id IN (%s, %s)", (lost, moved))
+        assert dict(cur.fetchall()) == {lost: None, moved: REMINDER.hour * 60 + REMINDER.minute}
+
+    notifier = Collect()
+    run_minute(Dispatcher(DSN, notifier), due_at(date.today()))
+    assert moved in notifier.users and lost not in notifier.users
@@ -0,0 +1,90 @@
+"""Ingredient normalization and shopping-list aggregation (shopping.py, POST /api/shopping-list)."""
+import pytest
+
+from conftest import FakeConnection
+from shopping import BasketCache, canonical_name, normalize_ingredients, sum_vectors, to_base, vector_from_json
+
+
+@pytest.mark.parametrize("qty,unit,expected", [
+    (1.5, "kg", ("g", 1500.0)),
+    ("250", "g", ("g", 250.0)),
+    (500, "mg", ("g", 0.5)),
+    (1, "L", ("ml", 1000.0)),
+    (25, "cl", ("ml", 250.0)),
+    (2, "c. à soupe", ("ml", 30.0)),
+    (3, None, ("pièce", 3.0)),
+    (2, " Pièces ", ("pièce", 2.0)),
+    (1, "botte", ("botte", 1.0)),  # unknown units are kept
+    ("un peu", "g", ("g", 0.0)),
+])
+def test_to_base(qty, unit, expected):
+    assert to_base(qty, unit) == expected
+
+
+def test_units_fold_and_aliases_merge_within_a_recipe():
+    vec = normalize_ingredients([
+        {"name": "Lait", "qty": 0.5, "unit": "l"},
+        {"name": "lait", "qty": 200, "unit": "ml"},
+        {"name": "Oeufs", "qty": 2, "unit": ""},
+        {"name": "œuf", "qty": 1},
+        {"name": "Farine", "qty": 0.25, "unit": "kg"},
+        {"name": "farine", "qty": 50, "unit": "g"},
+        {"name": "Huile  Olive", "qty": 1, "unit": "càs"},
+        {"name": "huile d’olive", "qty": 1, "unit": "c. à café"},
+    ])
+    assert vec == (("farine", "g", 300.0), ("huile d'olive", "ml", 20.0),
+                   ("lait", "ml", 700.0), ("œufs", "pièce", 3.0))
+    assert canonical_name(" Salade   VERTE ") == "salade"
+
+
+def test_stored_vector_wins_over_raw_ingredients():
+    raw = [{"name": "riz", "qty": 100, "unit": "g"}]
+    assert vector_from_json([["riz", "g", "80"]], raw) == (("riz", "g", 80.0),)
+    assert vector_from_json(None, raw) == (("riz", "g", 100.0),)
+
+
+def test_sum_counts_multiplicity_and_sorts_accent_insensitively():
+    a = (("épinards", "g", 100.0), ("œufs", "pièce", 2.0))
+    b = (("avocat", "pièce", 1.0), ("œufs", "pièce", 1.0), ("œufs", "g", 50.0))
+    assert sum_vectors([(a, 2), (b, 1)]) == [
+        ("avocat", "pièce", 1.0), ("épinards", "g", 200.0), ("œufs", "g", 50.0), ("œufs", "pièce", 5.0)]
+
+
+def test_basket_cache_is_lru():
+    cache = BasketCache(maxsize=2)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    assert cache.get("a") == [1]
+    cache.put("c", [3])  # evicts b, the least recently used
+    assert cache.get("b") is None and cache.get("a") == [1] and cache.get("c") == [3]
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def recipe(rid, ingredients):
+    return {"id": rid, "name": f"r{rid}", "kcal": 400, "protein_g": 30, "carbs_g": 40, "fat_g": 10, "prep_min": 10,
+            "tags": ["lunch"], "diet": "omnivore", "ingredients": ingredients, "steps": [], "ingredients_norm": None}
+
+
+def test_shopping_list_counts_duplicates_and_follows_catalog_version(serve, catalog):
+    state = {"version": 1, "tomatoes": 200}
+    conn = FakeConnection([
+        ("SELECT version FROM recipe_catalog_version", lambda: [{"version": state["version"]}]),
+        ("WHERE user_id IS NULL", lambda: [
+            recipe(1, [{"name": "Tomate", "qty": state["tomatoes"], "unit": "g"}]),
+            recipe(2, [{"name": "tomates", "qty": 0.1, "unit": "kg"}, {"name": "Lait", "qty": 0.2, "unit": "l"}]),
+        ]),
+    ])
+    client = serve(conn)
+
+    def post():
+        r = client.post("/api/shopping-list", json={"recipe_ids": [1, 2, 1]})
+        assert r.status_code == 200
+        return {(i["name"], i["unit"]): i["qty"] for i in r.json()}
+
+    assert post() == {("tomates", "g"): 500.0, ("lait", "ml"): 200.0}
+    catalog.ttl = 0  # re-check the version on every request
+    state["tomatoes"] = 300  # changed in the table, but the catalog version hasn't moved
+    assert post() == {("tomates", "g"): 500.0, ("lait", "ml"): 200.0}
+
+    state["version"] = 2
+    assert post() == {("tomates", "g"): 700.0, ("lait", "ml"): 200.0}
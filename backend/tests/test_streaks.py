@@ -0,0 +1,35 @@
+"""Streak and garden state from user_streaks runs, including runs dated one day ahead."""
+from datetime import date, timedelta
+
+import main
+
+TODAY = date.today()
+DAY = timedelta(days=1)
+
+
+def streaks(start, end):
+    return {"perfect_start": start, "perfect_end": end, "soft_start": start, "soft_end": end}
+
+
+def test_current_run():
+    assert main.current_run(None, None) == 0
+    assert main.current_run(TODAY - 2 * DAY, TODAY) == 3
+    assert main.current_run(TODAY - 2 * DAY, TODAY - DAY) == 0
+    # a client east of the server already checked in "tomorrow": counted up to today
+    assert main.current_run(TODAY - 2 * DAY, TODAY + DAY) == 3
+    assert main.current_run(TODAY + DAY, TODAY + DAY) == 0
+
+
+def test_garden_with_run_ending_tomorrow():
+    g = main.garden_from_streaks(streaks(TODAY - 6 * DAY, TODAY + DAY))
+    assert (g.perfect_streak, g.watered_today, g.droopy) == (7, True, False)
+    g = main.garden_from_streaks(streaks(TODAY + DAY, TODAY + DAY))
+    assert (g.perfect_streak, g.watered_today, g.droopy) == (0, True, False)
+
+
+def test_garden_droops_after_a_missed_day():
+    g = main.garden_from_streaks(streaks(TODAY - 5 * DAY, TODAY - DAY))
+    assert (g.perfect_streak, g.watered_today, g.droopy) == (0, False, False)
+    g = main.garden_from_streaks(streaks(TODAY - 5 * DAY, TODAY - 2 * DAY))
+    assert (g.perfect_streak, g.watered_today, g.droopy) == (0, False, True)
+    assert main.garden_from_streaks(None).droopy
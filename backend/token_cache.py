@@ -0,0 +1,91 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Union
+from uuid import UUID
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of already-verified bearer tokens.
+
+    Entries are keyed by a digest of the raw token (the token itself is never kept)
+    and live until the token's `exp`. Rejected tokens go to a separate, smaller
+    negative cache with a short TTL so a flood of garbage tokens can't evict good ones.
+    """
+
+    def __init__(self, maxsize: int = 10000, negative_maxsize: int = 5000,
+                 negative_ttl: float = 60.0, max_ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.negative_maxsize = negative_maxsize
+        self.negative_ttl = negative_ttl
+        self.max_ttl = max_ttl
+        self._ok: "OrderedDict[bytes, tuple]" = OrderedDict()    # digest -> (user_id, expires_at)
+        self._bad: "OrderedDict[bytes, tuple]" = OrderedDict()   # digest -> (detail, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=20).digest()
+
+    def get(self, token: str) -> Optional[Union[UUID, str]]:
+        """Returns the cached user id, the cached rejection detail (str), or None on a miss."""
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            hit = self._ok.get(key)
+            if hit is not None:
+                if hit[1] > now:
+                    self._ok.move_to_end(key)
+                    self.hits += 1
+                    return hit[0]
+                del self._ok[key]
+            bad = self._bad.get(key)
+            if bad is not None:
+                if bad[1] > now:
+                    self.negative_hits += 1
+                    return bad[0]
+                del self._bad[key]
+            self.misses += 1
+        return None
+
+    def accept(self, token: str, user_id: UUID, exp: Optional[float]):
+        now = time.time()
+        expires_at = min(float(exp), now + self.max_ttl) if exp is not None else now + self.max_ttl
+        if expires_at <= now:
+            return
+        self._put(self._ok, self.maxsize, self._key(token), (user_id, expires_at))
+
+    def reject(self, token: str, detail: str):
+        self._put(self._bad, self.negative_maxsize, self._key(token), (detail, time.time() + self.negative_ttl))
+
+    def _put(self, store: OrderedDict, maxsize: int, key: bytes, value: tuple):
+        with self._lock:
+            store[key] = value
+            store.move_to_end(key)
+            while len(store) > maxsize:
+                store.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._ok.clear()
+            self._bad.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self._ok),
+                "negative_size": len(self._bad),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            }
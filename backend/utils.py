@@ -1,18 +1,114 @@
-from typing import List, Tuple
-from decimal import Decimal  # add this
+import math
+from typing import Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
 
-def ewma(points: List[Tuple[str, float]], alpha: float = 0.3):
+import numpy as np
+
+
+def _ewma_block_len(decay: float) -> int:
+    # decay**-L must stay comfortably inside float64 range for the blocked closed form
+    if decay >= 1.0:
+        return 1024
+    return max(1, min(1024, int(200 / -math.log10(decay))))
+
+
+def ewma_array(weights, alpha: float = 0.3, seed=None) -> np.ndarray:
+    """
+    Vectorized float64 EWMA along the last axis: trend[j] = alpha*w[j] + (1-alpha)*trend[j-1].
+
+    `seed` is the trend value just before the first point (scalar or one per row);
+    without it the series starts at its first weight, like the original loop.
+    Long series are processed in blocks using the closed form
+    trend[j] = decay**(j+1) * (carry + alpha * cumsum(w[k] * decay**-(k+1))),
+    so the per-point work stays in numpy.
+    """
+    if not 0 < alpha <= 1:
+        raise ValueError("alpha must be in (0, 1]")
+    w = np.asarray(weights, dtype=np.float64)
+    out = np.empty_like(w)
+    if w.shape[-1] == 0:
+        return out
+    carry = w[..., 0].copy() if seed is None else np.broadcast_to(np.asarray(seed, dtype=np.float64), w.shape[:-1]).copy()
+    decay = 1.0 - alpha
+    if decay == 0.0:
+        out[...] = w
+        return out
+
+    block = _ewma_block_len(decay)
+    powers = decay ** np.arange(1, block + 1, dtype=np.float64)
+    for start in range(0, w.shape[-1], block):
+        chunk = w[..., start:start + block]
+        n = chunk.shape[-1]
+        p = powers[:n]
+        acc = np.cumsum(chunk / p, axis=-1)
+        res = p * (carry[..., None] + alpha * acc)
+        out[..., start:start + n] = res
+        carry = res[..., -1]
+    return out
+
+
+def round2(values) -> np.ndarray:
+    """
+    Rounds to 2 decimals, half to even, treating float noise around an exact .xx5 as a tie.
+    This mirrors `round(Decimal, 2)` on the exact decimal value the float approximates.
+    """
+    q = np.asarray(values, dtype=np.float64) * 100.0
+    lo = np.floor(q)
+    tie = np.abs(q - lo - 0.5) < 1e-7
+    r = np.where(tie, lo + (lo % 2), np.rint(q))
+    return r / 100.0
+
+
+def ewma(points: List[Tuple[str, float]], alpha: float = 0.3, seed: Optional[float] = None):
     """
     points: list[(date_iso, weight_kg)]
     returns list[(date_iso, weight, trend)]
     """
-    trend = None
-    out = []
-    alpha = Decimal(str(alpha))
-    for d, w in points:
-        w = Decimal(str(w))
-        trend = w if trend is None else alpha * w + (1 - alpha) * trend
-        out.append((d, w, round(trend, 2)))
+    if not points:
+        return []
+    dates = [d for d, _ in points]
+    ws = np.fromiter((w for _, w in points), dtype=np.float64, count=len(points))
+    trend = round2(ewma_array(ws, alpha, seed)).tolist()
+    return list(zip(dates, ws.tolist(), trend))
+
+
+def ewma_warmup(alpha: float, tolerance: float = 1e-9) -> Optional[int]:
+    """
+    Number of earlier points to replay before a window so the unknown history
+    weighs less than `tolerance` in the first trend value. None means "replay everything".
+    """
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        return 0
+    n = math.ceil(math.log(tolerance) / math.log(decay))
+    return n if n <= 5000 else None
+
+
+def ewma_batch(series: Mapping[Hashable, Sequence[Tuple[str, float]]], alpha: float = 0.3,
+               seeds: Optional[Mapping[Hashable, float]] = None) -> Dict[Hashable, List[Tuple[str, float, float]]]:
+    """
+    Smooths many series (e.g. one per user) in a single padded numpy pass.
+    Returns {key: [(date_iso, weight, trend)]}, same rows as `ewma` per series.
+    """
+    keys = [k for k, pts in series.items() if pts]
+    out: Dict[Hashable, List[Tuple[str, float, float]]] = {k: [] for k, pts in series.items() if not pts}
+    if not keys:
+        return out
+    lengths = [len(series[k]) for k in keys]
+    width = max(lengths)
+    grid = np.zeros((len(keys), width), dtype=np.float64)
+    for i, k in enumerate(keys):
+        grid[i, :lengths[i]] = [w for _, w in series[k]]
+        # pad with the last weight; padding sits after the real points so it can't affect them
+        grid[i, lengths[i]:] = grid[i, lengths[i] - 1]
+    seed = grid[:, 0].copy()
+    if seeds:
+        for i, k in enumerate(keys):
+            if seeds.get(k) is not None:
+                seed[i] = seeds[k]
+    trend = round2(ewma_array(grid, alpha, seed))
+    for i, k in enumerate(keys):
+        n = lengths[i]
+        out[k] = list(zip((d for d, _ in series[k]), grid[i, :n].tolist(), trend[i, :n].tolist()))
     return out
 
 
@@ -22,3 +118,4 @@ def classify_energy(completion_ratio_7d: float) -> str:
     if completion_ratio_7d >= 0.4:
         return "medium"
     return "low"
+
@@ -60,6 +60,73 @@ END $$;
 CREATE INDEX IF NOT EXISTS idx_recipes_tags ON public.recipes USING GIN (tags);
 CREATE INDEX IF NOT EXISTS idx_recipes_diet ON public.recipes (diet);
 
+-- NULL = global (seeded) recipe, otherwise owned by that user.
+ALTER TABLE public.recipes ADD COLUMN IF NOT EXISTS user_id UUID REFERENCES public.users(id) ON DELETE CASCADE;
+CREATE INDEX IF NOT EXISTS idx_recipes_user ON public.recipes (user_id) WHERE user_id IS NOT NULL;
+
+-- Normalized ingredient vector [[name, base unit, qty], ...] computed by the API
+-- (backend/shopping.py) on create, or by `python manage.py normalize-ingredients`.
+-- Cleared when `ingredients` changes without it, so it is never stale.
+ALTER TABLE public.recipes ADD COLUMN IF NOT EXISTS ingredients_norm JSONB;
+
+CREATE OR REPLACE FUNCTION public.recipes_norm_invalidate()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.ingredients IS DISTINCT FROM OLD.ingredients
+     AND NEW.ingredients_norm IS NOT DISTINCT FROM OLD.ingredients_norm THEN
+    NEW.ingredients_norm := NULL;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_recipes_norm_invalidate ON public.recipes;
+CREATE TRIGGER trg_recipes_norm_invalidate
+  BEFORE UPDATE OF ingredients ON public.recipes
+  FOR EACH ROW EXECUTE FUNCTION public.recipes_norm_invalidate();
+
+-- Bumped whenever a global recipe changes; API workers poll it to refresh their
+-- in-memory catalog (backend/recipes.py).
+CREATE TABLE IF NOT EXISTS public.recipe_catalog_version (
+  id      BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO public.recipe_catalog_version (id) VALUES (true) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION public.recipe_catalog_bump()
+RETURNS TRIGGER AS $$
+DECLARE
+  changed BOOLEAN := false;
+BEGIN
+  IF TG_OP IN ('INSERT','UPDATE') THEN
+    changed := EXISTS (SELECT 1 FROM rc_new WHERE user_id IS NULL);
+  END IF;
+  IF TG_OP IN ('UPDATE','DELETE') AND NOT changed THEN
+    changed := EXISTS (SELECT 1 FROM rc_old WHERE user_id IS NULL);
+  END IF;
+  IF changed THEN
+    UPDATE public.recipe_catalog_version SET version = version + 1;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_recipe_catalog_ins ON public.recipes;
+CREATE TRIGGER trg_recipe_catalog_ins
+  AFTER INSERT ON public.recipes
+  REFERENCING NEW TABLE AS rc_new
+  FOR EACH STATEMENT EXECUTE FUNCTION public.recipe_catalog_bump();
+DROP TRIGGER IF EXISTS trg_recipe_catalog_upd ON public.recipes;
+CREATE TRIGGER trg_recipe_catalog_upd
+  AFTER UPDATE ON public.recipes
+  REFERENCING OLD TABLE AS rc_old NEW TABLE AS rc_new
+  FOR EACH STATEMENT EXECUTE FUNCTION public.recipe_catalog_bump();
+DROP TRIGGER IF EXISTS trg_recipe_catalog_del ON public.recipes;
+CREATE TRIGGER trg_recipe_catalog_del
+  AFTER DELETE ON public.recipes
+  REFERENCING OLD TABLE AS rc_old
+  FOR EACH STATEMENT EXECUTE FUNCTION public.recipe_catalog_bump();
+
 -- ---------- Tips ----------
 CREATE TABLE IF NOT EXISTS public.tips (
   id SERIAL PRIMARY KEY,
@@ -115,6 +182,193 @@ CREATE TABLE IF NOT EXISTS public.checkins (
 );
 CREATE INDEX IF NOT EXISTS idx_checkins_user_date ON public.checkins(user_id, checkin_date);
 
+-- Per-day rollup of checkins, kept in sync by trigger (same transaction as the write).
+CREATE TABLE IF NOT EXISTS public.checkin_daily (
+  user_id     UUID REFERENCES public.users(id) ON DELETE CASCADE,
+  c_date      DATE NOT NULL,
+  done_count  INT NOT NULL DEFAULT 0,
+  total_count INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, c_date)
+);
+
+CREATE OR REPLACE FUNCTION public.checkin_daily_apply()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'UPDATE'
+     AND NEW.user_id IS NOT DISTINCT FROM OLD.user_id
+     AND NEW.checkin_date = OLD.checkin_date
+     AND COALESCE(NEW.done, FALSE) = COALESCE(OLD.done, FALSE) THEN
+    RETURN NULL;
+  END IF;
+
+  IF TG_OP IN ('UPDATE','DELETE') AND OLD.user_id IS NOT NULL THEN
+    UPDATE public.checkin_daily
+       SET done_count  = done_count - (CASE WHEN OLD.done THEN 1 ELSE 0 END),
+           total_count = total_count - 1
+     WHERE user_id = OLD.user_id AND c_date = OLD.checkin_date;
+  END IF;
+
+  IF TG_OP IN ('INSERT','UPDATE') AND NEW.user_id IS NOT NULL THEN
+    INSERT INTO public.checkin_daily (user_id, c_date, done_count, total_count)
+    VALUES (NEW.user_id, NEW.checkin_date, CASE WHEN NEW.done THEN 1 ELSE 0 END, 1)
+    ON CONFLICT (user_id, c_date) DO UPDATE SET
+      done_count  = checkin_daily.done_count + EXCLUDED.done_count,
+      total_count = checkin_daily.total_count + 1;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_checkin_daily ON public.checkins;
+CREATE TRIGGER trg_checkin_daily
+  AFTER INSERT OR UPDATE OR DELETE ON public.checkins
+  FOR EACH ROW EXECUTE FUNCTION public.checkin_daily_apply();
+
+-- Latest run of perfect (>= 3 done) and soft (>= 2 done) days per user, plus
+-- the longest runs ever. The current streak is end - start + 1 when end is today.
+CREATE TABLE IF NOT EXISTS public.user_streaks (
+  user_id         UUID PRIMARY KEY REFERENCES public.users(id) ON DELETE CASCADE,
+  perfect_start   DATE,
+  perfect_end     DATE,             -- last perfect day
+  soft_start      DATE,
+  soft_end        DATE,
+  longest_perfect INT NOT NULL DEFAULT 0,
+  longest_soft    INT NOT NULL DEFAULT 0
+);
+
+-- Recomputes streak rows from checkin_daily (all users when p_user is NULL).
+CREATE OR REPLACE FUNCTION public.rebuild_user_streaks(p_user UUID DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+  n BIGINT;
+BEGIN
+  DELETE FROM public.user_streaks WHERE p_user IS NULL OR user_id = p_user;
+  WITH days AS (
+    SELECT user_id, c_date, done_count FROM public.checkin_daily
+    WHERE done_count >= 2 AND (p_user IS NULL OR user_id = p_user)
+  ),
+  runs AS (
+    SELECT user_id, lvl, MIN(c_date) AS s, MAX(c_date) AS e
+    FROM (
+      SELECT user_id, c_date, 3 AS lvl,
+             c_date - (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY c_date))::int AS grp
+      FROM days WHERE done_count >= 3
+      UNION ALL
+      SELECT user_id, c_date, 2,
+             c_date - (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY c_date))::int
+      FROM days
+    ) x
+    GROUP BY user_id, lvl, grp
+  ),
+  agg AS (
+    SELECT user_id,
+           (array_agg(s ORDER BY e DESC) FILTER (WHERE lvl = 3))[1] AS perfect_start,
+           MAX(e) FILTER (WHERE lvl = 3)                            AS perfect_end,
+           (array_agg(s ORDER BY e DESC) FILTER (WHERE lvl = 2))[1] AS soft_start,
+           MAX(e) FILTER (WHERE lvl = 2)                            AS soft_end,
+           COALESCE(MAX(e - s + 1) FILTER (WHERE lvl = 3), 0)       AS longest_perfect,
+           COALESCE(MAX(e - s + 1) FILTER (WHERE lvl = 2), 0)       AS longest_soft
+    FROM runs GROUP BY user_id
+  )
+  INSERT INTO public.user_streaks (user_id, perfect_start, perfect_end, soft_start, soft_end, longest_perfect, longest_soft)
+  SELECT u.id, a.perfect_start, a.perfect_end, a.soft_start, a.soft_end,
+         COALESCE(a.longest_perfect, 0), COALESCE(a.longest_soft, 0)
+  FROM public.users u
+  LEFT JOIN agg a ON a.user_id = u.id
+  WHERE p_user IS NULL OR u.id = p_user
+  ON CONFLICT (user_id) DO NOTHING;
+  GET DIAGNOSTICS n = ROW_COUNT;
+  RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Advances the streak row when a day newly reaches a threshold right after the
+-- current run (the normal "checked my 3rd habit today" case): O(1).
+-- Anything else (un-checking, back-dated days) falls back to a per-user rebuild.
+CREATE OR REPLACE FUNCTION public.user_streaks_apply()
+RETURNS TRIGGER AS $$
+DECLARE
+  uid   UUID := COALESCE(NEW.user_id, OLD.user_id);
+  d     DATE := COALESCE(NEW.c_date, OLD.c_date);
+  old_n INT  := CASE WHEN TG_OP = 'INSERT' THEN 0 ELSE OLD.done_count END;
+  new_n INT  := CASE WHEN TG_OP = 'DELETE' THEN 0 ELSE NEW.done_count END;
+  s     public.user_streaks%ROWTYPE;
+BEGIN
+  IF current_setting('boostfit.defer_streaks', true) = 'on' THEN
+    RETURN NULL;
+  END IF;
+  IF (old_n >= 2) = (new_n >= 2) AND (old_n >= 3) = (new_n >= 3) THEN
+    RETURN NULL;
+  END IF;
+
+  SELECT * INTO s FROM public.user_streaks WHERE user_id = uid FOR UPDATE;
+  IF NOT FOUND OR new_n < old_n THEN
+    PERFORM public.rebuild_user_streaks(uid);
+    RETURN NULL;
+  END IF;
+
+  IF old_n < 3 AND new_n >= 3 THEN
+    IF s.perfect_end IS NULL OR d > s.perfect_end + 1 THEN
+      s.perfect_start := d;
+      s.perfect_end := d;
+    ELSIF d = s.perfect_end + 1 THEN
+      s.perfect_end := d;
+    ELSE
+      PERFORM public.rebuild_user_streaks(uid);
+      RETURN NULL;
+    END IF;
+  END IF;
+  IF old_n < 2 AND new_n >= 2 THEN
+    IF s.soft_end IS NULL OR d > s.soft_end + 1 THEN
+      s.soft_start := d;
+      s.soft_end := d;
+    ELSIF d = s.soft_end + 1 THEN
+      s.soft_end := d;
+    ELSE
+      PERFORM public.rebuild_user_streaks(uid);
+      RETURN NULL;
+    END IF;
+  END IF;
+
+  UPDATE public.user_streaks SET
+    perfect_start   = s.perfect_start,
+    perfect_end     = s.perfect_end,
+    soft_start      = s.soft_start,
+    soft_end        = s.soft_end,
+    longest_perfect = GREATEST(s.longest_perfect, COALESCE(s.perfect_end - s.perfect_start + 1, 0)),
+    longest_soft    = GREATEST(s.longest_soft, COALESCE(s.soft_end - s.soft_start + 1, 0))
+  WHERE user_id = uid;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_user_streaks ON public.checkin_daily;
+CREATE TRIGGER trg_user_streaks
+  AFTER INSERT OR UPDATE OF done_count OR DELETE ON public.checkin_daily
+  FOR EACH ROW EXECUTE FUNCTION public.user_streaks_apply();
+
+-- Rebuilds the rollup from raw checkins (all users when p_user is NULL), then the
+-- streaks derived from it. Used to backfill existing data:
+-- `python manage.py rebuild-checkin-daily`.
+CREATE OR REPLACE FUNCTION public.rebuild_checkin_daily(p_user UUID DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+  n BIGINT;
+BEGIN
+  PERFORM set_config('boostfit.defer_streaks', 'on', true);
+  DELETE FROM public.checkin_daily WHERE p_user IS NULL OR user_id = p_user;
+  INSERT INTO public.checkin_daily (user_id, c_date, done_count, total_count)
+  SELECT user_id, checkin_date, COUNT(*) FILTER (WHERE done), COUNT(*)
+  FROM public.checkins
+  WHERE user_id IS NOT NULL AND (p_user IS NULL OR user_id = p_user)
+  GROUP BY user_id, checkin_date;
+  GET DIAGNOSTICS n = ROW_COUNT;
+  PERFORM set_config('boostfit.defer_streaks', 'off', true);
+  PERFORM public.rebuild_user_streaks(p_user);
+  RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ---------- Weigh-ins & Goals ----------
 CREATE TABLE IF NOT EXISTS public.weigh_ins (
   user_id UUID REFERENCES public.users(id) ON DELETE CASCADE,
@@ -123,6 +377,106 @@ CREATE TABLE IF NOT EXISTS public.weigh_ins (
   PRIMARY KEY (user_id, wi_date)
 );
 
+-- Smoothed weight (EWMA, alpha 0.3, same recurrence as utils.ewma) at each weigh-in.
+-- Appending the latest weigh-in is O(1); back-dated inserts, edits and deletes
+-- recompute from the changed date forward.
+ALTER TABLE public.weigh_ins ADD COLUMN IF NOT EXISTS trend DOUBLE PRECISION;
+
+-- Recomputes trends for one user from p_from onwards, seeded by the weigh-in before it.
+CREATE OR REPLACE FUNCTION public.weigh_in_trend_from(p_user UUID, p_from DATE)
+RETURNS INT AS $$
+DECLARE
+  t DOUBLE PRECISION;
+  r RECORD;
+  n INT := 0;
+BEGIN
+  SELECT trend INTO t FROM public.weigh_ins
+  WHERE user_id = p_user AND wi_date < p_from
+  ORDER BY wi_date DESC LIMIT 1;
+  FOR r IN
+    SELECT wi_date, kg::float8 AS kg FROM public.weigh_ins
+    WHERE user_id = p_user AND wi_date >= p_from
+    ORDER BY wi_date
+  LOOP
+    t := CASE WHEN t IS NULL THEN r.kg ELSE 0.3 * r.kg + 0.7 * t END;
+    UPDATE public.weigh_ins SET trend = t WHERE user_id = p_user AND wi_date = r.wi_date;
+    n := n + 1;
+  END LOOP;
+  RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Extends the trend from the previous weigh-in (one index probe).
+CREATE OR REPLACE FUNCTION public.weigh_in_trend_extend()
+RETURNS TRIGGER AS $$
+DECLARE
+  prev DOUBLE PRECISION;
+BEGIN
+  IF TG_OP = 'UPDATE' AND NEW.kg = OLD.kg AND NEW.wi_date = OLD.wi_date THEN
+    RETURN NEW;
+  END IF;
+  SELECT trend INTO prev FROM public.weigh_ins
+  WHERE user_id = NEW.user_id AND wi_date < NEW.wi_date
+  ORDER BY wi_date DESC LIMIT 1;
+  NEW.trend := CASE WHEN prev IS NULL THEN NEW.kg::float8 ELSE 0.3 * NEW.kg::float8 + 0.7 * prev END;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Fixes up later weigh-ins when the change was not an append.
+CREATE OR REPLACE FUNCTION public.weigh_in_trend_forward()
+RETURNS TRIGGER AS $$
+DECLARE
+  uid    UUID := COALESCE(NEW.user_id, OLD.user_id);
+  v_from DATE;
+BEGIN
+  -- bulk writers (history import) recompute once with weigh_in_trend_from() instead
+  IF current_setting('boostfit.defer_trend', true) = 'on' THEN
+    RETURN NULL;
+  END IF;
+  IF TG_OP = 'DELETE' THEN
+    v_from := OLD.wi_date;
+  ELSIF TG_OP = 'UPDATE' AND NEW.wi_date <> OLD.wi_date THEN
+    v_from := LEAST(OLD.wi_date, NEW.wi_date);
+  ELSIF TG_OP = 'UPDATE' AND NEW.kg = OLD.kg THEN
+    RETURN NULL;
+  ELSE
+    v_from := NEW.wi_date + 1;
+  END IF;
+  IF EXISTS (SELECT 1 FROM public.weigh_ins WHERE user_id = uid AND wi_date >= v_from) THEN
+    PERFORM public.weigh_in_trend_from(uid, v_from);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_weigh_in_trend_extend ON public.weigh_ins;
+CREATE TRIGGER trg_weigh_in_trend_extend
+  BEFORE INSERT OR UPDATE OF kg, wi_date ON public.weigh_ins
+  FOR EACH ROW EXECUTE FUNCTION public.weigh_in_trend_extend();
+DROP TRIGGER IF EXISTS trg_weigh_in_trend_forward ON public.weigh_ins;
+CREATE TRIGGER trg_weigh_in_trend_forward
+  AFTER INSERT OR UPDATE OF kg, wi_date OR DELETE ON public.weigh_ins
+  FOR EACH ROW EXECUTE FUNCTION public.weigh_in_trend_forward();
+
+-- Recomputes every trend (all users when p_user is NULL).
+-- Backfill with `python manage.py rebuild-trend`.
+CREATE OR REPLACE FUNCTION public.rebuild_weigh_in_trends(p_user UUID DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+  uid UUID;
+  n   BIGINT := 0;
+BEGIN
+  FOR uid IN
+    SELECT DISTINCT user_id FROM public.weigh_ins
+    WHERE user_id IS NOT NULL AND (p_user IS NULL OR user_id = p_user)
+  LOOP
+    n := n + public.weigh_in_trend_from(uid, '-infinity');
+  END LOOP;
+  RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
 CREATE TABLE IF NOT EXISTS public.goals (
   id SERIAL PRIMARY KEY,
   user_id UUID REFERENCES public.users(id) ON DELETE CASCADE,
@@ -148,6 +502,69 @@ CREATE TABLE IF NOT EXISTS public.user_profile (
   reminder_time   TIME
 );
 
+-- Reminder bucket: the UTC minute of day (0-1439) at which reminder_time falls in
+-- the user's timezone, indexed so the dispatcher (backend/reminders.py) reads only
+-- the users due in a given minute. NULL when there is no reminder or the timezone
+-- is unknown. Offsets move with DST; refresh_reminder_minutes() re-buckets.
+ALTER TABLE public.user_profile ADD COLUMN IF NOT EXISTS reminder_utc_minute SMALLINT;
+CREATE INDEX IF NOT EXISTS idx_profile_reminder_minute
+  ON public.user_profile(reminder_utc_minute, user_id) WHERE reminder_utc_minute IS NOT NULL;
+
+-- Raises on an unknown timezone. A NULL timezone means the app default (Europe/Paris).
+CREATE OR REPLACE FUNCTION public.reminder_utc_minute(p_time TIME, p_tz TEXT)
+RETURNS SMALLINT AS $$
+  SELECT (floor(EXTRACT(EPOCH FROM ((now() AT TIME ZONE COALESCE(p_tz, 'Europe/Paris'))::date + p_time)
+                                    AT TIME ZONE COALESCE(p_tz, 'Europe/Paris')) / 60)::bigint % 1440)::smallint
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION public.user_profile_reminder_minute()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.reminder_utc_minute := CASE WHEN NEW.reminder_time IS NULL THEN NULL
+                                  ELSE public.reminder_utc_minute(NEW.reminder_time, NEW.timezone) END;
+  RETURN NEW;
+EXCEPTION WHEN invalid_parameter_value THEN
+  NEW.reminder_utc_minute := NULL;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_profile_reminder_minute ON public.user_profile;
+CREATE TRIGGER trg_profile_reminder_minute
+  BEFORE INSERT OR UPDATE OF reminder_time, timezone ON public.user_profile
+  FOR EACH ROW EXECUTE FUNCTION public.user_profile_reminder_minute();
+
+-- Re-buckets rows whose UTC minute moved (DST change); the dispatcher calls it
+-- hourly. Returns the number of rows moved. The minute is only computed after the
+-- join to pg_timezone_names, so a profile with an unknown timezone can't fail it.
+CREATE OR REPLACE FUNCTION public.refresh_reminder_minutes()
+RETURNS BIGINT AS $$
+DECLARE
+  n BIGINT;
+BEGIN
+  WITH known AS MATERIALIZED (
+    SELECT p.user_id, public.reminder_utc_minute(p.reminder_time, p.timezone) AS minute
+    FROM public.user_profile p
+    JOIN pg_timezone_names z ON z.name = COALESCE(p.timezone, 'Europe/Paris')
+    WHERE p.reminder_time IS NOT NULL
+  )
+  UPDATE public.user_profile p
+     SET reminder_utc_minute = k.minute
+    FROM known k
+   WHERE p.user_id = k.user_id
+     AND p.reminder_utc_minute IS DISTINCT FROM k.minute;
+  GET DIAGNOSTICS n = ROW_COUNT;
+  RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Last local day a reminder went out per user; the dispatcher claims a row here
+-- before sending, so restarts and concurrent dispatchers don't notify twice.
+CREATE TABLE IF NOT EXISTS public.reminder_sends (
+  user_id UUID PRIMARY KEY REFERENCES public.users(id) ON DELETE CASCADE,
+  sent_on DATE NOT NULL
+);
+
 -- ---------- Daily behavior metrics ----------
 CREATE TABLE IF NOT EXISTS public.daily_metrics (
   user_id      UUID REFERENCES public.users(id) ON DELETE CASCADE,
@@ -176,6 +593,118 @@ CREATE TABLE IF NOT EXISTS public.xp_events (
   meta JSONB
 );
 CREATE INDEX IF NOT EXISTS idx_xp_events_user_ts ON public.xp_events(user_id, ts);
+-- Awards that may happen at most once carry a key ('habit_done:<habit_id>:<date>',
+-- 'daily_complete:<date>'); inserts use ON CONFLICT DO NOTHING so retries are free.
+ALTER TABLE public.xp_events ADD COLUMN IF NOT EXISTS dedupe_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_xp_events_dedupe
+  ON public.xp_events(user_id, dedupe_key) WHERE dedupe_key IS NOT NULL;
+
+-- Running XP balance per user, kept in sync by statement triggers on xp_events.
+CREATE TABLE IF NOT EXISTS public.user_xp (
+  user_id  UUID PRIMARY KEY REFERENCES public.users(id) ON DELETE CASCADE,
+  total_xp BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION public.user_xp_apply()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE','DELETE') THEN
+    UPDATE public.user_xp x SET total_xp = x.total_xp - o.amount
+    FROM (SELECT user_id, SUM(amount) AS amount FROM xp_old GROUP BY user_id) o
+    WHERE x.user_id = o.user_id;
+  END IF;
+  IF TG_OP IN ('INSERT','UPDATE') THEN
+    INSERT INTO public.user_xp (user_id, total_xp)
+    SELECT user_id, SUM(amount) FROM xp_new WHERE user_id IS NOT NULL GROUP BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET total_xp = user_xp.total_xp + EXCLUDED.total_xp;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_user_xp_ins ON public.xp_events;
+CREATE TRIGGER trg_user_xp_ins
+  AFTER INSERT ON public.xp_events
+  REFERENCING NEW TABLE AS xp_new
+  FOR EACH STATEMENT EXECUTE FUNCTION public.user_xp_apply();
+DROP TRIGGER IF EXISTS trg_user_xp_upd ON public.xp_events;
+CREATE TRIGGER trg_user_xp_upd
+  AFTER UPDATE ON public.xp_events
+  REFERENCING OLD TABLE AS xp_old NEW TABLE AS xp_new
+  FOR EACH STATEMENT EXECUTE FUNCTION public.user_xp_apply();
+DROP TRIGGER IF EXISTS trg_user_xp_del ON public.xp_events;
+CREATE TRIGGER trg_user_xp_del
+  AFTER DELETE ON public.xp_events
+  REFERENCING OLD TABLE AS xp_old
+  FOR EACH STATEMENT EXECUTE FUNCTION public.user_xp_apply();
+
+-- Recomputes balances from the ledger (all users when p_user is NULL).
+-- Backfill with `python manage.py rebuild-xp`.
+CREATE OR REPLACE FUNCTION public.rebuild_user_xp(p_user UUID DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+  n BIGINT;
+BEGIN
+  DELETE FROM public.user_xp WHERE p_user IS NULL OR user_id = p_user;
+  INSERT INTO public.user_xp (user_id, total_xp)
+  SELECT user_id, SUM(amount) FROM public.xp_events
+  WHERE user_id IS NOT NULL AND (p_user IS NULL OR user_id = p_user)
+  GROUP BY user_id;
+  GET DIAGNOSTICS n = ROW_COUNT;
+  RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Folds events older than the month containing p_before into one
+-- 'monthly_summary' row per user and month:
+--   meta = {"events": <n>, "by_reason": {"habit_done": <xp>, ...}}
+-- Balances are unaffected (the delete and insert cancel out in user_xp).
+-- Run periodically with `python manage.py compact-xp`.
+CREATE OR REPLACE FUNCTION public.compact_xp_events(p_before DATE)
+RETURNS BIGINT AS $$
+DECLARE
+  cutoff TIMESTAMPTZ := date_trunc('month', p_before::timestamptz);
+  n BIGINT;
+BEGIN
+  WITH todo AS (
+    SELECT user_id, date_trunc('month', ts) AS month
+    FROM public.xp_events
+    WHERE ts < cutoff AND user_id IS NOT NULL
+    GROUP BY 1, 2
+    HAVING COUNT(*) > 1
+  ),
+  gone AS (
+    DELETE FROM public.xp_events e
+    USING todo t
+    WHERE e.user_id = t.user_id AND e.ts >= t.month AND e.ts < t.month + interval '1 month'
+    RETURNING e.user_id, t.month, e.reason, e.amount, e.meta
+  ),
+  by_reason AS (
+    SELECT user_id, month, reason, SUM(amount) AS amount
+    FROM (
+      SELECT user_id, month, reason, amount FROM gone WHERE reason <> 'monthly_summary'
+      UNION ALL
+      SELECT g.user_id, g.month, r.key, r.value::int
+      FROM gone g CROSS JOIN jsonb_each_text(g.meta->'by_reason') r
+      WHERE g.reason = 'monthly_summary'
+    ) x
+    GROUP BY user_id, month, reason
+  ),
+  counts AS (
+    SELECT user_id, month,
+           SUM(CASE WHEN reason = 'monthly_summary' THEN (meta->>'events')::int ELSE 1 END) AS events
+    FROM gone GROUP BY user_id, month
+  )
+  INSERT INTO public.xp_events (user_id, ts, reason, amount, meta)
+  SELECT b.user_id, b.month, 'monthly_summary', SUM(b.amount),
+         jsonb_build_object('events', MAX(c.events), 'by_reason', jsonb_object_agg(b.reason, b.amount))
+  FROM by_reason b
+  JOIN counts c ON c.user_id = b.user_id AND c.month = b.month
+  GROUP BY b.user_id, b.month;
+  GET DIAGNOSTICS n = ROW_COUNT;
+  RETURN n;
+END;
+$$ LANGUAGE plpgsql;
 
 -- ---------- Schedule ----------
 CREATE TABLE IF NOT EXISTS public.habit_schedule (
@@ -187,6 +716,139 @@ CREATE TABLE IF NOT EXISTS public.habit_schedule (
 );
 CREATE INDEX IF NOT EXISTS idx_schedule_user_date ON public.habit_schedule(user_id, s_date);
 
+-- ---------- Per-user data versions ----------
+-- One counter per (user, domain), bumped by statement triggers on every write to
+-- the domain's table. The API derives ETags from it (conditional GETs, 304s).
+CREATE TABLE IF NOT EXISTS public.data_versions (
+  user_id UUID REFERENCES public.users(id) ON DELETE CASCADE,
+  domain  TEXT NOT NULL,
+  version BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, domain)
+);
+
+-- TG_ARGV[0] = domain. The JOIN on users skips rows whose user is being deleted.
+CREATE OR REPLACE FUNCTION public.data_versions_bump()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('INSERT','UPDATE') THEN
+    INSERT INTO public.data_versions (user_id, domain, version)
+    SELECT DISTINCT d.user_id, TG_ARGV[0], 1 FROM dv_new d JOIN public.users u ON u.id = d.user_id
+    ON CONFLICT (user_id, domain) DO UPDATE SET version = data_versions.version + 1;
+  ELSE
+    INSERT INTO public.data_versions (user_id, domain, version)
+    SELECT DISTINCT d.user_id, TG_ARGV[0], 1 FROM dv_old d JOIN public.users u ON u.id = d.user_id
+    ON CONFLICT (user_id, domain) DO UPDATE SET version = data_versions.version + 1;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  t RECORD;
+BEGIN
+  FOR t IN SELECT * FROM (VALUES
+    ('weigh_ins', 'weighins'), ('checkins', 'checkins'), ('daily_metrics', 'metrics'),
+    ('recipes', 'recipes'), ('user_profile', 'profile'), ('xp_events', 'xp'),
+    ('habits', 'habits'), ('habit_schedule', 'schedule')
+  ) AS v(tbl, domain)
+  LOOP
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_dv_ins ON public.%I', t.tbl);
+    EXECUTE format('CREATE TRIGGER trg_dv_ins AFTER INSERT ON public.%I REFERENCING NEW TABLE AS dv_new
+                    FOR EACH STATEMENT EXECUTE FUNCTION public.data_versions_bump(%L)', t.tbl, t.domain);
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_dv_upd ON public.%I', t.tbl);
+    EXECUTE format('CREATE TRIGGER trg_dv_upd AFTER UPDATE ON public.%I REFERENCING NEW TABLE AS dv_new
+                    FOR EACH STATEMENT EXECUTE FUNCTION public.data_versions_bump(%L)', t.tbl, t.domain);
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_dv_del ON public.%I', t.tbl);
+    EXECUTE format('CREATE TRIGGER trg_dv_del AFTER DELETE ON public.%I REFERENCING OLD TABLE AS dv_old
+                    FOR EACH STATEMENT EXECUTE FUNCTION public.data_versions_bump(%L)', t.tbl, t.domain);
+  END LOOP;
+END $$;
+
+-- ---------- Offline sync ----------
+-- Idempotency keys of mutations applied through /api/sync; a replayed key is
+-- skipped. Prune old keys with `python manage.py prune-sync`.
+CREATE TABLE IF NOT EXISTS public.sync_mutations (
+  user_id     UUID REFERENCES public.users(id) ON DELETE CASCADE,
+  mutation_id TEXT NOT NULL,
+  kind        TEXT NOT NULL,
+  applied_at  TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, mutation_id)
+);
+CREATE INDEX IF NOT EXISTS idx_sync_mutations_applied ON public.sync_mutations(applied_at);
+
+-- ---------- Insights snapshot ----------
+-- Nightly per-user baseline for the insights / coach / weekly review endpoints,
+-- covering the 6 days before as_of; the API adds today's rows on top. Written by
+-- `python manage.py snapshot-insights`. A row is used only on its as_of day and
+-- while history_version matches the user's "history" data version, which
+-- back-dated writes bump (see below).
+CREATE TABLE IF NOT EXISTS public.user_insights_snapshot (
+  user_id         UUID PRIMARY KEY REFERENCES public.users(id) ON DELETE CASCADE,
+  as_of           DATE NOT NULL,
+  history_version BIGINT NOT NULL DEFAULT 0,
+  done_count      INT NOT NULL DEFAULT 0,       -- checkin_daily sums
+  total_count     INT NOT NULL DEFAULT 0,
+  weights         DOUBLE PRECISION[] NOT NULL DEFAULT '{}',   -- last 14 weigh-ins before as_of, oldest first
+  weigh_dates     DATE[],                       -- their dates (NULL on rows written before the column existed)
+  week_trends     DOUBLE PRECISION[] NOT NULL DEFAULT '{}',   -- their trends within the window
+  plateau         BOOLEAN,                      -- plateau.py fit of (weigh_dates, weights)
+  metric_days     INT NOT NULL DEFAULT 0,       -- daily_metrics rows; sums / non-null counts below
+  steps_sum       BIGINT NOT NULL DEFAULT 0,
+  sleep_sum       DOUBLE PRECISION NOT NULL DEFAULT 0,
+  sleep_n         INT NOT NULL DEFAULT 0,
+  protein_sum     BIGINT NOT NULL DEFAULT 0,
+  protein_n       INT NOT NULL DEFAULT 0,
+  fiber_sum       BIGINT NOT NULL DEFAULT 0,
+  fiber_n         INT NOT NULL DEFAULT 0,
+  water_sum       BIGINT NOT NULL DEFAULT 0,
+  water_n         INT NOT NULL DEFAULT 0,
+  strength_sum    BIGINT NOT NULL DEFAULT 0,
+  cardio_sum      BIGINT NOT NULL DEFAULT 0,
+  computed_at     TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE public.user_insights_snapshot ADD COLUMN IF NOT EXISTS weigh_dates DATE[];
+
+-- Bumps data_versions(user, 'history') for rows dated before today.
+-- TG_ARGV[0] = the table's date column.
+CREATE OR REPLACE FUNCTION public.history_version_bump()
+RETURNS TRIGGER AS $$
+DECLARE
+  bump CONSTANT TEXT := 'INSERT INTO public.data_versions (user_id, domain, version)
+    SELECT DISTINCT d.user_id, ''history'', 1 FROM %I d JOIN public.users u ON u.id = d.user_id
+    WHERE d.%I < CURRENT_DATE
+    ON CONFLICT (user_id, domain) DO UPDATE SET version = data_versions.version + 1';
+BEGIN
+  IF TG_OP IN ('INSERT','UPDATE') THEN
+    EXECUTE format(bump, 'hv_new', TG_ARGV[0]);
+  END IF;
+  IF TG_OP IN ('UPDATE','DELETE') THEN
+    EXECUTE format(bump, 'hv_old', TG_ARGV[0]);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  t RECORD;
+BEGIN
+  FOR t IN SELECT * FROM (VALUES
+    ('weigh_ins', 'wi_date'), ('checkins', 'checkin_date'), ('daily_metrics', 'm_date')
+  ) AS v(tbl, col)
+  LOOP
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_hv_ins ON public.%I', t.tbl);
+    EXECUTE format('CREATE TRIGGER trg_hv_ins AFTER INSERT ON public.%I REFERENCING NEW TABLE AS hv_new
+                    FOR EACH STATEMENT EXECUTE FUNCTION public.history_version_bump(%L)', t.tbl, t.col);
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_hv_upd ON public.%I', t.tbl);
+    EXECUTE format('CREATE TRIGGER trg_hv_upd AFTER UPDATE ON public.%I REFERENCING OLD TABLE AS hv_old NEW TABLE AS hv_new
+                    FOR EACH STATEMENT EXECUTE FUNCTION public.history_version_bump(%L)', t.tbl, t.col);
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_hv_del ON public.%I', t.tbl);
+    EXECUTE format('CREATE TRIGGER trg_hv_del AFTER DELETE ON public.%I REFERENCING OLD TABLE AS hv_old
+                    FOR EACH STATEMENT EXECUTE FUNCTION public.history_version_bump(%L)', t.tbl, t.col);
+  END LOOP;
+END $$;
+
 -- =========================================
 --                 SEEDS
 -- (Global data only; no per-user rows here)